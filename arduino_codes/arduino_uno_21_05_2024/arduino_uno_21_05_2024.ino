@@ -1,12 +1,29 @@
 #define TURNSTILE_ON_TIME_MS 3500
 #define COMMUNICATION_TIMEOUT_MS 10000
-#define TURNSTILE_ON_CHAR '1'
+#define FRAME_START_BYTE 0xA5   // command frame: [FRAME_START_BYTE, sequence number, command, crc8], see scripts/arduino_protocol.py
+#define ACK_START_BYTE 0x5A     // ack: [ACK_START_BYTE, sequence number, status, uptime_ms as little endian uint32, crc8]
+#define FRAME_LENGTH 4
+#define ACK_LENGTH 8
+#define FRAME_TIMEOUT_MS 50     // an incomplete frame is dropped if its next byte does not arrive in this time
+#define COMMAND_TURNSTILE_ON 0x01   // keeps the turnstile activated until it is released
+#define COMMAND_TURNSTILE_OFF 0x02  // releases the turnstile, it stays activated for TURNSTILE_ON_TIME_MS more
+#define COMMAND_PING 0x03           // only acked, used to test the connection
+#define STATUS_TURNSTILE_LATCHED 0x01
+#define STATUS_TURNSTILE_ACTIVATED 0x02
+#define STATUS_UNKNOWN_COMMAND 0x80
+// miru only sends a command when the requested state changes, and repeats the current state every few seconds as a heartbeat.
+// Every frame with a valid CRC is acked, miru retransmits the frame otherwise. The commands are idempotent, so a command received twice does no harm
 
 #define TURNSTILE_IS_ACTIVATED_IF_HIGH true  // when the output is low, turnstiles are activated so that if power is off, turnstiles are not blocked. 
 #define TURNSTILE_SIGNAL_PIN 13               //if HIGH, turnstiles are blocked, otherwise turnstiles are activated
 
 unsigned long last_time_communication_ms = 0;
 unsigned long last_time_turnstile_activated = 0;
+bool is_turnstile_latched = false;
+bool is_turnstile_activated = true;
+uint8_t frame[FRAME_LENGTH];
+uint8_t frame_length = 0;  // number of bytes of the frame received so far
+unsigned long last_time_frame_byte_ms = 0;
 
 void setup() {
   Serial.begin(9600);
@@ -15,31 +32,87 @@ void setup() {
 }
 
 void loop() {
-
-  //=============================================================================
-  // set whether turnstile is activated or not
-  if ((millis() - last_time_communication_ms) > COMMUNICATION_TIMEOUT_MS) {
-    activate_turnstile();  // If miru does not send any command from the serial, keep turnstile activated
-  } else if ((millis() - last_time_turnstile_activated) < TURNSTILE_ON_TIME_MS) {
-    activate_turnstile();  //If miru sent activate turnstile command recently, keep turnstile activated
-  } else {
-    block_turnstile();
-  }
-
+  update_turnstile();
   //=============================================================================
   //check for the serial data sent by the miru
-  if (Serial.available()) {
+  read_serial();
+}
+
+void read_serial() {
+  // Parses the bytes sent by the miru. 'i' outside of a frame is the handshake, any other byte outside of a frame is ignored
+  while (Serial.available()) {
+    uint8_t c = Serial.read();
     last_time_communication_ms = millis();
-    char c = Serial.read();
+    if (frame_length > 0 && (millis() - last_time_frame_byte_ms) > FRAME_TIMEOUT_MS) {
+      frame_length = 0;  // the rest of the frame is lost, start over
+    }
+    last_time_frame_byte_ms = millis();
+
+    if (frame_length == 0) {
+      if (c == FRAME_START_BYTE) {
+        frame[frame_length++] = c;
+      } else if (c == 'i') {  // send a reply so that the computer knows this is the arduino port
+        Serial.println("THIS_IS_ARDUINO");
+      }
+    } else {
+      frame[frame_length++] = c;
+      if (frame_length == FRAME_LENGTH) {
+        frame_length = 0;
+        if (crc8(frame, FRAME_LENGTH - 1) == frame[FRAME_LENGTH - 1]) {
+          handle_frame(frame[1], frame[2]);
+        }  // corrupted frames are not acked, miru retransmits them
+      }
+    }
+  }
+}
 
-    if (c == 'i') {  // send a reply so that the computer knows this is the arduino port
-      Serial.println("THIS_IS_ARDUINO");
-    } else if (c == TURNSTILE_ON_CHAR) { // Activate turnstile for a while
+void handle_frame(uint8_t sequence_number, uint8_t command) {
+  uint8_t status = 0;
+  if (command == COMMAND_TURNSTILE_ON) {  // Activate turnstile until it is released
+    is_turnstile_latched = true;
+  } else if (command == COMMAND_TURNSTILE_OFF) {  // Release turnstile, the heartbeat repeats it so the time is only set when the latch is released
+    if (is_turnstile_latched) {
+      is_turnstile_latched = false;
       last_time_turnstile_activated = millis();
-      //Serial.println("ECHO_1");
-    } else if (c=='0'){ // Do nothing, just last communication time is updated
-      //Serial.println("ECHO_0");
     }
+  } else if (command != COMMAND_PING) {
+    status |= STATUS_UNKNOWN_COMMAND;
+  }
+  update_turnstile();
+  if (is_turnstile_latched) status |= STATUS_TURNSTILE_LATCHED;
+  if (is_turnstile_activated) status |= STATUS_TURNSTILE_ACTIVATED;
+
+  unsigned long uptime_ms = millis();
+  uint8_t ack[ACK_LENGTH] = {(uint8_t)ACK_START_BYTE, sequence_number, status, (uint8_t)(uptime_ms), (uint8_t)(uptime_ms >> 8), (uint8_t)(uptime_ms >> 16), (uint8_t)(uptime_ms >> 24), 0};
+  ack[ACK_LENGTH - 1] = crc8(ack, ACK_LENGTH - 1);
+  Serial.write(ack, ACK_LENGTH);
+}
+
+uint8_t crc8(const uint8_t *data, uint8_t length) {
+  // CRC-8 with the polynomial 0x07, the same as calculate_crc8 in scripts/arduino_protocol.py
+  uint8_t crc = 0;
+  for (uint8_t i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void update_turnstile() {
+  // set whether turnstile is activated or not
+  if ((millis() - last_time_communication_ms) > COMMUNICATION_TIMEOUT_MS) {
+    is_turnstile_activated = true;  // If miru does not send any command from the serial, keep turnstile activated
+  } else if (is_turnstile_latched || (millis() - last_time_turnstile_activated) < TURNSTILE_ON_TIME_MS) {
+    is_turnstile_activated = true;  //If miru requests the turnstile or released it recently, keep turnstile activated
+  } else {
+    is_turnstile_activated = false;
+  }
+  if (is_turnstile_activated) {
+    activate_turnstile();
+  } else {
+    block_turnstile();
   }
 }
 
@@ -1,6 +1,5 @@
 import sys
-import os, platform
-import copy 
+import os
 import time
 
 # Determine the absolute path to the directory containing your scripts folder
@@ -18,8 +17,15 @@ import slides_show
 import face_tracker_memory
 import picasso
 import wrist_cursor
+import ui_compositor
+import frame_source
+import frame_geometry
+import inference_executor
+import inference_backends
+import motion_gate
 
 import cv2
+import numpy as np
 import pprint
 
 # PARAMETERS ========================================================================================================
@@ -27,6 +33,15 @@ PARAM_ZOOM_FACTOR = 0.50 # length of ROI edge in terms of the frame edge length
 PARAM_ZOOM_TOPLEFT_NORMALIZED = (0.25, 0.25) # top left corner of the zoomed region in normalized coordinates
 PARAM_DISPLAY_SIZE = (1920, 1080) #NOTE: DO NOT CHANGE -> fixed miru display size, do not change. Also the camera data is fetched in this size
 PARAM_IMAGE_PROCESS_SIZE = (640, 360) #NOTE: DO NOT CHANGE, model input size. If you change, the model will resize the image to this size before processing it. But it is kinda more relaxing to do it beforehand :)
+PARAM_EQUIPMENT_DETECTION_MODE = "FULL_FRAME" # "FULL_FRAME": equipment model runs on the model input frame, "FACE_CROPS": it runs on a batch of full resolution face crops
+PARAM_INFERENCE_THREAD_COUNTS = {"pose": 2, "equipment": 2} # intra-op threads of the ONNX Runtime session of each model ("onnxruntime" and "openvino" backends), both models run concurrently
+PARAM_PYTORCH_THREAD_COUNT = 4 # "pytorch" backend: PyTorch has one intra-op thread pool for the whole process, it is shared by both models
+PARAM_INFERENCE_BACKEND = "pytorch" # "pytorch", "onnxruntime" or "openvino". The ONNX models are exported from the .pt files on the first run
+PARAM_POSE_DETECTION_EVERY_N_FRAMES = 2 # the detectors run on every Nth frame, the face boxes and wrist cursors are extrapolated by their motion models in between
+# NOTE: above 2 the moving faces start to drop out of the overlap gate of the tracker and get new tracks, which resets their rule evidence and cached verdicts (see testing/benchmark_face_extrapolation.py)
+PARAM_RULE_DECISION_METHOD = "WINDOW_MEAN" # "WINDOW_MEAN": mean confidence of the last 5 detections, "SPRT": a rule is decided as soon as the accumulated evidence is strong enough. SPRT stays opt-in until its bin probabilities are fitted from labelled detections
+PARAM_EQUIPMENT_VERIFICATION_INTERVAL_S = 0.5 # a confirmed verdict is re-checked after this time, doubling up to 2 s while it stays the same. 0 runs the equipment model on every detection
+PARAM_ARDUINO_EXTRA_PORTS = [] # serial ports searched in addition to the ones listed by the OS, e.g. ["/tmp/miru_arduino_simulator"] to run with testing/arduino_simulator.py
 PARAM_KEEP_TURNED_ON_TIME = 3.5 #NOTE: this parameter shoudl be same as the one in the arduino code
 PARAM_CAP_RESOLUTIONS_TO_CHECK = [# List of common couples to try as webcam resolution. Should be in descending order of preference
     (1920, 1080),
@@ -36,16 +51,24 @@ PARAM_CAP_RESOLUTIONS_TO_CHECK = [# List of common couples to try as webcam reso
     (640, 480),
     (320, 240)
 ]
-if PARAM_ZOOM_TOPLEFT_NORMALIZED[0] + PARAM_ZOOM_FACTOR > 1 or PARAM_ZOOM_TOPLEFT_NORMALIZED[1] + PARAM_ZOOM_FACTOR > 1:
-    raise ValueError("Zoomed region is out of frame boundaries")
 
 # OBJECTS ========================================================================================================
-arduino_communicator_object = arduino_communicator.ArduinoCommunicator(baud_rate=9600, serial_timeout=1, expected_response="THIS_IS_ARDUINO", connection_test_period_s = 60, verbose = False, write_delay_s=0.01,arduino_reboot_time=3)
-pose_detector_object = pose_detector.PoseDetector(model_name="yolov8n")
-equipment_detector_object = equipment_detector.EquipmentDetector(model_name="miru_model_03_08_2024")
-slides_show_object = slides_show.SlideShow(slides_folder="scripts/slides", slide_duration_s=5)
-face_manager_with_memory_object = face_tracker_memory.FaceTrackerManager()
+arduino_communicator_object = arduino_communicator.ArduinoCommunicator(baud_rate=9600, serial_timeout=1, expected_response="THIS_IS_ARDUINO", connection_test_period_s = 60, verbose = False, write_delay_s=0.01,arduino_reboot_time=3, extra_ports=PARAM_ARDUINO_EXTRA_PORTS)
+arduino_communicator_object.start() # the serial port is searched and written on the I/O thread of the communicator
+if PARAM_INFERENCE_BACKEND == "pytorch":
+    inference_backends.set_pytorch_thread_count(PARAM_PYTORCH_THREAD_COUNT)
+pose_detector_object = pose_detector.PoseDetector(model_name="yolov8n", inference_backend=PARAM_INFERENCE_BACKEND, intra_op_threads=PARAM_INFERENCE_THREAD_COUNTS["pose"])
+equipment_detector_object = equipment_detector.EquipmentDetector(model_name="miru_model_03_08_2024", inference_backend=PARAM_INFERENCE_BACKEND, intra_op_threads=PARAM_INFERENCE_THREAD_COUNTS["equipment"])
+slides_show_object = slides_show.SlideShow(slides_folder="scripts/slides", slide_duration_s=5, display_size=PARAM_DISPLAY_SIZE)
+face_manager_with_memory_object = face_tracker_memory.FaceTrackerManager(rule_decision_method=PARAM_RULE_DECISION_METHOD, equipment_verification_interval_s=PARAM_EQUIPMENT_VERIFICATION_INTERVAL_S)
 wrist_cursor_object = wrist_cursor.WristCursor()
+inference_executor_object = inference_executor.InferenceExecutor(model_names=list(PARAM_INFERENCE_THREAD_COUNTS.keys()))
+motion_gate_object = motion_gate.MotionGate(downsampled_size=(64, 36), grid_size=(4, 4), region_thresholds=6.0, release_ratio=0.5, hold_time_s=2.0, max_skip_time_s=5.0)
+frame_geometry_object = frame_geometry.FrameGeometry(zoom_factor=PARAM_ZOOM_FACTOR, zoom_topleft_normalized=PARAM_ZOOM_TOPLEFT_NORMALIZED, model_input_size=PARAM_IMAGE_PROCESS_SIZE, display_size=PARAM_DISPLAY_SIZE)
+picasso.preload_images() # decode all UI images once so that the main loop never reads them from the disk
+ui_overlay_compositor = ui_compositor.OverlayCompositor(width=PARAM_DISPLAY_SIZE[0], height=PARAM_DISPLAY_SIZE[1]) # buttons and status icons, re-rendered only when their state changes
+how_to_use_overlay_compositor = ui_compositor.OverlayCompositor(width=PARAM_DISPLAY_SIZE[0], height=PARAM_DISPLAY_SIZE[1])
+how_to_use_overlay_compositor.set_layer(layer_name="how_to_use_page", image_name="miru_how_to_use_page", x=0, y=0, width=PARAM_DISPLAY_SIZE[0], height=PARAM_DISPLAY_SIZE[1], maintain_aspect_ratio=False)
 
 # UI SETUP ========================================================================================================
 cv2.namedWindow('Miru', cv2.WINDOW_NORMAL)
@@ -54,108 +77,73 @@ last_time_ui_restart = time.time()
 UI_RESTART_DURATION_SEC = 10
 
 # INIT CAMERA ========================================================================================================
-cap = None
-is_linux = platform.system() == "Linux"
-if is_linux:
-    cap = cv2.VideoCapture(0, cv2.CAP_V4L2)
-    print(f"V4L2 is used for camera connection because OS='{platform.system()}'")
-    fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-    cap.set(cv2.CAP_PROP_FOURCC, fourcc)
-    cap.set(cv2.CAP_PROP_FPS, 30)
-else:
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    print(f"DShow is used for camera connection because OS='{platform.system()}'")
-
-if not cap.isOpened():
-    raise ValueError("Unable to open the camera")
-
-# Verify the codec
-fourcc_actual = int(cap.get(cv2.CAP_PROP_FOURCC))
-codec = (
-    chr((fourcc_actual & 0xFF)),
-    chr((fourcc_actual >> 8) & 0xFF),
-    chr((fourcc_actual >> 16) & 0xFF),
-    chr((fourcc_actual >> 24) & 0xFF)
-)
-codec = "".join(codec)
-print(f"Camera codec: {codec}")
-
-def check_resolution(cap, width, height):
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-    actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    return (actual_width, actual_height) == (width, height)
-
-# Try resolutions until one works
-selected_resolution = None
-for width, height in PARAM_CAP_RESOLUTIONS_TO_CHECK:
-    print(f"    Trying resolution: {width}x{height}")
-    if check_resolution(cap, width, height):
-        selected_resolution = (width, height)
-        print(f"->Selected resolution: {width}x{height}")
-        break
-
-if not selected_resolution:
-    raise ValueError("None of the common resolutions are supported by the camera.")
-
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, selected_resolution[0])
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, selected_resolution[1])
-
-# Verify the resolution
-actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-print(f"Camera resolution is validated to be: {actual_width}x{actual_height}")
-
+# Frames are grabbed and decoded on a separate thread, the main loop always processes the newest one
+frame_source_object = frame_source.FrameSource(camera_index=0, resolutions_to_check=PARAM_CAP_RESOLUTIONS_TO_CHECK, fps=30, ring_buffer_size=3)
+actual_width, actual_height = frame_source_object.open()
 if (actual_width, actual_height) != PARAM_DISPLAY_SIZE:
     print(f"Warning: Camera resolution does not match the display size. Expected: {PARAM_DISPLAY_SIZE}, Actual: {actual_width}x{actual_height}")
+frame_source_object.start()
 
 # MAIN LOOP ========================================================================================================
 last_time_turnstile_activated = 0
+pose_detections = pose_detector_object.recent_prediction_results
+number_of_frames_since_detection = PARAM_POSE_DETECTION_EVERY_N_FRAMES # so that the detectors run on the first frame
 while True:      
-    # Read frame from webcam
-    ret, frame = cap.read()
-    if not ret:
+    # Read the newest frame from webcam
+    captured_frame = frame_source_object.read(timeout_s=0.1)
+    if captured_frame is None:
         frame = picasso.get_image_as_frame(image_name="camera_connection_error_page", width=PARAM_DISPLAY_SIZE[0], height=PARAM_DISPLAY_SIZE[1], maintain_aspect_ratio=False)
         cv2.imshow("Miru", frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):   # Break loop if 'q' is pressed
             break
         continue #Otherwise, the frame will result in an error since it also has alpha channel during object detection, never let this frame to be processed
-    
-    if frame.shape[1] != PARAM_DISPLAY_SIZE[0] or frame.shape[0] != PARAM_DISPLAY_SIZE[1]:
-        # Since camera supposed to be in the same resolution as the display, this should not happen. But if it happens, resize the frame
-        frame = cv2.resize(frame, (PARAM_DISPLAY_SIZE[0], PARAM_DISPLAY_SIZE[1]))
-
-    #apply digital zoom to the frame. Essepically useful for detecting small objects at a distance
-    if PARAM_ZOOM_FACTOR < 1:
-        zoomed_region_top_left = (int(PARAM_ZOOM_TOPLEFT_NORMALIZED[0] * frame.shape[1]), int(PARAM_ZOOM_TOPLEFT_NORMALIZED[1] * frame.shape[0]))
-        zoomed_region_bottom_right = (int(zoomed_region_top_left[0] + PARAM_ZOOM_FACTOR * frame.shape[1]), int(zoomed_region_top_left[1] + PARAM_ZOOM_FACTOR * frame.shape[0]))
-        frame = frame[zoomed_region_top_left[1]:zoomed_region_bottom_right[1], zoomed_region_top_left[0]:zoomed_region_bottom_right[0]]
-        
-    # mirror the frame so that the movements are more intuitive
-    frame = cv2.flip(frame, 1) 
-
-    # Resize frame to the desired processing size of the model
-    resized_frame = cv2.resize(copy.deepcopy(frame), (PARAM_IMAGE_PROCESS_SIZE[0], PARAM_IMAGE_PROCESS_SIZE[1]))
+    # Zoom, mirror and resize the raw frame into the reused model input (640x360) and display (1920x1080) buffers
+    resized_frame, frame = frame_geometry_object.process_frame(captured_frame.frame)
 
-    #Arduino communication test
-    arduino_communicator_object.ensure_connection()
+    # The connection status is a snapshot kept by the I/O thread of the communicator, reading it never waits on the serial port
     is_arduino_connected = arduino_communicator_object.get_connection_status()       
     is_turnstile_on = time.time() - last_time_turnstile_activated < PARAM_KEEP_TURNED_ON_TIME   
 
     # Predict poses-wrist cursor and equipments
-    pose_pred_dicts = pose_detector_object.predict_frame_and_return_detections(resized_frame,bbox_confidence=0.35)   
-    face_bbox_coords = pose_detector_object.return_face_bboxes_list(frame = resized_frame, predictions= pose_pred_dicts, keypoint_confidence_threshold = 0.80)
-    face_manager_with_memory_object.update_face_bboxes(face_bbox_coords)    
-    main_face_pose_detection_id = face_manager_with_memory_object.get_main_face_detection_id(main_face_according_to = "CLOSEST_TO_CENTER", frame = resized_frame)
+    # The detectors run on every Nth new frame. A duplicate of the previous frame or a static scene gives the same predictions, so they are skipped as well.
+    # The motion gate is bypassed while someone is tracked
+    if not captured_frame.is_duplicate:
+        number_of_frames_since_detection += 1
+    is_detection_due = not captured_frame.is_duplicate and number_of_frames_since_detection >= PARAM_POSE_DETECTION_EVERY_N_FRAMES
+    is_inference_needed = is_detection_due and motion_gate_object.should_run_inference(resized_frame, force=face_manager_with_memory_object.get_number_of_active_faces() > 0)
+    is_equipment_detected = False # the equipment model only runs for the tracks whose cached verdict is stale
+    if is_inference_needed:
+        number_of_frames_since_detection = 0
+        # Both models are independent until the tracker stage, so they run concurrently. In "FULL_FRAME" mode the equipment model runs if a tracked face is due
+        # for a check, or if no face is tracked yet, since a person stepping up is then a new track. A face that appears next to tracked ones or moves away
+        # from its checked box is only known after the tracker update, it is checked on the next detection instead of running the model after the pose model
+        inference_executor_object.submit("pose", pose_detector_object.predict_frame_and_return_detections, resized_frame, bbox_confidence=0.35)
+        if PARAM_EQUIPMENT_DETECTION_MODE == "FULL_FRAME" and (face_manager_with_memory_object.get_number_of_active_faces() == 0 or face_manager_with_memory_object.is_any_equipment_check_due(current_time=captured_frame.capture_timestamp)):
+            inference_executor_object.submit("equipment", equipment_detector_object.predict_frame, resized_frame, bbox_confidence=0.35)
+            is_equipment_detected = True
+        pose_detections = inference_executor_object.join()["pose"]
+        face_bbox_coords = pose_detector_object.return_face_bboxes_list(frame = resized_frame, predictions= pose_detections, keypoint_confidence_threshold = 0.80, use_keypoint_fallbacks = True)
+        face_track_ids = face_manager_with_memory_object.update_face_bboxes(face_bbox_coords, detection_time=captured_frame.capture_timestamp)
+        pose_detections.set_track_ids(detection_ids=face_bbox_coords[:, 4], track_ids=face_track_ids) # the persons are joined with their faces by the stable track id
+
+        # Only the due faces are sampled, the others keep their cached verdict and check schedule
+        is_face_check_due = np.isin(face_track_ids, face_manager_with_memory_object.get_track_ids_due_for_equipment_check(current_time=captured_frame.capture_timestamp))
+        equipment_checked_track_ids = face_track_ids[is_face_check_due]
+        if PARAM_EQUIPMENT_DETECTION_MODE == "FACE_CROPS" and np.any(is_face_check_due): # needs the face boxes, so it runs after the pose model
+            equipment_detector_object.predict_face_crops(raw_frame=captured_frame.frame, face_bboxes=face_bbox_coords[is_face_check_due], frame_geometry=frame_geometry_object, frame_shape=resized_frame.shape, bbox_confidence=0.35)
+            is_equipment_detected = True
+    else:
+        face_manager_with_memory_object.extrapolate_face_bboxes(current_time=captured_frame.capture_timestamp)
+    main_face_track_id = face_manager_with_memory_object.get_main_face_track_id(main_face_according_to = "CLOSEST_TO_CENTER", frame = resized_frame)
 
-    wrist_cursor_object.update_wrist_cursor_position(main_face_pose_detection_id=main_face_pose_detection_id, pose_pred_dicts=pose_pred_dicts, predicted_frame=resized_frame)
+    if is_inference_needed:
+        wrist_cursor_object.update_wrist_cursor_position(main_face_track_id=main_face_track_id, pose_detections=pose_detections, predicted_frame=resized_frame, detection_time=captured_frame.capture_timestamp)
+    else:
+        wrist_cursor_object.extrapolate_wrist_cursor_position(current_time=captured_frame.capture_timestamp)
+    if is_equipment_detected: # only new equipment detections are sampled
+        face_manager_with_memory_object.update_face_equipments_detection_confidences_and_obeyed_rules(equipment_detector_object.recent_prediction_results, track_ids=equipment_checked_track_ids, detection_time=captured_frame.capture_timestamp)
     wrist_cursor_object.update_wrist_cursor_mode()
     
-    equipment_detector_object.predict_frame(resized_frame, bbox_confidence=0.35)
-    equipment_formatted_predictions = equipment_detector_object.return_formatted_predictions_list()
-    face_manager_with_memory_object.update_face_equipments_detection_confidences_and_obeyed_rules(equipment_formatted_predictions)
-    
     # slide related operations 
     if slides_show_object.should_change_slide():
         slides_show_object.update_current_slide()
@@ -165,35 +153,33 @@ while True:
     else:
         slides_show_object.decrease_opacity()
 
-    # Send signals to arduino
-    if face_manager_with_memory_object.should_turn_on_turnstiles( main_face_id = main_face_pose_detection_id ) or wrist_cursor_object.get_mode() == "pass_me_activated":
-        arduino_communicator_object.send_activate_turnstile_signal()
+    # Send signals to arduino, only the changes of the requested state are sent. The Arduino keeps the turnstile activated for PARAM_KEEP_TURNED_ON_TIME after the release
+    is_turnstile_activation_requested = face_manager_with_memory_object.should_turn_on_turnstiles( main_face_id = main_face_track_id ) or wrist_cursor_object.get_mode() == "pass_me_activated"
+    arduino_communicator_object.set_turnstile_activation(is_activated = is_turnstile_activation_requested)
+    if is_turnstile_activation_requested:
         last_time_turnstile_activated = time.time()
-    else:
-        arduino_communicator_object.send_ping_to_arduino()
 
     # SHOW FRAME ========================================================================================================  
-    frame = cv2.resize(frame, (PARAM_DISPLAY_SIZE[0], PARAM_DISPLAY_SIZE[1])) # resize the frame to the display size (1920x1080)
-    
-    wrist_cursor_object.draw_buttons_on_frame(frame)
-
-    coordinate_transform_coefficients = (frame.shape[1] / PARAM_IMAGE_PROCESS_SIZE[0], frame.shape[0] / PARAM_IMAGE_PROCESS_SIZE[1]) # to transform the coordinates of the face bounding boxes to the original frame size from the resized frame size
-    face_manager_with_memory_object.draw_faces_on_frame(frame, main_face_id = main_face_pose_detection_id, coordinate_transform_coefficients=coordinate_transform_coefficients)
-
-    wrist_cursor_object.draw_wrist_cursor_on_frame(frame)
-
+    # Static layers are pre-rendered once per state change and applied in a single blend pass, only the dynamic parts are drawn every frame
+    wrist_cursor_object.set_button_layers(ui_overlay_compositor)
     if is_arduino_connected:
         print("Arduino is connected")
-        picasso.draw_image_on_frame(frame=frame, image_name="arduino_connection_blue", x=10, y=10, width=100, height=100, maintain_aspect_ratio=False)
+        ui_overlay_compositor.set_layer(layer_name="arduino_status", image_name="arduino_connection_blue", x=10, y=10, width=100, height=100, maintain_aspect_ratio=False)
     else:
         print("Arduino is not connected")
-        picasso.draw_image_on_frame(frame=frame, image_name="arduino_connection_grey", x=10, y=10, width=100, height=100, maintain_aspect_ratio=False)
+        ui_overlay_compositor.set_layer(layer_name="arduino_status", image_name="arduino_connection_grey", x=10, y=10, width=100, height=100, maintain_aspect_ratio=False)
     
     # draw turnstile status icon
     if is_turnstile_on and arduino_communicator_object.get_connection_status():
-        picasso.draw_image_on_frame(frame=frame, image_name="turnstile_blue", x=120, y=10, width=100, height=100, maintain_aspect_ratio=False)
+        ui_overlay_compositor.set_layer(layer_name="turnstile_status", image_name="turnstile_blue", x=120, y=10, width=100, height=100, maintain_aspect_ratio=False)
     else:
-        picasso.draw_image_on_frame(frame=frame, image_name="tursntile_grey", x=120, y=10, width=100, height=100, maintain_aspect_ratio=False)
+        ui_overlay_compositor.set_layer(layer_name="turnstile_status", image_name="tursntile_grey", x=120, y=10, width=100, height=100, maintain_aspect_ratio=False)
+    ui_overlay_compositor.apply_to_frame(frame)
+
+    coordinate_transform_coefficients = (frame.shape[1] / PARAM_IMAGE_PROCESS_SIZE[0], frame.shape[0] / PARAM_IMAGE_PROCESS_SIZE[1]) # to transform the coordinates of the face bounding boxes to the original frame size from the resized frame size
+    face_manager_with_memory_object.draw_faces_on_frame(frame, main_face_id = main_face_track_id, coordinate_transform_coefficients=coordinate_transform_coefficients)
+
+    wrist_cursor_object.draw_wrist_cursor_on_frame(frame)
 
     # Cursor related UI modifications       
     if wrist_cursor_object.get_mode() == "how_to_use_activated":
@@ -202,11 +188,11 @@ while True:
         PARAM_CLEARANCE_X = 10
         PARAM_CLEARANCE_Y = 10
         PARAM_RESIZING_FACTOR = 5
-        ui_shrinked = cv2.resize(copy.deepcopy(frame), (frame.shape[1] // PARAM_RESIZING_FACTOR, frame.shape[0] // PARAM_RESIZING_FACTOR))
+        ui_shrinked = cv2.resize(frame, (frame.shape[1] // PARAM_RESIZING_FACTOR, frame.shape[0] // PARAM_RESIZING_FACTOR))
         x_position = frame.shape[1] - ui_shrinked.shape[1] - PARAM_CLEARANCE_X
         y_position = frame.shape[0] - ui_shrinked.shape[0] - PARAM_CLEARANCE_Y
 
-        picasso.draw_image_on_frame(frame=frame, image_name="miru_how_to_use_page", x=0, y=0, width=frame.shape[1], height=frame.shape[0], maintain_aspect_ratio=False)
+        how_to_use_overlay_compositor.apply_to_frame(frame)
         
         # Place the shrunk UI at the bottom right with clearance
         frame[y_position:y_position + ui_shrinked.shape[0], x_position:x_position + ui_shrinked.shape[1]] = ui_shrinked
@@ -229,6 +215,7 @@ while True:
         break
 
 # Release all sources
-arduino_communicator_object.shutdown_connection()
-cap.release()
+arduino_communicator_object.stop()
+frame_source_object.release()
+inference_executor_object.shutdown()
 cv2.destroyAllWindows()
\ No newline at end of file
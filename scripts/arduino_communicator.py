@@ -1,11 +1,23 @@
 import serial
 import serial.tools.list_ports
+import serial.tools.list_ports_common
+import concurrent.futures
+import collections, json, os, queue, threading
 import time,random
+import arduino_protocol
 
 import numpy as np
 import cv2
 
 class ArduinoCommunicator:
+    # All serial I/O runs on its own thread, so the video loop never waits on the serial port. The send methods only put a command into a queue,
+    # and the connection state is a snapshot written by the I/O thread only, so reading it needs no lock.
+    # Connection states: "DISCONNECTED" -> "CONNECTING" (searching the ports) -> "CONNECTED" -> "DISCONNECTED" if a write or the periodic connection test fails
+    # Turnstile protocol: "ON" latches the turnstile activated, "OFF" releases it and the Arduino keeps it activated for TURNSTILE_ON_TIME_MS more.
+    # A command is only sent when the requested state changes. The current state is repeated as a heartbeat, so that the Arduino does not run into
+    # COMMUNICATION_TIMEOUT_MS. Thus the serial traffic does not depend on the frame rate.
+    # The commands are sent as frames of arduino_protocol with a sequence number and a CRC. Every frame is acked with the status and the uptime of
+    # the Arduino, a frame without an ack is retransmitted. The round trip times of the acks are kept to monitor the serial link
 
     ICON_PATHS = {
         "arduino_online": "src/images/icons/arduino_online_icon.png",
@@ -14,7 +26,7 @@ class ArduinoCommunicator:
         "arduino_offline_no_bg": "src/images/icons/arduino_offline_icon_nobg.png", # This icon is used for displaying on the screen
     }
 
-    def __init__(self, baud_rate=9600, serial_timeout=2, expected_response="THIS_IS_ARDUINO", connection_test_period_s = 30, verbose = False, write_delay_s = 0.05, arduino_reboot_time:float = 2):
+    def __init__(self, baud_rate=9600, serial_timeout=2, expected_response="THIS_IS_ARDUINO", connection_test_period_s = 30, verbose = False, write_delay_s = 0.05, arduino_reboot_time:float = 2, reconnect_period_s:float = 5, command_queue_size:int = 8, last_port_file_path:str = "local/last_arduino_port.json", heartbeat_period_s:float = 2.0, ack_timeout_s:float = 0.1, max_retransmissions:int = 3, extra_ports:list = None):
         self.SERIAL_BAUDRATE = baud_rate
         self.SERIAL_TIMEOUT = max(serial_timeout, arduino_reboot_time + 1) # Timeout should be greater than arduino reboot time
         self.arduino_port = None
@@ -26,7 +38,43 @@ class ArduinoCommunicator:
         self.CONNECTION_TEST_PREIOD_S = connection_test_period_s  # Connection timeout in seconds
         self.last_connection_check_time = 0  # Time of last connection check       
 
+        self.RECONNECT_PERIOD_S = reconnect_period_s # time between two port searches while the Arduino is not found
+        self.LAST_PORT_FILE_PATH = last_port_file_path # the port of the last connection is tried first on the next search
+        self.PROBE_POLL_PERIOD_S = 0.05 # how often a port probe checks whether the search is cancelled
+        self.PROBE_REQUEST_PERIOD_S = 0.5 # the 'i' is repeated with this period until the response arrives, an Arduino that is still booting does not answer it
+        self.LAST_PORT_POLL_PERIOD_S = 0.5 # how often the port list is checked for the last port while it is missing, e.g. while the USB cable is unplugged
+        self.HEARTBEAT_PERIOD_S = heartbeat_period_s # should be well below COMMUNICATION_TIMEOUT_MS of the Arduino code (10 s)
+        self.EXTRA_PORTS = [] if extra_ports is None else list(extra_ports) # device paths that are not listed by the OS, e.g. the pseudo-terminal of testing/arduino_simulator.py
+        self.ACK_TIMEOUT_S = ack_timeout_s # a frame is retransmitted if it is not acked in this time
+        self.MAX_RETRANSMISSIONS = max_retransmissions # the connection is considered lost if a frame is not acked after this many retransmissions
+        self.ACK_POLL_PERIOD_S = 0.01 # read timeout of the serial connection while waiting for an ack
+        self.ROUND_TRIP_TIME_WINDOW_SIZE = 1000 # number of the most recent round trip times kept for the statistics
+        self.ROUND_TRIP_TIME_HISTOGRAM_BIN_EDGES_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, float("inf")]
+
         self.VERBOSE = verbose 
+
+        self.command_queue = queue.Queue(maxsize=command_queue_size) # arduino_protocol commands to send, commands are dropped if the I/O thread cannot keep up
+        self.connection_state = "DISCONNECTED" # written by the I/O thread only
+        self.is_turnstile_activation_requested = False # written by the caller only, the I/O thread repeats it as the heartbeat
+        self.last_write_time = 0
+        self.number_of_sent_commands = 0
+        self.number_of_sent_heartbeats = 0
+        self.number_of_dropped_commands = 0
+        self.number_of_connections = 0
+
+        self.next_sequence_number = 0
+        self.receive_buffer = bytearray() # received bytes that are not parsed into acks yet
+        self.round_trip_times_s = collections.deque(maxlen=self.ROUND_TRIP_TIME_WINDOW_SIZE)
+        self.round_trip_times_lock = threading.Lock() # the statistics are read from the caller thread
+        self.number_of_retransmissions = 0
+        self.number_of_lost_frames = 0 # frames that were not acked after all retransmissions
+        self.number_of_arduino_reboots = 0 # detected by the uptime in the acks going backwards
+        self.last_arduino_status = None
+        self.last_arduino_uptime_ms = None
+
+        self.stop_event = threading.Event() # interrupts the waits of the I/O thread when stopping
+        self.io_thread = None
+        self.is_running = False
         
     def is_connection_test_time_elapsed(self)->bool:
         time_elapsed = time.time() - self.last_connection_check_time
@@ -35,23 +83,61 @@ class ArduinoCommunicator:
         return time_elapsed > self.CONNECTION_TEST_PREIOD_S # True if time elapsed is greater than connection test period
 
     def is_getting_expected_reply_from_port(self)->bool:
+        # Pings the Arduino over the framed protocol, it is online if the ping is acked
         self.last_connection_check_time = time.time() # Update last connection check time
 
         if self.serial_connection is not None and self.serial_connection.isOpen():
             try:
-                self.serial_connection.write(b'i')
-                response = self.serial_connection.readline().decode('utf-8', errors='ignore').strip()
-                
-                if(response == self.EXPECTED_RESPONSE):
-                    if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Expected reply is received, Arduino is online")
+                if self.__send_frame(arduino_protocol.COMMAND_PING):
+                    if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Ping is acked, Arduino is online")
                     return True
                 else:
-                    if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> No reply is received, Arduino is offline")
+                    if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Ping is not acked, Arduino is offline")
 
-            except (serial.SerialException, UnicodeDecodeError):
+            except (OSError, serial.SerialException):
                 return False
         return False
-    
+
+    def __send_frame(self, command:int) -> bool:
+        # Sends the command and waits for its ack, the frame is retransmitted up to MAX_RETRANSMISSIONS times. Returns whether it is acked
+        sequence_number = self.next_sequence_number
+        self.next_sequence_number = (sequence_number + 1) % 256
+        frame = arduino_protocol.encode_command_frame(sequence_number, command)
+        for attempt_index in range(1 + self.MAX_RETRANSMISSIONS):
+            if attempt_index > 0:
+                self.number_of_retransmissions += 1
+            send_time = time.perf_counter()
+            self.serial_connection.write(frame)
+            ack = self.__wait_for_ack(sequence_number, send_time + self.ACK_TIMEOUT_S)
+            if ack is not None:
+                with self.round_trip_times_lock:
+                    self.round_trip_times_s.append(time.perf_counter() - send_time)
+                self.__handle_ack(*ack)
+                return True
+            if self.stop_event.is_set():
+                return False
+        self.number_of_lost_frames += 1
+        return False
+
+    def __wait_for_ack(self, sequence_number:int, deadline:float):
+        # Returns (sequence number, status, uptime_ms) of the ack of the frame, None if it does not arrive before the deadline. Acks of older frames are skipped
+        while True:
+            for ack in arduino_protocol.pop_acks(self.receive_buffer):
+                if ack[0] == sequence_number:
+                    return ack
+            if time.perf_counter() >= deadline:
+                return None
+            self.receive_buffer += self.serial_connection.read(max(1, self.serial_connection.in_waiting))
+
+    def __handle_ack(self, sequence_number:int, status:int, uptime_ms:int):
+        if self.last_arduino_uptime_ms is not None and uptime_ms < self.last_arduino_uptime_ms:
+            # The Arduino rebooted and lost the turnstile state, the heartbeat sends it right away
+            self.number_of_arduino_reboots += 1
+            self.last_write_time = 0
+            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Arduino rebooted")
+        self.last_arduino_status = status
+        self.last_arduino_uptime_ms = uptime_ms
+
     def shutdown_connection(self):
         # Close existing serial connection if any
         if self.serial_connection is not None and self.serial_connection.isOpen():
@@ -62,71 +148,275 @@ class ArduinoCommunicator:
 
         if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Serial connection is closed")
             
+    def __get_port_identity(self, port) -> dict:
+        # USB serial adapters keep their VID, PID and serial number when the device path changes, e.g. COM3 -> COM5 or ttyUSB0 -> ttyUSB1
+        return {"device": port.device, "vid": getattr(port, "vid", None), "pid": getattr(port, "pid", None), "serial_number": getattr(port, "serial_number", None)}
+
+    def load_last_port_identity(self) -> dict:
+        try:
+            with open(self.LAST_PORT_FILE_PATH, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def save_last_port_identity(self, port):
+        try:
+            temporary_file_path = self.LAST_PORT_FILE_PATH + ".tmp"
+            with open(temporary_file_path, "w") as file:
+                json.dump(self.__get_port_identity(port), file)
+            os.replace(temporary_file_path, self.LAST_PORT_FILE_PATH)
+        except OSError as e:
+            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> (EXCEPT) Last port could not be saved: {e}")
+
+    def __is_last_port(self, port, last_port_identity:dict) -> bool:
+        if last_port_identity is None:
+            return False
+        port_identity = self.__get_port_identity(port)
+        if port_identity["serial_number"] is not None:
+            return all(port_identity[key] == last_port_identity.get(key) for key in ["vid", "pid", "serial_number"])
+        return port_identity["device"] == last_port_identity.get("device")
+
+    def __probe_port(self, port, search_done_event:threading.Event):
+        # Returns the open serial connection if the port answers with the expected response, None otherwise or if the search is done
+        try:
+            ser = serial.Serial(port.device, self.SERIAL_BAUDRATE, timeout=self.PROBE_POLL_PERIOD_S)
+        except (OSError, serial.SerialException):
+            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> (EXCEPT) Failed to connect to port {port.device}")
+            return None
+        try:
+            reboot_end_time = time.time() + self.ARDUINO_REBOOT_TIME
+            while time.time() < reboot_end_time: # Wait for Arduino to reset
+                if search_done_event.wait(self.PROBE_POLL_PERIOD_S) or self.stop_event.is_set():
+                    ser.close()
+                    return None
+            ser.write(b'i') # After receiving this character, arduino returns the 'expected_response'
+            response, response_end_time, next_request_time = b"", time.time() + self.SERIAL_TIMEOUT, time.time() + self.PROBE_REQUEST_PERIOD_S
+            while not response.endswith(b"\n") and time.time() < response_end_time and not search_done_event.is_set() and not self.stop_event.is_set():
+                response += ser.readline()
+                if len(response) == 0 and time.time() >= next_request_time:
+                    ser.write(b'i')
+                    next_request_time = time.time() + self.PROBE_REQUEST_PERIOD_S
+            if response.decode('utf-8', errors='ignore').strip() == self.EXPECTED_RESPONSE and not self.stop_event.is_set():
+                ser.timeout = self.ACK_POLL_PERIOD_S
+                return ser
+        except (OSError, serial.SerialException):
+            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> (EXCEPT) Failed to probe port {port.device}")
+        ser.close()
+        return None
+
+    def __probe_ports_concurrently(self, ports:list, is_cancelled = None):
+        # Probes all ports at once and returns (port, serial connection) of the first one in the list that answers, (None, None) if none does.
+        # The other probes are cancelled as soon as a port answers. is_cancelled() is polled every LAST_PORT_POLL_PERIOD_S, the probes are cancelled when it returns True
+        if len(ports) == 0:
+            return None, None
+        search_done_event = threading.Event()
+        def probe(port):
+            ser = self.__probe_port(port, search_done_event)
+            if ser is not None:
+                search_done_event.set()
+            return ser
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="ArduinoPortProbe") as executor:
+            futures = [executor.submit(probe, port) for port in ports]
+            while len(concurrent.futures.wait(futures, timeout=self.LAST_PORT_POLL_PERIOD_S).not_done) > 0:
+                if is_cancelled is not None and not search_done_event.is_set() and is_cancelled():
+                    search_done_event.set()
+            connections = [future.result() for future in futures]
+        found_port, found_connection = None, None
+        for port, ser in zip(ports, connections):
+            if ser is None:
+                continue
+            if found_connection is None:
+                found_port, found_connection = port, ser
+            else: # answered at the same time as an earlier port
+                ser.close()
+        return found_port, found_connection
+
+    def __list_ports(self) -> list:
+        # The extra ports are only listed while their device path exists, as the OS does with the other ports
+        return serial.tools.list_ports.comports() + [serial.tools.list_ports_common.ListPortInfo(device) for device in self.EXTRA_PORTS if os.path.exists(device)]
+
+    def __is_last_port_listed(self, last_port_identity:dict) -> bool:
+        return any(self.__is_last_port(port, last_port_identity) for port in self.__list_ports())
+
     def find_and_connect_to_arduino_port_if_possible(self)->int:        
-        ports = serial.tools.list_ports.comports()
-        
+        ports = self.__list_ports()
+
         # Close existing serial connection if any
         self.shutdown_connection()
         
-        # Try each port to connect to Arduino
-        for port in ports:
-            try:
-                ser = serial.Serial(port.device, self.SERIAL_BAUDRATE, timeout=self.SERIAL_TIMEOUT)
-                time.sleep(self.ARDUINO_REBOOT_TIME)  # Wait for Arduino to reset
-                ser.write(b'i') # After receiving this character, arduino returns the 'expected_response'
-                response = ser.readline().decode('utf-8', errors='ignore').strip()
-                if response == self.EXPECTED_RESPONSE:
-                    self.arduino_port = port.device
-                    self.serial_connection = ser
-                    if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Connected to Arduino at port {self.arduino_port}")
-                    return True # Connected to Arduino
-            except (OSError, serial.SerialException):
-                if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> (EXCEPT) Failed to connect to port {port.device}")
-                continue # Try next port
+        # The last used port is probed first, so that the other serial devices are not opened (which may reset them) if the Arduino is still there.
+        # Otherwise all remaining ports are probed at once instead of one after another. If the last port is missing, e.g. the USB cable is unplugged,
+        # the probes of the other ports are cancelled as soon as it is listed again, so that the next search starts with it instead of waiting for the slow probes
+        last_port_identity = self.load_last_port_identity()
+        last_ports = [port for port in ports if self.__is_last_port(port, last_port_identity)]
+        other_ports = [port for port in ports if not self.__is_last_port(port, last_port_identity)]
+        is_last_port_back = (lambda: self.__is_last_port_listed(last_port_identity)) if last_port_identity is not None and len(last_ports) == 0 else None
+        for ports_to_probe, is_cancelled in [(last_ports, None), (other_ports, is_last_port_back)]:
+            port, ser = self.__probe_ports_concurrently(ports_to_probe, is_cancelled)
+            if ser is not None:
+                self.arduino_port = port.device
+                self.serial_connection = ser
+                self.save_last_port_identity(port)
+                if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Connected to Arduino at port {self.arduino_port}")
+                return True # Connected to Arduino
+            if self.stop_event.is_set():
+                return False
+
+        if is_last_port_back is not None and is_last_port_back():
+            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Last port {last_port_identity['device']} is listed again, searching again")
+            return self.find_and_connect_to_arduino_port_if_possible()
         
         if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Among '{len(ports)}' number of ports, Arduino is not found")
         return False # Not connected to Arduino
 
-    def get_connection_status(self)->bool:
-        if self.serial_connection is not None and self.serial_connection.isOpen():
-            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Connection status: {True}")
+    def start(self):
+        self.is_running = True
+        self.stop_event.clear()
+        self.io_thread = threading.Thread(target=self.__io_loop, name="ArduinoCommunicator", daemon=True)
+        self.io_thread.start()
+
+    def stop(self):
+        # Stops the I/O thread, which closes the serial connection
+        self.is_running = False
+        self.stop_event.set()
+        if self.io_thread is not None:
+            self.io_thread.join(timeout=self.SERIAL_TIMEOUT + 1)
+            self.io_thread = None
+
+    def __io_loop(self):
+        while self.is_running:
+            if self.connection_state != "CONNECTED":
+                self.connection_state = "CONNECTING"
+                if not self.find_and_connect_to_arduino_port_if_possible():
+                    self.connection_state = "DISCONNECTED"
+                    self.__wait_before_next_search()
+                    continue
+                self.__clear_command_queue() # commands queued while disconnected are outdated
+                self.last_connection_check_time = time.time()
+                self.last_write_time = 0 # the requested state is sent right away
+                self.receive_buffer.clear()
+                self.last_arduino_uptime_ms = None
+                self.number_of_connections += 1
+                self.connection_state = "CONNECTED"
+
+            if self.is_connection_test_time_elapsed() and not self.is_getting_expected_reply_from_port():
+                self.__disconnect()
+                continue
+
+            try:
+                command = self.command_queue.get(timeout=min(0.1, max(0, self.last_write_time + self.HEARTBEAT_PERIOD_S - time.time())))
+                self.number_of_sent_commands += 1
+            except queue.Empty:
+                if time.time() - self.last_write_time < self.HEARTBEAT_PERIOD_S:
+                    continue
+                command = arduino_protocol.COMMAND_TURNSTILE_ON if self.is_turnstile_activation_requested else arduino_protocol.COMMAND_TURNSTILE_OFF
+                self.number_of_sent_heartbeats += 1
+            try:
+                is_acked = self.__send_frame(command)
+                self.last_write_time = time.time()
+                if not is_acked:
+                    if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))}      (NO ACK) -> Command {command} is not acked after {self.MAX_RETRANSMISSIONS} retransmissions")
+                    self.__disconnect()
+                    continue
+                self.stop_event.wait(self.WRITE_DELAY_S)
+            except (OSError, serial.SerialException) as e:
+                if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))}      (WRITE EXCEPT) ->{e}")
+                self.__disconnect()
+        self.shutdown_connection()
+        self.connection_state = "DISCONNECTED"
+
+    def __wait_before_next_search(self):
+        # Waits RECONNECT_PERIOD_S, but searches again right away when the missing last port is listed again, so a replugged Arduino is back after its reboot time
+        last_port_identity = self.load_last_port_identity()
+        is_last_port_missing = last_port_identity is not None and not self.__is_last_port_listed(last_port_identity)
+        wait_end_time = time.time() + self.RECONNECT_PERIOD_S
+        while time.time() < wait_end_time:
+            if self.stop_event.wait(min(self.LAST_PORT_POLL_PERIOD_S, max(0, wait_end_time - time.time()))):
+                return
+            if is_last_port_missing and self.__is_last_port_listed(last_port_identity):
+                return
+
+    def __disconnect(self):
+        self.shutdown_connection()
+        self.connection_state = "DISCONNECTED"
+
+    def __clear_command_queue(self):
+        try:
+            while True:
+                self.command_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def __put_command(self, command:int) -> bool:
+        # Returns False if the command is dropped, because the Arduino is not connected or the queue is full
+        if self.connection_state != "CONNECTED":
+            return False
+        try:
+            self.command_queue.put_nowait(command)
             return True
-        else:
-            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Connection status: {False}")
+        except queue.Full:
+            self.number_of_dropped_commands += 1
             return False
 
+    def get_connection_state(self)->str:
+        return self.connection_state
+
+    def get_connection_status(self)->bool:
+        is_connected = self.connection_state == "CONNECTED"
+        if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Connection status: {is_connected}")
+        return is_connected
+
+    def get_statistics(self) -> dict:
+        return {
+            "connection_state": self.connection_state,
+            "number_of_sent_commands": self.number_of_sent_commands,
+            "number_of_sent_heartbeats": self.number_of_sent_heartbeats,
+            "number_of_dropped_commands": self.number_of_dropped_commands,
+            "number_of_connections": self.number_of_connections,
+            "number_of_retransmissions": self.number_of_retransmissions,
+            "number_of_lost_frames": self.number_of_lost_frames,
+            "number_of_arduino_reboots": self.number_of_arduino_reboots,
+            "last_arduino_status": self.last_arduino_status,
+            "last_arduino_uptime_ms": self.last_arduino_uptime_ms,
+        }
+
+    def get_round_trip_statistics(self) -> dict:
+        # Percentiles and histogram of the round trip times of the last ROUND_TRIP_TIME_WINDOW_SIZE acked frames, in milliseconds
+        with self.round_trip_times_lock:
+            round_trip_times_ms = 1000 * np.array(self.round_trip_times_s, dtype=np.float64)
+        if len(round_trip_times_ms) == 0:
+            return {"number_of_round_trips": 0}
+        histogram_counts, _ = np.histogram(round_trip_times_ms, bins=self.ROUND_TRIP_TIME_HISTOGRAM_BIN_EDGES_MS)
+        bin_edges = self.ROUND_TRIP_TIME_HISTOGRAM_BIN_EDGES_MS
+        return {
+            "number_of_round_trips": len(round_trip_times_ms),
+            "mean_ms": float(np.mean(round_trip_times_ms)),
+            "p50_ms": float(np.percentile(round_trip_times_ms, 50)),
+            "p95_ms": float(np.percentile(round_trip_times_ms, 95)),
+            "p99_ms": float(np.percentile(round_trip_times_ms, 99)),
+            "max_ms": float(np.max(round_trip_times_ms)),
+            "histogram": {f"{bin_edges[i]:g}-{bin_edges[i + 1]:g} ms": int(count) for i, count in enumerate(histogram_counts)},
+        }
+
     def ensure_connection(self):
-        if self.is_connection_test_time_elapsed():
-            if not self.is_getting_expected_reply_from_port():                
-                self.find_and_connect_to_arduino_port_if_possible()
+        # The I/O thread keeps the connection alive, this only starts it if it is not running
+        if not self.is_running:
+            self.start()
 
-    def send_activate_turnstile_signal(self):
-        try:
-            self.serial_connection.write(b"1")
-            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))}      (ACTIVATE TURNSTILE) -> Data '1' sent to Arduino") 
-            time.sleep(self.WRITE_DELAY_S)
-        except Exception as e:                
-            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))}      (ACTIVATE TURNSTILE EXCEPT) ->{e}")
-
-    def send_ping_to_arduino(self):
-        # Send '0' to Arduino to let arduino know that the connection is still alive
-        try:
-            self.serial_connection.write(b"0")
-            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))}      (PING ARDUINO) -> Data '0' sent to Arduino") 
-            time.sleep(self.WRITE_DELAY_S)
-        except Exception as e:                
-            if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))}      (PING ARDUINO EXCEPT) ->{e}")
+    def set_turnstile_activation(self, is_activated:bool = False):
+        # Can be called on every frame, a command is only queued if the requested state changes
+        if is_activated == self.is_turnstile_activation_requested:
+            return
+        self.is_turnstile_activation_requested = is_activated
+        is_queued = self.__put_command(arduino_protocol.COMMAND_TURNSTILE_ON if is_activated else arduino_protocol.COMMAND_TURNSTILE_OFF)
+        if(self.VERBOSE):print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))}      (TURNSTILE {'ACTIVATED' if is_activated else 'RELEASED'}) -> {'queued' if is_queued else 'sent with the next heartbeat'}")
 
 if __name__ == "__main__":
     arduino_communicator = ArduinoCommunicator(baud_rate=9600, serial_timeout=2, expected_response="THIS_IS_ARDUINO", connection_test_period_s = 10, verbose = True, write_delay_s=0.05)
 
+    arduino_communicator.start()
     while True:
-        arduino_communicator.ensure_connection()             
         arduino_communicator.get_connection_status()
-
-        if random.uniform(0,1) < 0.1:
-            arduino_communicator.send_activate_turnstile_signal()
-        else:
-            arduino_communicator.send_ping_to_arduino()
+        arduino_communicator.set_turnstile_activation(is_activated = random.uniform(0,1) < 0.1)
     
         time.sleep(1)
@@ -0,0 +1,63 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+
+# Framed binary protocol between miru and the Arduino codes in arduino_codes/.
+# Command frame (host -> Arduino): [FRAME_START_BYTE, sequence number, command, crc8]
+# Ack (Arduino -> host):           [ACK_START_BYTE, sequence number, status, uptime_ms as little endian uint32, crc8]
+# The CRC is CRC-8 with the polynomial 0x07 over all bytes before it. The Arduino acks every frame with a valid CRC, corrupted frames are not acked
+# and are retransmitted by the host with the same sequence number. The commands are idempotent, so a command received twice does no harm.
+# The 'i' -> "THIS_IS_ARDUINO" handshake is kept outside of the frames to find the Arduino among the serial ports.
+FRAME_START_BYTE = 0xA5
+ACK_START_BYTE = 0x5A
+FRAME_LENGTH = 4
+ACK_LENGTH = 8
+
+COMMAND_TURNSTILE_ON = 0x01 # keeps the turnstile activated until it is released
+COMMAND_TURNSTILE_OFF = 0x02 # releases the turnstile, the Arduino keeps it activated for TURNSTILE_ON_TIME_MS more
+COMMAND_PING = 0x03 # only acked, used to test the connection
+
+STATUS_TURNSTILE_LATCHED = 0x01
+STATUS_TURNSTILE_ACTIVATED = 0x02
+STATUS_UNKNOWN_COMMAND = 0x80
+
+def _create_crc8_table(polynomial:int = 0x07) -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+_CRC8_TABLE = _create_crc8_table()
+
+def calculate_crc8(data:bytes = None) -> int:
+    crc = 0
+    for byte in data:
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+def encode_command_frame(sequence_number:int = 0, command:int = COMMAND_PING) -> bytes:
+    frame = bytes([FRAME_START_BYTE, sequence_number & 0xFF, command & 0xFF])
+    return frame + bytes([calculate_crc8(frame)])
+
+def encode_ack(sequence_number:int = 0, status:int = 0, uptime_ms:int = 0) -> bytes:
+    ack = bytes([ACK_START_BYTE, sequence_number & 0xFF, status & 0xFF]) + (uptime_ms & 0xFFFFFFFF).to_bytes(4, "little")
+    return ack + bytes([calculate_crc8(ack)])
+
+def pop_acks(receive_buffer:bytearray = None) -> List[Tuple[int, int, int]]:
+    # Removes the complete acks from the start of the buffer and returns their (sequence number, status, uptime_ms).
+    # Bytes that do not start a valid ack, e.g. the text of the 'i' handshake or a corrupted ack, are skipped. An incomplete ack is left in the buffer
+    acks = []
+    while True:
+        start_index = receive_buffer.find(bytes([ACK_START_BYTE]))
+        if start_index < 0:
+            receive_buffer.clear()
+            return acks
+        del receive_buffer[:start_index]
+        if len(receive_buffer) < ACK_LENGTH:
+            return acks
+        if calculate_crc8(receive_buffer[:ACK_LENGTH - 1]) == receive_buffer[ACK_LENGTH - 1]:
+            acks.append((receive_buffer[1], receive_buffer[2], int.from_bytes(receive_buffer[3:7], "little")))
+            del receive_buffer[:ACK_LENGTH]
+        else:
+            del receive_buffer[:1]
@@ -0,0 +1,72 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import numpy as np
+
+def calculate_containment_matrix(bboxes1:np.ndarray = None, bboxes2:np.ndarray = None) -> np.ndarray:
+    # (M,4) x (N,4) integer xyxy boxes -> (M,N) matrix of how much percentage of each bbox2 is inside each bbox1. Box edges are inclusive pixels
+    bboxes1, bboxes2 = np.asarray(bboxes1, dtype=np.int64).reshape(-1, 4), np.asarray(bboxes2, dtype=np.int64).reshape(-1, 4)
+    intersection_widths = np.maximum(np.minimum(bboxes1[:, None, 2], bboxes2[None, :, 2]) - np.maximum(bboxes1[:, None, 0], bboxes2[None, :, 0]) + 1, 0)
+    intersection_heights = np.maximum(np.minimum(bboxes1[:, None, 3], bboxes2[None, :, 3]) - np.maximum(bboxes1[:, None, 1], bboxes2[None, :, 1]) + 1, 0)
+    bbox2_areas = (bboxes2[:, 2] - bboxes2[:, 0] + 1) * (bboxes2[:, 3] - bboxes2[:, 1] + 1)
+    return intersection_widths * intersection_heights / bbox2_areas[None, :]
+
+def calculate_pairwise_containments(bboxes1:np.ndarray = None, bboxes2:np.ndarray = None) -> np.ndarray:
+    # (K,4) and (K,4) integer xyxy boxes -> (K,) how much percentage of bboxes2[k] is inside bboxes1[k]
+    intersection_widths = np.clip(np.minimum(bboxes1[:, 2], bboxes2[:, 2]) - np.maximum(bboxes1[:, 0], bboxes2[:, 0]) + 1, 0, None)
+    intersection_heights = np.clip(np.minimum(bboxes1[:, 3], bboxes2[:, 3]) - np.maximum(bboxes1[:, 1], bboxes2[:, 1]) + 1, 0, None)
+    bbox2_areas = (bboxes2[:, 2] - bboxes2[:, 0] + 1) * (bboxes2[:, 3] - bboxes2[:, 1] + 1)
+    return intersection_widths * intersection_heights / bbox2_areas
+
+def calculate_pairwise_ious(bboxes1:np.ndarray = None, bboxes2:np.ndarray = None) -> np.ndarray:
+    # (K,4) and (K,4) integer xyxy boxes -> (K,) intersection over union of bboxes1[k] and bboxes2[k]
+    intersection_widths = np.clip(np.minimum(bboxes1[:, 2], bboxes2[:, 2]) - np.maximum(bboxes1[:, 0], bboxes2[:, 0]) + 1, 0, None)
+    intersection_heights = np.clip(np.minimum(bboxes1[:, 3], bboxes2[:, 3]) - np.maximum(bboxes1[:, 1], bboxes2[:, 1]) + 1, 0, None)
+    intersection_areas = intersection_widths * intersection_heights
+    bbox1_areas = (bboxes1[:, 2] - bboxes1[:, 0] + 1) * (bboxes1[:, 3] - bboxes1[:, 1] + 1)
+    bbox2_areas = (bboxes2[:, 2] - bboxes2[:, 0] + 1) * (bboxes2[:, 3] - bboxes2[:, 1] + 1)
+    return intersection_areas / (bbox1_areas + bbox2_areas - intersection_areas)
+
+def _expand_ranges(starts:np.ndarray, counts:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns (owners, values): for every i, owners gets counts[i] copies of i and values gets starts[i], starts[i]+1, ... starts[i]+counts[i]-1
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, starts[owners] + offsets
+
+def _get_box_cells(bboxes:np.ndarray, cell_size:int, grid_width:int) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns (box_indices, cell_keys), one entry for every grid cell each box touches
+    first_cells = np.maximum(bboxes[:, 0:2], 0) // cell_size
+    last_cells = np.maximum(np.maximum(bboxes[:, 2:4], 0) // cell_size, first_cells)
+    cells_per_row = last_cells[:, 0] - first_cells[:, 0] + 1
+    number_of_cells = cells_per_row * (last_cells[:, 1] - first_cells[:, 1] + 1)
+    box_indices, cell_offsets = _expand_ranges(np.zeros(len(bboxes), dtype=np.int64), number_of_cells)
+    cell_x = first_cells[box_indices, 0] + cell_offsets % cells_per_row[box_indices]
+    cell_y = first_cells[box_indices, 1] + cell_offsets // cells_per_row[box_indices]
+    return box_indices, cell_y * grid_width + cell_x
+
+def find_contained_pairs(container_bboxes:np.ndarray = None, bboxes:np.ndarray = None, containment_threshold:float = 0.5, grid_cell_size:int = 64, grid_min_pairs:int = 4096) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns (container_indices, bbox_indices) of the pairs where more than containment_threshold of the bbox is inside the container bbox, sorted by container.
+    # With few boxes the full containment matrix is computed. If there are at least grid_min_pairs possible pairs, both box sets are put into a uniform grid
+    # of grid_cell_size pixels and only the pairs sharing a cell are checked, since boxes in different cells cannot intersect.
+    container_bboxes, bboxes = np.asarray(container_bboxes, dtype=np.int64).reshape(-1, 4), np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+    if len(container_bboxes) == 0 or len(bboxes) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    if len(container_bboxes) * len(bboxes) < grid_min_pairs:
+        container_indices, bbox_indices = np.nonzero(calculate_containment_matrix(container_bboxes, bboxes) > containment_threshold)
+        return container_indices.astype(np.int64), bbox_indices.astype(np.int64)
+
+    grid_width = int(max(np.max(container_bboxes[:, 2]), np.max(bboxes[:, 2]), 0)) // grid_cell_size + 1
+    container_entries, container_cell_keys = _get_box_cells(container_bboxes, grid_cell_size, grid_width)
+    bbox_entries, bbox_cell_keys = _get_box_cells(bboxes, grid_cell_size, grid_width)
+
+    # Join the two sets on the cell keys: every container cell entry is paired with the range of bbox entries of the same cell
+    order = np.argsort(bbox_cell_keys, kind="stable")
+    bbox_entries, bbox_cell_keys = bbox_entries[order], bbox_cell_keys[order]
+    range_starts = np.searchsorted(bbox_cell_keys, container_cell_keys, side="left")
+    range_counts = np.searchsorted(bbox_cell_keys, container_cell_keys, side="right") - range_starts
+    container_entry_indices, sorted_bbox_positions = _expand_ranges(range_starts, range_counts)
+
+    # Boxes sharing several cells appear more than once
+    pair_keys = np.unique(container_entries[container_entry_indices] * len(bboxes) + bbox_entries[sorted_bbox_positions])
+    container_indices, bbox_indices = pair_keys // len(bboxes), pair_keys % len(bboxes)
+    is_contained = calculate_pairwise_containments(container_bboxes[container_indices], bboxes[bbox_indices]) > containment_threshold
+    return container_indices[is_contained], bbox_indices[is_contained]
@@ -0,0 +1,126 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import threading
+import numpy as np
+
+#keypoints detected by the pose model in the detection order
+KEYPOINT_NAMES = ["nose", "right_eye", "left_eye", "left_ear", "right_ear", "left_shoulder", "right_shoulder", "left_elbow" ,"right_elbow","left_wrist", "right_wrist", "left_hip", "right_hip", "left_knee", "right_knee", "left_ankle", "right_ankle"]
+KEYPOINT_INDICES = {keypoint_name: keypoint_index for keypoint_index, keypoint_name in enumerate(KEYPOINT_NAMES)}
+
+class Detections:
+    # Predictions of a detector for one frame as contiguous arrays, row i of every array belongs to the same detection.
+    # The per-detection dicts of the older code are only built on request by to_prediction_dicts().
+
+    __id_lock = threading.Lock()
+    __next_detection_id = 0
+
+    def __init__(self, detector_type:str = "", frame_shape:Tuple[int,int] = (0, 0), class_names:Dict[int,str] = None, boxes:np.ndarray = None, conf:np.ndarray = None, cls:np.ndarray = None, keypoints:np.ndarray = None, ids:np.ndarray = None, track_ids:np.ndarray = None):
+        self.detector_type = detector_type # which detector made these predictions
+        self.frame_shape = tuple(frame_shape) # (height, width) in pixels
+        self.class_names = class_names if class_names is not None else {} # class id -> class name
+
+        self.boxes = np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 4) # (N,4) [x1,y1,x2,y2] in pixels
+        self.conf = np.ascontiguousarray(conf, dtype=np.float32).reshape(-1) # (N,) 0.0 to 1.0
+        self.cls = np.ascontiguousarray(cls, dtype=np.int64).reshape(-1) # (N,) class ids
+        self.keypoints = None if keypoints is None else np.ascontiguousarray(keypoints, dtype=np.float32).reshape(-1, len(KEYPOINT_NAMES), 3) # (N,17,3) [x,y,confidence], x=y=0 if not detected
+        self.ids = Detections.allocate_ids(len(self.boxes)) if ids is None else np.ascontiguousarray(ids, dtype=np.int64).reshape(-1) # (N,) unique detection ids
+        self.track_ids = np.full(len(self.boxes), -1, dtype=np.int64) if track_ids is None else np.ascontiguousarray(track_ids, dtype=np.int64).reshape(-1) # (N,) ids of the tracks the detections belong to, -1 if not tracked
+
+    @staticmethod
+    def allocate_ids(number_of_ids:int) -> np.ndarray:
+        with Detections.__id_lock:
+            first_id = Detections.__next_detection_id
+            Detections.__next_detection_id += number_of_ids
+        return np.arange(first_id, first_id + number_of_ids, dtype=np.int64)
+
+    @staticmethod
+    def create_empty(detector_type:str = "", frame_shape:Tuple[int,int] = (0, 0), class_names:Dict[int,str] = None, with_keypoints:bool = False) -> "Detections":
+        return Detections(detector_type=detector_type, frame_shape=frame_shape, class_names=class_names, boxes=np.zeros((0, 4)), conf=np.zeros(0), cls=np.zeros(0), keypoints=np.zeros((0, len(KEYPOINT_NAMES), 3)) if with_keypoints else None, ids=np.zeros(0))
+
+    @staticmethod
+    def concatenate(detections_list:List["Detections"] = None) -> "Detections":
+        # All elements should come from the same detector
+        first = detections_list[0]
+        return Detections(
+            detector_type=first.detector_type,
+            frame_shape=first.frame_shape,
+            class_names=first.class_names,
+            boxes=np.concatenate([detections.boxes for detections in detections_list]),
+            conf=np.concatenate([detections.conf for detections in detections_list]),
+            cls=np.concatenate([detections.cls for detections in detections_list]),
+            keypoints=None if first.keypoints is None else np.concatenate([detections.keypoints for detections in detections_list]),
+            ids=np.concatenate([detections.ids for detections in detections_list]),
+            track_ids=np.concatenate([detections.track_ids for detections in detections_list]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def select(self, selection) -> "Detections":
+        # Boolean mask or indices of the detections to keep, the ids are kept as well
+        return Detections(
+            detector_type=self.detector_type,
+            frame_shape=self.frame_shape,
+            class_names=self.class_names,
+            boxes=self.boxes[selection],
+            conf=self.conf[selection],
+            cls=self.cls[selection],
+            keypoints=None if self.keypoints is None else self.keypoints[selection],
+            ids=self.ids[selection],
+            track_ids=self.track_ids[selection],
+        )
+
+    def get_index_of_id(self, detection_id:int = -1) -> int:
+        # Returns the row of the detection with the given id, -1 if there is none
+        indices = np.flatnonzero(self.ids == detection_id)
+        return int(indices[0]) if len(indices) > 0 else -1
+
+    def get_index_of_track_id(self, track_id:int = -1) -> int:
+        # Returns the row of the detection that belongs to the given track, -1 if there is none
+        if track_id == -1:
+            return -1
+        indices = np.flatnonzero(self.track_ids == track_id)
+        return int(indices[0]) if len(indices) > 0 else -1
+
+    def set_track_ids(self, detection_ids:np.ndarray = None, track_ids:np.ndarray = None):
+        # Writes the track id of each given detection id onto the matching rows, the other rows are marked as not tracked
+        detection_ids, track_ids = np.asarray(detection_ids, dtype=np.int64).reshape(-1), np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        self.track_ids[:] = -1
+        if len(self.ids) == 0 or len(detection_ids) == 0:
+            return
+        sorter = np.argsort(self.ids)
+        rows = sorter[np.clip(np.searchsorted(self.ids, detection_ids, sorter=sorter), 0, len(self.ids) - 1)]
+        is_found = self.ids[rows] == detection_ids
+        self.track_ids[rows[is_found]] = track_ids[is_found]
+
+    def get_class_names(self) -> List[str]:
+        return [self.class_names[class_id] for class_id in self.cls.tolist()]
+
+    def to_formatted_predictions_list(self) -> List[List]:
+        # each element of this list is of the form [class_name, confidence, (x1, y1, x2, y2)]
+        boxes = self.boxes.astype(np.int64).tolist()
+        return [[class_name, confidence, tuple(box)] for class_name, confidence, box in zip(self.get_class_names(), self.conf.tolist(), boxes)]
+
+    def to_prediction_dicts(self) -> List[Dict]:
+        # Backward compatible per-detection dicts, in the format the detectors used to return
+        prediction_dicts = []
+        for i, class_name in enumerate(self.get_class_names()):
+            box_xyxy = self.boxes[i]
+            prediction_dict = {
+                "DETECTOR_TYPE": self.detector_type,                                    # which detector made this prediction
+                "detection_id": int(self.ids[i]),                                       # unique id for the detection
+                "track_id": int(self.track_ids[i]),                                     # id of the tracked face of the person, -1 if not tracked
+                "frame_shape": list(self.frame_shape),                                  # [height , width] in pixels
+                "class_name": class_name,                                               # hard_hat, no_hard_hat
+                "bbox_confidence": self.conf[i],                                        # 0.0 to 1.0
+                "bbox_xyxy_px": box_xyxy,                                               # [x1,y1,x2,y2] in pixels
+                "bbox_center_px": [(box_xyxy[0]+box_xyxy[2])/2, (box_xyxy[1]+box_xyxy[3])/2], # [x,y] in pixels
+            }
+            if self.keypoints is not None:
+                prediction_dict["keypoints"] = {}                                       # Keypoints are in the format [x,y,confidence]
+                for keypoint_index, keypoint_name in enumerate(KEYPOINT_NAMES):
+                    keypoint_x, keypoint_y, keypoint_conf = self.keypoints[i, keypoint_index]
+                    if keypoint_x == 0 and keypoint_y == 0: #if the keypoint is not detected, negative confidence is used to indicate it
+                        keypoint_conf = -keypoint_conf
+                    prediction_dict["keypoints"][keypoint_name] = [keypoint_x, keypoint_y, keypoint_conf]
+            prediction_dicts.append(prediction_dict)
+        return prediction_dicts
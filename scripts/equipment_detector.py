@@ -1,56 +1,71 @@
-from ultralytics import YOLO
-import copy 
+import numpy as np
 from typing import List, Dict, Tuple #for python3.8 compatibility
+import inference_backends
+import detections
 
 class EquipmentDetector():
 
     EQUIPMENT_MODEL_PATHS = {
         "miru_model_03_08_2024": "trained_yolo_models/miru_model_03_08_2024.pt",
+        "miru_model_03_08_2024_int8": "trained_yolo_models/miru_model_03_08_2024_int8.onnx", # produced by training/quantize_models.py, needs the "onnxruntime" or "openvino" backend
     }
-    def __init__(self, model_name : str = None) -> None:
+    def __init__(self, model_name : str = None, face_crop_size:int = 224, face_crop_margins:Tuple[float,float,float,float] = (0.25, 0.6, 0.25, 0.5), inference_backend:str = "pytorch", intra_op_threads:int = None) -> None:
         self.MODEL_PATH = EquipmentDetector.EQUIPMENT_MODEL_PATHS[model_name]
-        self.yolo_object = YOLO(self.MODEL_PATH)
-        self.recent_prediction_results = []
-    
-    def __get_empty_prediction_dict_template(self) -> dict:
-        empty_prediction_dict = {   
-                    "DETECTOR_TYPE":"Equipment Detector",                             # which detector made this prediction
-                    "frame_shape": [0,0],                                       # [0,0], [height , width] in pixels
-                    "class_name":"",                                            # hard_hat, no_hard_hat
-                    "bbox_confidence":0,                                        # 0.0 to 1.0
-                    "bbox_xyxy_px":[0,0,0,0],                                   # [x1,y1,x2,y2] in pixels
-                    "bbox_center_px": [0,0],                                    # [x,y] in pixels
-        }
-        return empty_prediction_dict
+        self.inference_backend = inference_backends.create_inference_backend(backend_name=inference_backend, model_path=self.MODEL_PATH, task="detect", intra_op_threads=intra_op_threads) # "pytorch", "onnxruntime" or "openvino"
+        self.recent_prediction_results = detections.Detections.create_empty(detector_type="Equipment Detector", class_names=self.inference_backend.names) # predictions of the last frame
+
+        self.FACE_CROP_SIZE = face_crop_size # edge length of the square face crops in face-ROI mode, should be a multiple of 32
+        self.FACE_CROP_MARGINS = face_crop_margins # (left, top, right, bottom) margins in terms of the face box size
     
+    def __create_detections(self, frame_shape:Tuple[int,int], boxes:np.ndarray, confidences:np.ndarray, class_ids:np.ndarray) -> detections.Detections:
+        return detections.Detections(detector_type="Equipment Detector", frame_shape=frame_shape, class_names=self.inference_backend.names, boxes=boxes, conf=confidences, cls=class_ids)
+
     def predict_frame(self, frame, bbox_confidence = 0.5) -> None:
-        self.recent_prediction_results = []
-        
-        results = self.yolo_object(frame, task = "detect", verbose= False)[0]
-        for i, result in enumerate(results):
-            boxes = result.boxes
-            box_cls_no = int(boxes.cls.cpu().numpy()[0])
-            box_cls_name = self.yolo_object.names[box_cls_no]           
-            box_conf = boxes.conf.cpu().numpy()[0]
-            if box_conf < bbox_confidence:
-                continue
-            box_xyxy = boxes.xyxy.cpu().numpy()[0]
-
-            prediction_dict_template = self.__get_empty_prediction_dict_template()
-            prediction_dict_template["frame_shape"] = list(results.orig_shape)
-            prediction_dict_template["class_name"] = box_cls_name
-            prediction_dict_template["bbox_confidence"] = box_conf
-            prediction_dict_template["bbox_xyxy_px"] = box_xyxy # Bounding box in the format [x1,y1,x2,y2]
-            prediction_dict_template["bbox_center_px"] = [ (box_xyxy[0]+box_xyxy[2])/2, (box_xyxy[1]+box_xyxy[3])/2]
-            
-            self.recent_prediction_results.append(prediction_dict_template)
-        
-    def return_formatted_predictions_list(self) -> List[Dict]:
-        formatted_predictions_list = [] # each element of this list is of the form ["tpye", (x1, y1, x2, y2)]
-        for prediction in self.recent_prediction_results:
-            formatted_predictions_list.append(copy.deepcopy([prediction["class_name"], prediction["bbox_confidence"], tuple(map(int, prediction["bbox_xyxy_px"]))]))
+        results = self.inference_backend.predict([frame])[0]
+        is_kept = results["confidences"] >= bbox_confidence
+        self.recent_prediction_results = self.__create_detections(results["orig_shape"], results["boxes_xyxy"][is_kept], results["confidences"][is_kept], results["class_ids"][is_kept])
 
-        return formatted_predictions_list
+    def get_face_crop_regions(self, face_bboxes:np.ndarray = None) -> List[List[float]]:
+        # Face boxes are (N,5) [x1, y1, x2, y2, detection_id] rows. They are enlarged so that hair nets (above the forehead) and beard nets (below the chin) stay inside the crop, then made square
+        crop_regions = []
+        for face_bbox in face_bboxes:
+            face_width, face_height = face_bbox[2] - face_bbox[0], face_bbox[3] - face_bbox[1]
+            x1 = face_bbox[0] - self.FACE_CROP_MARGINS[0] * face_width
+            y1 = face_bbox[1] - self.FACE_CROP_MARGINS[1] * face_height
+            x2 = face_bbox[2] + self.FACE_CROP_MARGINS[2] * face_width
+            y2 = face_bbox[3] + self.FACE_CROP_MARGINS[3] * face_height
 
+            edge_length = max(x2 - x1, y2 - y1)
+            center_x, center_y = (x1 + x2) / 2, (y1 + y2) / 2
+            crop_regions.append([center_x - edge_length / 2, center_y - edge_length / 2, center_x + edge_length / 2, center_y + edge_length / 2])
+        return crop_regions
 
-    
+    def predict_face_crops(self, raw_frame:np.ndarray = None, face_bboxes:np.ndarray = None, frame_geometry = None, frame_shape:List[int] = None, bbox_confidence:float = 0.5) -> None:
+        # Face-ROI mode: the face regions are cut out of the full resolution raw frame and all crops are predicted in a single batched call.
+        # Boxes are mapped back to the model input frame, so the results are interchangeable with the ones of predict_frame.
+        face_crops, crop_transforms = [], []
+        for crop_region in self.get_face_crop_regions(face_bboxes=face_bboxes):
+            face_crop, crop_transform = frame_geometry.crop_model_region_from_raw(raw_frame=raw_frame, model_region=crop_region, output_size=(self.FACE_CROP_SIZE, self.FACE_CROP_SIZE))
+            if face_crop is not None:
+                face_crops.append(face_crop)
+                crop_transforms.append(crop_transform)
+
+        if len(face_crops) == 0:
+            self.recent_prediction_results = self.__create_detections(frame_shape[:2], np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+            return
+
+        batch_results = self.inference_backend.predict(face_crops, imgsz = self.FACE_CROP_SIZE)
+
+        # The boxes of all crops are stacked and mapped to the model input frame at once, each box with the (scale_x, offset_x, scale_y, offset_y) of its crop
+        crop_indices = np.repeat(np.arange(len(batch_results)), [len(results["confidences"]) for results in batch_results])
+        boxes = np.concatenate([np.asarray(results["boxes_xyxy"], dtype=np.float32).reshape(-1, 4) for results in batch_results])
+        confidences = np.concatenate([results["confidences"] for results in batch_results])
+        class_ids = np.concatenate([results["class_ids"] for results in batch_results])
+        is_kept = confidences >= bbox_confidence
+        crop_transforms = np.asarray(crop_transforms, dtype=np.float32)[crop_indices[is_kept]]
+        boxes = boxes[is_kept] * crop_transforms[:, [0, 2, 0, 2]] + crop_transforms[:, [1, 3, 1, 3]]
+        self.recent_prediction_results = self.__create_detections(frame_shape[:2], boxes, confidences[is_kept], class_ids[is_kept])
+        
+    def return_formatted_predictions_list(self) -> List[List]:
+        # each element of this list is of the form [class_name, confidence, (x1, y1, x2, y2)], kept for backward compatibility
+        return self.recent_prediction_results.to_formatted_predictions_list()
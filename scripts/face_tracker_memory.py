@@ -4,11 +4,47 @@ import picasso
 import numpy as np
 import cv2
 import time
-
-class Face:
-    def __init__(self, age_limit:int = 3, sample_size:int = 5, face_bbox:List[Tuple[int,int,int,int,str]] = None):
-        self.AGE_LIMIT = age_limit
+import detections
+import linear_assignment
+import kalman_filter
+import box_association
+
+class FaceStore:
+    # Equipment confidences and rule states of all tracked faces in preallocated arrays, row i belongs to the face in slot i.
+    # The confidences of the last SAMPLE_SIZE detections are kept in a ring buffer with running sums, so the means are O(1) per face and class.
+    # The rules of all faces are evaluated in one vectorized step with hysteresis, a rule only turns on or off when its evidence is strong enough:
+    #   "WINDOW_MEAN" (default): the mean of the last SAMPLE_SIZE samples has to cross the upper threshold to turn on and the lower one to turn off.
+    #   "SPRT" (opt-in): Wald's sequential probability ratio test. Every sample is binned by the thresholds and adds the log-likelihood ratio of its bin for "worn" vs
+    #           "not worn" to an accumulator per face and class.
+    #           The rule turns on when the accumulator reaches log((1-beta)/alpha) and off when it reaches log(beta/(1-alpha)). The accumulator is clamped to
+    #           these bounds, so clear evidence decides after one or two samples, while a decided rule needs the full distance between the bounds to flip.
+    #           The bin probabilities of EQUIPMENT_SAMPLE_BIN_PROBABILITIES are set by hand, not fitted from labelled detections yet, so the false accept
+    #           rate only holds as far as they match the detector. Keep it opt-in until they are fitted.
+    # The arrays pay off with many faces, not with the one or few faces a kiosk normally sees. Per testing/benchmark_face_store.py the store is as fast as
+    # the previous per-face lists at 20 faces and about 4x faster at 100, but at 1 to 10 faces it runs at 0.2x-0.6x of their speed (about 30-100 us per frame):
+    # the NumPy call overhead does not shrink with the number of faces and the SPRT evidence is kept as well. Up to SCALAR_UPDATE_MAX_FACES faces are
+    # updated one by one with Python floats to keep this cost down, with the same results.
+    # The verdict of each face is cached: once it is confirmed, the equipment of the face is only checked again after VERIFICATION_INTERVAL_S, and the interval
+    # doubles up to MAX_VERIFICATION_INTERVAL_S for every check that confirms the same verdict. Moving the face box away from the checked box invalidates the cache.
+    # With WINDOW_MEAN a verdict is only confirmed once SAMPLE_SIZE real samples exist, so a few missed first detections of a new face do not cache a reject.
+    # A pass has to be revoked quickly: an allowed verdict is re-checked at least every MAX_ALLOWED_VERIFICATION_INTERVAL_S, and a check that misses a required
+    # equipment drops its cache, so the face is checked on every detection until the verdict is confirmed again.
+    EQUIPMENT_CLASS_NAMES = ["hair_net", "beard_net", "safety_goggles", "blue_surgical_mask", "white_surgical_mask"]
+    EQUIPMENT_CLASS_INDICES = {class_name: class_index for class_index, class_name in enumerate(EQUIPMENT_CLASS_NAMES)}
+    RULE_NAMES = ["is_hairnet_worn", "is_safety_google_worn", "is_beard_present", "is_beardnet_worn", "is_surgical_mask_worn"]
+    RULE_INDICES = {rule_name: rule_index for rule_index, rule_name in enumerate(RULE_NAMES)}
+
+    def __init__(self, capacity:int = 16, sample_size:int = 5, decision_method:str = "WINDOW_MEAN", false_accept_rate:float = 0.005, false_reject_rate:float = 0.05, verification_interval_s:float = 0.5, max_verification_interval_s:float = 2.0, max_allowed_verification_interval_s:float = 0.5, verdict_invalidation_iou:float = 0.5, scalar_update_max_faces:int = 3):
         self.SAMPLE_SIZE = sample_size
+        self.DECISION_METHOD = decision_method # "SPRT" or "WINDOW_MEAN"
+        self.FALSE_ACCEPT_RATE = false_accept_rate # alpha, probability that the SPRT decides "worn" for equipment that is not worn
+        self.FALSE_REJECT_RATE = false_reject_rate # beta, probability that the SPRT decides "not worn" for equipment that is worn
+        self.VERIFICATION_INTERVAL_S = verification_interval_s # first re-check interval of a confirmed verdict, 0 checks the equipment on every detection
+        self.MAX_VERIFICATION_INTERVAL_S = max_verification_interval_s
+        self.MAX_ALLOWED_VERIFICATION_INTERVAL_S = max_allowed_verification_interval_s # bounds the time until a pass is revoked
+        self.VERIFICATION_BACKOFF_FACTOR = 2.0
+        self.VERDICT_INVALIDATION_IOU = verdict_invalidation_iou # the cached verdict is dropped if the IoU of the face box and the checked box falls below this
+        self.SCALAR_UPDATE_MAX_FACES = scalar_update_max_faces # up to this many faces the samples and rules are updated face by face with Python floats, NumPy call overhead dominates for a handful of values
         self.EQUIPMENT_CONFIDENCE_THRESHOLDS = {
             "hair_net":[0.10,0.35],
             "beard_net":[0.10,0.35],
@@ -16,116 +52,274 @@ class Face:
             "blue_surgical_mask":[0.25,0.50],
             "white_surgical_mask":[0.25,0.50],
         }
+        thresholds = np.array([self.EQUIPMENT_CONFIDENCE_THRESHOLDS[class_name] for class_name in self.EQUIPMENT_CLASS_NAMES], dtype=np.float64)
+        self.LOWER_THRESHOLDS, self.UPPER_THRESHOLDS = thresholds[:, 0], thresholds[:, 1] # (classes,)
+
+        # A sample falls into one of three bins: [missed or below the lower threshold, between the thresholds, above the upper threshold].
+        # [worn, not worn]: how likely each bin is for a face wearing the equipment and for a face not wearing it. Hand-set, to be fitted from labelled detections
+        self.EQUIPMENT_SAMPLE_BIN_PROBABILITIES = {
+            "hair_net":[[0.15,0.15,0.70], [0.92,0.05,0.03]],
+            "beard_net":[[0.15,0.15,0.70], [0.92,0.05,0.03]],
+            "safety_goggles":[[0.15,0.15,0.70], [0.92,0.05,0.03]],
+            "blue_surgical_mask":[[0.25,0.20,0.55], [0.90,0.07,0.03]],
+            "white_surgical_mask":[[0.25,0.20,0.55], [0.90,0.07,0.03]],
+        }
+        sample_bin_probabilities = np.array([self.EQUIPMENT_SAMPLE_BIN_PROBABILITIES[class_name] for class_name in self.EQUIPMENT_CLASS_NAMES], dtype=np.float64)
+        self.SAMPLE_BIN_LOG_LIKELIHOOD_RATIOS = np.log(sample_bin_probabilities[:, 0] / sample_bin_probabilities[:, 1]) # (classes, bins) evidence of a sample for "worn"
+        self.ACCEPT_BOUND = np.log((1 - false_reject_rate) / false_accept_rate)
+        self.REJECT_BOUND = np.log(false_reject_rate / (1 - false_accept_rate))
+
+        single_class_rules = [("is_hairnet_worn", "hair_net"), ("is_safety_google_worn", "safety_goggles"), ("is_beardnet_worn", "beard_net")]
+        self.SINGLE_CLASS_RULE_INDICES = np.array([self.RULE_INDICES[rule_name] for rule_name, _ in single_class_rules])
+        self.SINGLE_CLASS_RULE_CLASS_INDICES = np.array([self.EQUIPMENT_CLASS_INDICES[class_name] for _, class_name in single_class_rules])
+        self.MASK_RULE_INDEX = self.RULE_INDICES["is_surgical_mask_worn"]
+        self.MASK_CLASS_INDICES = np.array([self.EQUIPMENT_CLASS_INDICES["blue_surgical_mask"], self.EQUIPMENT_CLASS_INDICES["white_surgical_mask"]])
+        self.REQUIRED_RULE_INDICES = np.array([self.RULE_INDICES["is_hairnet_worn"], self.RULE_INDICES["is_safety_google_worn"]]) # rules of is_allowed_to_pass
+        self.REQUIRED_CLASS_INDICES = np.array([self.EQUIPMENT_CLASS_INDICES["hair_net"], self.EQUIPMENT_CLASS_INDICES["safety_goggles"]])
+
+        self.confidence_samples = np.zeros((capacity, len(self.EQUIPMENT_CLASS_NAMES), sample_size)) # ring buffers of the equipment confidences
+        self.confidence_sums = np.zeros((capacity, len(self.EQUIPMENT_CLASS_NAMES))) # running sums of the ring buffers
+        self.sample_positions = np.zeros(capacity, dtype=np.int64) # next position to write in the ring buffers of each face
+        self.number_of_samples = np.zeros(capacity, dtype=np.int64) # real samples in the ring buffers, up to SAMPLE_SIZE. The rest are the zeros of a new face
+        self.log_likelihood_ratios = np.zeros((capacity, len(self.EQUIPMENT_CLASS_NAMES))) # SPRT accumulators, clamped to [REJECT_BOUND, ACCEPT_BOUND]
+        self.is_equipment_decided = np.zeros((capacity, len(self.EQUIPMENT_CLASS_NAMES)), dtype=bool) # whether the last rule update could turn each class on or off
+        self.is_rule_obeyed = np.zeros((capacity, len(self.RULE_NAMES)), dtype=bool) # hysteresis state of the rules
+        self.is_slot_used = np.zeros(capacity, dtype=bool)
+
+        self.verified_bboxes = np.zeros((capacity, 4), dtype=np.int64) # face box at the last equipment check
+        self.verified_verdicts = np.zeros(capacity, dtype=bool) # is_allowed_to_pass after the last equipment check
+        self.verification_intervals = np.zeros(capacity) # seconds until the next check, 0 while the verdict is not confirmed
+        self.next_verification_times = np.zeros(capacity)
+
+    def get_capacity(self) -> int:
+        return len(self.is_slot_used)
+
+    def __grow(self, minimum_capacity:int):
+        new_capacity = max(minimum_capacity, 2 * self.get_capacity())
+        def grown(array):
+            new_array = np.zeros((new_capacity,) + array.shape[1:], dtype=array.dtype)
+            new_array[:len(array)] = array
+            return new_array
+        self.confidence_samples, self.confidence_sums, self.sample_positions = grown(self.confidence_samples), grown(self.confidence_sums), grown(self.sample_positions)
+        self.number_of_samples = grown(self.number_of_samples)
+        self.log_likelihood_ratios = grown(self.log_likelihood_ratios)
+        self.is_equipment_decided, self.is_rule_obeyed, self.is_slot_used = grown(self.is_equipment_decided), grown(self.is_rule_obeyed), grown(self.is_slot_used)
+        self.verified_bboxes, self.verified_verdicts = grown(self.verified_bboxes), grown(self.verified_verdicts)
+        self.verification_intervals, self.next_verification_times = grown(self.verification_intervals), grown(self.next_verification_times)
+
+    def allocate_slots(self, number_of_slots:int) -> np.ndarray:
+        # Returns the slots of new faces, which start with no equipment and no obeyed rule
+        free_slots = np.flatnonzero(~self.is_slot_used)
+        if len(free_slots) < number_of_slots:
+            self.__grow(self.get_capacity() - len(free_slots) + number_of_slots)
+            free_slots = np.flatnonzero(~self.is_slot_used)
+        slots = free_slots[:number_of_slots]
+
+        self.confidence_samples[slots] = 0
+        self.confidence_sums[slots] = 0
+        self.sample_positions[slots] = 0
+        self.number_of_samples[slots] = 0
+        self.log_likelihood_ratios[slots] = 0 # no evidence yet
+        self.is_equipment_decided[slots] = False
+        self.is_rule_obeyed[slots] = False
+        self.verification_intervals[slots] = 0 # a new face is checked on every detection until its verdict is confirmed
+        self.is_slot_used[slots] = True
+        return slots
+
+    def release_slots(self, slots:np.ndarray = None):
+        self.is_slot_used[np.asarray(slots, dtype=np.int64)] = False
+
+    def append_detection_confidences(self, slots:np.ndarray = None, confidences:np.ndarray = None):
+        # confidences: (M, classes) the highest confidence of each equipment class on each face in the newest detection, 0 if not detected
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        confidences = np.asarray(confidences, dtype=np.float64).reshape(len(slots), len(self.EQUIPMENT_CLASS_NAMES))
+        if len(slots) <= self.SCALAR_UPDATE_MAX_FACES:
+            for slot, samples in zip(slots.tolist(), confidences.tolist()):
+                self.__append_samples_of_slot(slot, samples)
+            return
+        sample_positions = self.sample_positions[slots]
+        self.confidence_sums[slots] += confidences - self.confidence_samples[slots, :, sample_positions]
+        self.confidence_samples[slots, :, sample_positions] = confidences
+        self.sample_positions[slots] = (sample_positions + 1) % self.SAMPLE_SIZE
+        self.number_of_samples[slots] = np.minimum(self.number_of_samples[slots] + 1, self.SAMPLE_SIZE)
+        self.__accumulate_evidence(slots, confidences)
+
+    def append_detection_confidence_pairs(self, slots:np.ndarray = None, pair_rows:np.ndarray = None, pair_class_indices:np.ndarray = None, pair_confidences:np.ndarray = None):
+        # Appends a new sample to the windows of all given slots. The sample of each class is the highest confidence among the (slots[pair_rows], pair_class_indices) pairs, 0 if none.
+        # The maxima are scattered straight into the ring buffers
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        pair_rows = np.asarray(pair_rows, dtype=np.int64)
+        if len(slots) <= self.SCALAR_UPDATE_MAX_FACES:
+            samples_of_slots = [[0.0] * len(self.EQUIPMENT_CLASS_NAMES) for _ in range(len(slots))]
+            for pair_row, class_index, confidence in zip(pair_rows.tolist(), np.asarray(pair_class_indices, dtype=np.int64).tolist(), np.asarray(pair_confidences, dtype=np.float64).tolist()):
+                samples_of_slots[pair_row][class_index] = max(samples_of_slots[pair_row][class_index], confidence)
+            for slot, samples in zip(slots.tolist(), samples_of_slots):
+                self.__append_samples_of_slot(slot, samples)
+            return
+        sample_positions = self.sample_positions[slots]
+        previous_samples = self.confidence_samples[slots, :, sample_positions]
+        self.confidence_samples[slots, :, sample_positions] = 0
+        np.maximum.at(self.confidence_samples, (slots[pair_rows], np.asarray(pair_class_indices, dtype=np.int64), sample_positions[pair_rows]), np.asarray(pair_confidences, dtype=np.float64))
+        new_samples = self.confidence_samples[slots, :, sample_positions]
+        self.confidence_sums[slots] += new_samples - previous_samples
+        self.sample_positions[slots] = (sample_positions + 1) % self.SAMPLE_SIZE
+        self.number_of_samples[slots] = np.minimum(self.number_of_samples[slots] + 1, self.SAMPLE_SIZE)
+        self.__accumulate_evidence(slots, new_samples)
+
+    def __append_samples_of_slot(self, slot:int, samples:List[float]):
+        # append_detection_confidences of a single face with Python floats, gives the same values
+        position = int(self.sample_positions[slot])
+        previous_samples = self.confidence_samples[slot, :, position].tolist()
+        self.confidence_samples[slot, :, position] = samples
+        self.confidence_sums[slot] = [confidence_sum + (sample - previous_sample) for confidence_sum, sample, previous_sample in zip(self.confidence_sums[slot].tolist(), samples, previous_samples)]
+        self.sample_positions[slot] = (position + 1) % self.SAMPLE_SIZE
+        self.number_of_samples[slot] = min(int(self.number_of_samples[slot]) + 1, self.SAMPLE_SIZE)
+
+        log_likelihood_ratios = []
+        for log_likelihood_ratio, sample, lower_threshold, upper_threshold, bin_log_likelihood_ratios in zip(self.log_likelihood_ratios[slot].tolist(), samples, self.LOWER_THRESHOLDS.tolist(), self.UPPER_THRESHOLDS.tolist(), self.SAMPLE_BIN_LOG_LIKELIHOOD_RATIOS.tolist()):
+            sample_bin = int(sample >= lower_threshold) + int(sample > upper_threshold)
+            log_likelihood_ratios.append(min(max(log_likelihood_ratio + bin_log_likelihood_ratios[sample_bin], self.REJECT_BOUND), self.ACCEPT_BOUND))
+        self.log_likelihood_ratios[slot] = log_likelihood_ratios
+
+    def __accumulate_evidence(self, slots:np.ndarray, confidences:np.ndarray):
+        sample_bins = (confidences >= self.LOWER_THRESHOLDS).astype(np.int64) + (confidences > self.UPPER_THRESHOLDS)
+        log_likelihood_ratios = self.log_likelihood_ratios[slots] + self.SAMPLE_BIN_LOG_LIKELIHOOD_RATIOS[np.arange(len(self.EQUIPMENT_CLASS_NAMES)), sample_bins]
+        self.log_likelihood_ratios[slots] = np.minimum(np.maximum(log_likelihood_ratios, self.REJECT_BOUND), self.ACCEPT_BOUND)
+
+    def update_obeyed_rules(self, slots:np.ndarray = None):
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        if len(slots) <= self.SCALAR_UPDATE_MAX_FACES:
+            for slot in slots.tolist():
+                self.__update_obeyed_rules_of_slot(slot)
+            return
+        if self.DECISION_METHOD == "SPRT":
+            log_likelihood_ratios = self.log_likelihood_ratios[slots]
+            should_turn_on, should_turn_off = log_likelihood_ratios >= self.ACCEPT_BOUND, log_likelihood_ratios <= self.REJECT_BOUND
+            is_evidence_complete = np.ones(len(slots), dtype=bool)
+        elif self.DECISION_METHOD == "WINDOW_MEAN":
+            mean_confidences = self.confidence_sums[slots] / self.SAMPLE_SIZE
+            should_turn_on, should_turn_off = mean_confidences > self.UPPER_THRESHOLDS, mean_confidences < self.LOWER_THRESHOLDS
+            is_evidence_complete = self.number_of_samples[slots] >= self.SAMPLE_SIZE # a window padded with zeros cannot confirm that an equipment is missing
+        else:
+            raise ValueError(f"Unknown decision method: {self.DECISION_METHOD}")
+        is_rule_obeyed = self.is_rule_obeyed[slots]
+
+        # Rules of a single equipment class
+        is_rule_obeyed[:, self.SINGLE_CLASS_RULE_INDICES] = np.where(is_rule_obeyed[:, self.SINGLE_CLASS_RULE_INDICES], ~should_turn_off[:, self.SINGLE_CLASS_RULE_CLASS_INDICES], should_turn_on[:, self.SINGLE_CLASS_RULE_CLASS_INDICES])
+
+        # Either mask turns the rule on, it turns off when both masks are off
+        is_rule_obeyed[:, self.MASK_RULE_INDEX] = np.where(is_rule_obeyed[:, self.MASK_RULE_INDEX], ~np.all(should_turn_off[:, self.MASK_CLASS_INDICES], axis=1), np.any(should_turn_on[:, self.MASK_CLASS_INDICES], axis=1))
+
+        is_rule_obeyed[:, self.RULE_INDICES["is_beard_present"]] = False #TODO: Implement beard detection
+        self.is_rule_obeyed[slots] = is_rule_obeyed
+        self.is_equipment_decided[slots] = (should_turn_on | should_turn_off) & is_evidence_complete[:, None]
+
+    def __update_obeyed_rules_of_slot(self, slot:int):
+        # update_obeyed_rules of a single face with Python bools, gives the same states
+        if self.DECISION_METHOD == "SPRT":
+            log_likelihood_ratios = self.log_likelihood_ratios[slot].tolist()
+            should_turn_on = [log_likelihood_ratio >= self.ACCEPT_BOUND for log_likelihood_ratio in log_likelihood_ratios]
+            should_turn_off = [log_likelihood_ratio <= self.REJECT_BOUND for log_likelihood_ratio in log_likelihood_ratios]
+            is_evidence_complete = True
+        elif self.DECISION_METHOD == "WINDOW_MEAN":
+            mean_confidences = [confidence_sum / self.SAMPLE_SIZE for confidence_sum in self.confidence_sums[slot].tolist()]
+            should_turn_on = [mean_confidence > upper_threshold for mean_confidence, upper_threshold in zip(mean_confidences, self.UPPER_THRESHOLDS.tolist())]
+            should_turn_off = [mean_confidence < lower_threshold for mean_confidence, lower_threshold in zip(mean_confidences, self.LOWER_THRESHOLDS.tolist())]
+            is_evidence_complete = int(self.number_of_samples[slot]) >= self.SAMPLE_SIZE
+        else:
+            raise ValueError(f"Unknown decision method: {self.DECISION_METHOD}")
+        is_rule_obeyed = self.is_rule_obeyed[slot].tolist()
+
+        for rule_index, class_index in zip(self.SINGLE_CLASS_RULE_INDICES.tolist(), self.SINGLE_CLASS_RULE_CLASS_INDICES.tolist()):
+            is_rule_obeyed[rule_index] = not should_turn_off[class_index] if is_rule_obeyed[rule_index] else should_turn_on[class_index]
 
-        self.age:int = 0 #number of iterations since the face was last detected
+        mask_class_indices = self.MASK_CLASS_INDICES.tolist()
+        if is_rule_obeyed[self.MASK_RULE_INDEX]:
+            is_rule_obeyed[self.MASK_RULE_INDEX] = not all(should_turn_off[class_index] for class_index in mask_class_indices)
+        else:
+            is_rule_obeyed[self.MASK_RULE_INDEX] = any(should_turn_on[class_index] for class_index in mask_class_indices)
+
+        is_rule_obeyed[self.RULE_INDICES["is_beard_present"]] = False #TODO: Implement beard detection
+        self.is_rule_obeyed[slot] = is_rule_obeyed
+        self.is_equipment_decided[slot] = [(is_turning_on or is_turning_off) and is_evidence_complete for is_turning_on, is_turning_off in zip(should_turn_on, should_turn_off)]
+
+    def is_verdict_confirmed(self, slots:np.ndarray = None) -> np.ndarray:
+        # A face is confirmed compliant if all required equipment is decided, and confirmed non-compliant as soon as one of them is decided as missing
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        is_decided = self.is_equipment_decided[slots[:, None], self.REQUIRED_CLASS_INDICES]
+        is_obeyed = self.is_rule_obeyed[slots[:, None], self.REQUIRED_RULE_INDICES]
+        return np.all(is_decided, axis=1) | np.any(is_decided & ~is_obeyed, axis=1)
+
+    def schedule_verifications(self, slots:np.ndarray = None, bboxes:np.ndarray = None, verification_time:float = 0):
+        # Called after the equipment of the (M,) faces with the (M,4) face boxes is checked. An unconfirmed verdict is checked again on the next detection,
+        # a newly confirmed or changed one after VERIFICATION_INTERVAL_S, and the interval backs off while the same verdict is confirmed again
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        verdicts = self.is_allowed_to_pass(slots)
+        is_confirmed = self.is_verdict_confirmed(slots)
+        intervals = self.verification_intervals[slots]
+        is_reconfirmed = is_confirmed & (intervals > 0) & (verdicts == self.verified_verdicts[slots])
+        intervals = np.where(is_reconfirmed, np.minimum(intervals * self.VERIFICATION_BACKOFF_FACTOR, self.MAX_VERIFICATION_INTERVAL_S), np.where(is_confirmed, self.VERIFICATION_INTERVAL_S, 0))
+        intervals = np.where(verdicts, np.minimum(intervals, self.MAX_ALLOWED_VERIFICATION_INTERVAL_S), intervals)
+        # An allowed face whose newest sample misses a required equipment is checked again on the next detection
+        newest_sample_positions = (self.sample_positions[slots] - 1) % self.SAMPLE_SIZE
+        newest_required_samples = self.confidence_samples[slots[:, None], self.REQUIRED_CLASS_INDICES, newest_sample_positions[:, None]]
+        is_required_equipment_missed = np.any(newest_required_samples < self.LOWER_THRESHOLDS[self.REQUIRED_CLASS_INDICES], axis=1)
+        intervals = np.where(verdicts & is_required_equipment_missed, 0, intervals)
+        self.verification_intervals[slots] = intervals
+        self.next_verification_times[slots] = verification_time + intervals
+        self.verified_verdicts[slots] = verdicts
+        self.verified_bboxes[slots] = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+
+    def is_verification_due(self, slots:np.ndarray = None, bboxes:np.ndarray = None, current_time:float = 0) -> np.ndarray:
+        # Returns whether the equipment of each of the (M,) faces with the (M,4) current face boxes has to be checked
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        ious = box_association.calculate_pairwise_ious(self.verified_bboxes[slots], np.asarray(bboxes, dtype=np.int64).reshape(-1, 4))
+        return (self.verification_intervals[slots] <= 0) | (current_time >= self.next_verification_times[slots]) | (ious < self.VERDICT_INVALIDATION_IOU)
+
+    def is_allowed_to_pass(self, slots:np.ndarray = None) -> np.ndarray:
+        is_rule_obeyed = self.is_rule_obeyed[np.asarray(slots, dtype=np.int64)]
+        is_allowed = is_rule_obeyed[..., self.RULE_INDICES["is_hairnet_worn"]] & is_rule_obeyed[..., self.RULE_INDICES["is_safety_google_worn"]]
+        is_beard_covered = is_rule_obeyed[..., self.RULE_INDICES["is_beardnet_worn"]] | is_rule_obeyed[..., self.RULE_INDICES["is_surgical_mask_worn"]]
+        return is_allowed & (~is_rule_obeyed[..., self.RULE_INDICES["is_beard_present"]] | is_beard_covered)
+
+    def get_obeyed_rules(self, slot:int) -> Dict[str, bool]:
+        return {rule_name: bool(is_obeyed) for rule_name, is_obeyed in zip(self.RULE_NAMES, self.is_rule_obeyed[slot].tolist())}
+
+class Face:
+    # Only the geometry and the ids of a face are kept here, its equipment state is a row of the FaceStore
+    __slots__ = ("face_store", "store_slot", "track_id", "kalman_slot", "last_time_detected", "face_bbox", "face_bbox_transformed")
+
+    def __init__(self, face_store:FaceStore = None, store_slot:int = -1, face_bbox:List[Tuple[int,int,int,int,int]] = None, track_id:int = -1, kalman_slot:int = -1, detection_time:float = 0):
+        self.face_store = face_store #equipment confidences and rules of all faces
+        self.store_slot:int = store_slot #row of the face in the face store
+
+        self.track_id:int = track_id #id given by the tracker, stays the same while the face is tracked
+        self.kalman_slot:int = kalman_slot #slot of the face in the motion model of the tracker
+        self.last_time_detected:float = detection_time #time.time() of the last detection of the face
         self.face_bbox:list = face_bbox #coordinates of the face bounding box in the format (x1,y1,x2,y2)
         self.face_bbox_transformed:list = None #coordinates of the face bounding box in the format (x1,y1,x2,y2) in the original frame size
         
-        self.obeyed_rules = {
-            "is_hairnet_worn": False,
-            "is_safety_google_worn": False,
-            "is_beard_present": False,
-            "is_beardnet_worn": False,
-            "is_surgical_mask_worn": False,
-        }
-
-        self.equipment_detection_confidence_samples = {
-            "hair_net":[0]*self.SAMPLE_SIZE,
-            "beard_net":[0]*self.SAMPLE_SIZE,
-            "safety_goggles":[0]*self.SAMPLE_SIZE,
-            "blue_surgical_mask":[0]*self.SAMPLE_SIZE,
-            "white_surgical_mask":[0]*self.SAMPLE_SIZE
-        }                
-        
-    def get_face_bbox(self) -> List[Tuple[int,int,int,int,str]]:
+    def get_face_bbox(self) -> List[Tuple[int,int,int,int,int]]:
         return self.face_bbox
     
     def get_bbox_area(self) -> int:
         return (self.face_bbox[2] - self.face_bbox[0]) * (self.face_bbox[3] - self.face_bbox[1])
     
-    def update_face_bbox(self, face_bbox:List[Tuple[int,int,int,int,str]]):
-        self.age = 0
+    def update_face_bbox(self, face_bbox:List[Tuple[int,int,int,int,int]], detection_time:float = None):
+        # detection_time is None if the bbox is only extrapolated by the motion model
+        if detection_time is not None:
+            self.last_time_detected = detection_time
         self.face_bbox = face_bbox
   
-    def transform_class_name(self, equipment_class:str = None, equipment_bbox:List[Tuple[int,int,int,int,str]] = None) -> str:
-        # The object detection model can classify various types of equipment under the same class.
-        # For example, both white hairnets and white beard nets are classified as "white_hairnet".
-        # This function transforms the general class name into a list of more specific class names.
-        
-        if equipment_class in ["white_surgical_mask", "blue_surgical_mask"]:
-            return equipment_class
-        elif equipment_class == "safety_goggles":
-            return equipment_class             
-        elif equipment_class in ["white_net", "blue_net"]:
-            center_of_face = (self.face_bbox[0] + self.face_bbox[2])//2, (self.face_bbox[1] + self.face_bbox[3])//2
-            center_of_net = (equipment_bbox[0] + equipment_bbox[2])//2, (equipment_bbox[1] + equipment_bbox[3])//2
-            if center_of_face[1] > center_of_net[1]:#net is above face, so it should be hairnet
-                return "hair_net"
-            else:
-                return "beard_net"
-
-    def append_detection_confidences(self, update_dict:Dict):
-        for detection_class, confidence in update_dict.items():
-            self.equipment_detection_confidence_samples[detection_class].pop(0)        
-            self.equipment_detection_confidence_samples[detection_class].append(confidence)        
-
-    def update_obeyed_rules(self) -> None:
-       
-        self.obeyed_rules = {
-            "is_hairnet_worn": False,
-            "is_safety_google_worn": False,
-            "is_beard_present": False,
-            "is_beardnet_worn": False,
-            "is_surgical_mask_worn": False,
-        }
+    def should_be_deleted(self, current_time:float = None, age_limit_s:float = None) -> bool:
+        # the face is deleted if it is not detected for age_limit_s seconds
+        return current_time - self.last_time_detected > age_limit_s
 
-        hairnet_mean_confidence = sum(self.equipment_detection_confidence_samples["hair_net"]) / len(self.equipment_detection_confidence_samples["hair_net"])
-        beardnet_mean_confidence = sum(self.equipment_detection_confidence_samples["beard_net"]) / len(self.equipment_detection_confidence_samples["beard_net"])
-        safety_goggles_mean_confidence = sum(self.equipment_detection_confidence_samples["safety_goggles"]) / len(self.equipment_detection_confidence_samples["safety_goggles"])
-        blue_surgical_mask_mean_confidence = sum(self.equipment_detection_confidence_samples["blue_surgical_mask"]) / len(self.equipment_detection_confidence_samples["blue_surgical_mask"])
-        white_surgical_mask_mean_confidence = sum(self.equipment_detection_confidence_samples["white_surgical_mask"]) / len(self.equipment_detection_confidence_samples["white_surgical_mask"])
-
-        #hairnet
-        if self.obeyed_rules["is_hairnet_worn"] and hairnet_mean_confidence < self.EQUIPMENT_CONFIDENCE_THRESHOLDS["hair_net"][0]:
-                self.obeyed_rules["is_hairnet_worn"] = False
-        elif not self.obeyed_rules["is_hairnet_worn"] and hairnet_mean_confidence > self.EQUIPMENT_CONFIDENCE_THRESHOLDS["hair_net"][1]:
-                self.obeyed_rules["is_hairnet_worn"] = True
-
-        #safety goggles
-        if self.obeyed_rules["is_safety_google_worn"] and safety_goggles_mean_confidence < self.EQUIPMENT_CONFIDENCE_THRESHOLDS["safety_goggles"][0]:
-                self.obeyed_rules["is_safety_google_worn"] = False
-        elif not self.obeyed_rules["is_safety_google_worn"] and safety_goggles_mean_confidence > self.EQUIPMENT_CONFIDENCE_THRESHOLDS["safety_goggles"][1]:
-                self.obeyed_rules["is_safety_google_worn"] = True
-
-        #beardnet
-        if self.obeyed_rules["is_beardnet_worn"] and beardnet_mean_confidence < self.EQUIPMENT_CONFIDENCE_THRESHOLDS["beard_net"][0]:
-                self.obeyed_rules["is_beardnet_worn"] = False
-        elif not self.obeyed_rules["is_beardnet_worn"] and beardnet_mean_confidence > self.EQUIPMENT_CONFIDENCE_THRESHOLDS["beard_net"][1]:
-                self.obeyed_rules["is_beardnet_worn"] = True
-
-        #surgical mask
-        if self.obeyed_rules["is_surgical_mask_worn"] and (blue_surgical_mask_mean_confidence < self.EQUIPMENT_CONFIDENCE_THRESHOLDS["blue_surgical_mask"][0] and white_surgical_mask_mean_confidence < self.EQUIPMENT_CONFIDENCE_THRESHOLDS["white_surgical_mask"][0]):
-                self.obeyed_rules["is_surgical_mask_worn"] = False
-        elif not self.obeyed_rules["is_surgical_mask_worn"] and (blue_surgical_mask_mean_confidence > self.EQUIPMENT_CONFIDENCE_THRESHOLDS["blue_surgical_mask"][1] or white_surgical_mask_mean_confidence > self.EQUIPMENT_CONFIDENCE_THRESHOLDS["white_surgical_mask"][1]):
-                self.obeyed_rules["is_surgical_mask_worn"] = True
-
-        #beard detection
-        if True:
-            self.obeyed_rules["is_beard_present"] = False #TODO: Implement beard detection
-
-    def increase_age(self):
-        self.age += 1
-
-    def should_be_deleted(self) -> bool:
-        return self.age > self.AGE_LIMIT
+    def get_obeyed_rules(self) -> Dict[str, bool]:
+        return self.face_store.get_obeyed_rules(self.store_slot)
 
     def is_allowed_to_pass(self) -> bool:
-        if not (self.obeyed_rules["is_hairnet_worn"] and self.obeyed_rules["is_safety_google_worn"]):
-            return False
-        if self.obeyed_rules["is_beard_present"] and not (self.obeyed_rules["is_beardnet_worn"] or self.obeyed_rules["is_surgical_mask_worn"]):
-            return False
-            
-        return True
+        return bool(self.face_store.is_allowed_to_pass(self.store_slot))
 
     def draw_face(self, frame: np.ndarray = None, is_main_face: bool = None, stripe_stroke: int = 1, bold_stroke: int = 5, coordinate_transform_coefficients=[1, 1]):
         self.face_bbox_transformed = [
@@ -148,11 +342,12 @@ class Face:
             False: "red_" if is_main_face else "grey_"
         }
         
+        obeyed_rules = self.get_obeyed_rules()
         equipment_rules = [
-            ("hairnet", self.obeyed_rules["is_hairnet_worn"]),
-            ("goggles", self.obeyed_rules["is_safety_google_worn"]),
-            ("surgical_mask", self.obeyed_rules["is_surgical_mask_worn"]),
-            ("beardnet", self.obeyed_rules["is_beardnet_worn"])
+            ("hairnet", obeyed_rules["is_hairnet_worn"]),
+            ("goggles", obeyed_rules["is_safety_google_worn"]),
+            ("surgical_mask", obeyed_rules["is_surgical_mask_worn"]),
+            ("beardnet", obeyed_rules["is_beardnet_worn"])
         ]
         
         rules_to_show_only_if_present = ["surgical_mask", "beardnet"] #Some equipments are not mandatory, but should be shown if present
@@ -209,86 +404,192 @@ class Face:
         picasso.draw_image_on_frame(frame, icon_name, x=x_position, y=y_position, width=max_width, height=max_height, maintain_aspect_ratio=True)
 
 class FaceTrackerManager:
-    def __init__(self, face_update_overlap_threshold:float = 0.5, equipment_update_overlap_threshold:float = 0.5):
+    def __init__(self, face_update_overlap_threshold:float = 0.5, equipment_update_overlap_threshold:float = 0.5, face_age_limit_s:float = 0.5, face_age_limit_detections:int = 3, max_face_age_limit_s:float = 3.0, max_extrapolation_time_s:float = 0.5, rule_decision_method:str = "WINDOW_MEAN", equipment_verification_interval_s:float = 0.5):
         self.FACE_UPDATE_OVERLAP_THRESHOLD = face_update_overlap_threshold #minimum overlap between face bboxes to be considered the same face
         self.EQUIPMENT_UPDATE_OVERLAP_THRESHOLD = equipment_update_overlap_threshold #minimum overlap between face bbox and equipment bbox to be considered the same face
+        self.EQUIPMENT_GRID_CELL_SIZE = 64 #pixels, cell size of the grid index used to associate many equipment boxes with many faces
+        self.EQUIPMENT_GRID_MIN_PAIRS = 16384 #the grid index is used if there are at least this many face and equipment box pairs, otherwise all pairs are checked at once
+        self.NET_CLASS_INDEX = -2 #store class index of the nets until they are split into hair nets and beard nets
+        # A face is deleted if it misses FACE_AGE_LIMIT_DETECTIONS detections at the measured detection period, but not before FACE_AGE_LIMIT_S and at the latest
+        # after MAX_FACE_AGE_LIMIT_S. So a slow CPU inference does not kill the tracks, and with them their rule evidence and cached verdicts, after one missed detection
+        self.FACE_AGE_LIMIT_S = face_age_limit_s
+        self.FACE_AGE_LIMIT_DETECTIONS = face_age_limit_detections
+        self.MAX_FACE_AGE_LIMIT_S = max_face_age_limit_s
+        self.DETECTION_PERIOD_SMOOTHING = 0.1 #weight of the newest time between two detections in the moving average
+        self.detection_period_s = None #exponential moving average of the time between two detections, measured while faces are tracked
+        self.last_detection_time = None
         self.face_objects = []
+        self.next_track_id = 0
+        self.face_store = FaceStore(capacity=16, sample_size=5, decision_method=rule_decision_method, verification_interval_s=equipment_verification_interval_s) #equipment confidences, rules and cached verdicts of all faces
+
+        # Motion model of all faces, the face boxes are tracked as (center_x, center_y, width, height) in pixels of the model input frame
+        self.motion_model = kalman_filter.ConstantVelocityKalmanFilter(measurement_dimension=4, capacity=16, measurement_noise=4.0, acceleration_noise=[400.0, 400.0, 100.0, 100.0], initial_velocity_noise=[150.0, 150.0, 30.0, 30.0], max_extrapolation_time_s=max_extrapolation_time_s)
 
     def get_number_of_active_faces(self) -> int:
         return len(self.face_objects)
     
-    def __calculate_overlap(self, bbox1:List[Tuple[int,int,int,int,str]], bbox2:List[Tuple[int,int,int,int,str]]) -> float: 
-        # Returns how much percentage of bbox2 inside bbox1 
-        x1 = max(bbox1[0], bbox2[0])
-        y1 = max(bbox1[1], bbox2[1])
-        x2 = min(bbox1[2], bbox2[2])
-        y2 = min(bbox1[3], bbox2[3])
-
-        intersection_area = max(0, x2 - x1 + 1) * max(0, y2 - y1 + 1)
-        bbox2_area = (bbox2[2] - bbox2[0] + 1) * (bbox2[3] - bbox2[1] + 1)
-        return intersection_area / bbox2_area
-
-    def update_face_bboxes(self, face_bboxes: List[Tuple[int, int, int, int]]):
-        matched_face_bboxes = []
-        for face_bbox in face_bboxes:
-            best_match = None
-            max_overlap = 0
-            for face in self.face_objects:
-                overlap = self.__calculate_overlap(face.get_face_bbox(), face_bbox)
-                if overlap > max_overlap:
-                    best_match = face
-                    max_overlap = overlap
-
-            if max_overlap > self.FACE_UPDATE_OVERLAP_THRESHOLD:
-                best_match.update_face_bbox(face_bbox)
-                matched_face_bboxes.append(face_bbox)
-
-        # Create new face objects for unmatched face bboxes
-        for face_bbox in face_bboxes:
-            if face_bbox not in matched_face_bboxes:
-                self.face_objects.append(Face(face_bbox=face_bbox))
-
-        # Increase age of all faces
-        faces_to_delete = []
-        for face in self.face_objects:
-            face.increase_age()
-            if face.should_be_deleted():
-                faces_to_delete.append(face)
-
-        # Delete faces that are too old
-        for face in faces_to_delete:
-            self.face_objects.remove(face)
+    def __bboxes_to_measurements(self, bboxes:np.ndarray) -> np.ndarray:
+        # (N,4) xyxy -> (N,4) [center_x, center_y, width, height]
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        return np.concatenate([(bboxes[:, 0:2] + bboxes[:, 2:4]) / 2, bboxes[:, 2:4] - bboxes[:, 0:2]], axis=1)
+
+    def __measurements_to_bboxes(self, measurements:np.ndarray) -> np.ndarray:
+        # (N,4) [center_x, center_y, width, height] -> (N,4) integer xyxy
+        half_sizes = np.maximum(measurements[:, 2:4], 1) / 2
+        return np.rint(np.concatenate([measurements[:, 0:2] - half_sizes, measurements[:, 0:2] + half_sizes], axis=1)).astype(np.int64)
+
+    def __get_kalman_slots(self) -> np.ndarray:
+        return np.array([face.kalman_slot for face in self.face_objects], dtype=np.int64)
+
+    def get_face_age_limit(self) -> float:
+        if self.detection_period_s is None:
+            return self.FACE_AGE_LIMIT_S
+        return min(max(self.FACE_AGE_LIMIT_S, self.FACE_AGE_LIMIT_DETECTIONS * self.detection_period_s), self.MAX_FACE_AGE_LIMIT_S)
+
+    def __update_detection_period(self, detection_time:float):
+        # Without tracked faces the motion gate may skip the detections for a long time, such gaps are not a detection period
+        if self.last_detection_time is not None and len(self.face_objects) > 0 and detection_time > self.last_detection_time:
+            detection_period_s = detection_time - self.last_detection_time
+            self.detection_period_s = detection_period_s if self.detection_period_s is None else (1 - self.DETECTION_PERIOD_SMOOTHING) * self.detection_period_s + self.DETECTION_PERIOD_SMOOTHING * detection_period_s
+        self.last_detection_time = detection_time
+
+    def __delete_old_faces(self, current_time:float):
+        age_limit_s = self.get_face_age_limit()
+        faces_to_delete = [face for face in self.face_objects if face.should_be_deleted(current_time, age_limit_s)]
+        if len(faces_to_delete) > 0:
+            self.motion_model.delete_tracks([face.kalman_slot for face in faces_to_delete])
+            self.face_store.release_slots([face.store_slot for face in faces_to_delete])
+            self.face_objects = [face for face in self.face_objects if not face.should_be_deleted(current_time, age_limit_s)]
+
+    def __match_faces(self, overlaps:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Returns (face_indices, detection_indices) maximizing the total overlap of the (faces, detections) matrix, only pairs above the threshold are matched.
+        # A kiosk mostly sees one or a few faces, so the assignment is only solved when the faces actually compete for the detections
+        if overlaps.shape[0] == 1 or overlaps.shape[1] == 1: # a single pair can be matched, the one with the highest overlap
+            best_index = int(np.argmax(overlaps))
+            if overlaps.flat[best_index] <= self.FACE_UPDATE_OVERLAP_THRESHOLD:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            face_index, detection_index = divmod(best_index, overlaps.shape[1])
+            return np.array([face_index], dtype=np.int64), np.array([detection_index], dtype=np.int64)
+        is_allowed = overlaps > self.FACE_UPDATE_OVERLAP_THRESHOLD
+        if np.all(np.sum(is_allowed, axis=0) <= 1) and np.all(np.sum(is_allowed, axis=1) <= 1): # no face competes for a detection and vice versa
+            face_indices, detection_indices = np.nonzero(is_allowed)
+            return face_indices.astype(np.int64), detection_indices.astype(np.int64)
+        return linear_assignment.solve_gated_assignment(cost_matrix=-overlaps, is_allowed=is_allowed)
+
+    def update_face_bboxes(self, face_bboxes: np.ndarray, detection_time:float = None) -> np.ndarray:
+        # face_bboxes: (N,5) [x1, y1, x2, y2, detection_id] detected at detection_time (time.time() of the frame capture, now if None).
+        # Each detection is matched to at most one face and vice versa, maximizing the total overlap with the boxes the motion model predicts for the detection time.
+        # Pairs that overlap less than the threshold are never matched. The faces are moved to the filtered boxes.
+        # Returns the (N,) track ids of the face bboxes, so that they can be written back onto the pose detections
+        detection_time = time.time() if detection_time is None else detection_time
+        self.__update_detection_period(detection_time)
+        face_bboxes = np.asarray(face_bboxes, dtype=np.int64).reshape(-1, 5)
+        is_detection_matched = np.zeros(len(face_bboxes), dtype=bool)
+        track_ids = np.empty(len(face_bboxes), dtype=np.int64)
+
+        if len(self.face_objects) > 0 and len(face_bboxes) > 0:
+            predicted_bboxes = self.__measurements_to_bboxes(self.motion_model.predict(self.__get_kalman_slots(), detection_time))
+            overlaps = box_association.calculate_containment_matrix(predicted_bboxes, face_bboxes[:, :4]) # how much percentage of each detected face bbox is inside each predicted face bbox
+            face_indices, detection_indices = self.__match_faces(overlaps)
+            matched_faces = [self.face_objects[face_index] for face_index in face_indices.tolist()]
+            filtered_measurements = self.motion_model.update([face.kalman_slot for face in matched_faces], self.__bboxes_to_measurements(face_bboxes[detection_indices, :4]), detection_time)
+            filtered_bboxes = self.__measurements_to_bboxes(filtered_measurements)
+            for face, filtered_bbox, detection_index in zip(matched_faces, filtered_bboxes.tolist(), detection_indices.tolist()):
+                face.update_face_bbox(tuple(filtered_bbox) + (int(face_bboxes[detection_index, 4]),), detection_time=detection_time)
+                track_ids[detection_index] = face.track_id
+            is_detection_matched[detection_indices] = True
+
+        # Create new face objects with new track ids for unmatched face bboxes, their motion model starts at rest
+        unmatched_detection_indices = np.flatnonzero(~is_detection_matched)
+        if len(unmatched_detection_indices) > 0:
+            self.__create_faces(face_bboxes[unmatched_detection_indices], track_ids, unmatched_detection_indices, detection_time)
+
+        # Delete the faces that were not detected for too long
+        self.__delete_old_faces(detection_time)
+        return track_ids
+
+    def __create_faces(self, face_bboxes:np.ndarray, track_ids:np.ndarray, detection_indices:np.ndarray, detection_time:float):
+        track_ids[detection_indices] = np.arange(self.next_track_id, self.next_track_id + len(detection_indices))
+        self.next_track_id += len(detection_indices)
+        kalman_slots = self.motion_model.create_tracks(self.__bboxes_to_measurements(face_bboxes[:, :4]), detection_time)
+        store_slots = self.face_store.allocate_slots(len(detection_indices))
+        self.face_objects.extend(
+            Face(face_store=self.face_store, store_slot=store_slot, face_bbox=tuple(face_bbox), track_id=track_id, kalman_slot=kalman_slot, detection_time=detection_time)
+            for face_bbox, track_id, kalman_slot, store_slot in zip(face_bboxes.tolist(), track_ids[detection_indices].tolist(), kalman_slots.tolist(), store_slots.tolist())
+        )
+
+    def extrapolate_face_bboxes(self, current_time:float = None):
+        # Moves all faces to the boxes the motion model predicts for the current time, used on the frames the pose detector does not run on
+        current_time = time.time() if current_time is None else current_time
+        self.__delete_old_faces(current_time)
+        if len(self.face_objects) == 0:
+            return
+        predicted_bboxes = self.__measurements_to_bboxes(self.motion_model.predict(self.__get_kalman_slots(), current_time))
+        for face, predicted_bbox in zip(self.face_objects, predicted_bboxes.tolist()):
+            face.update_face_bbox(tuple(predicted_bbox) + tuple(face.get_face_bbox()[4:]))
     
-    def update_face_equipments_detection_confidences_and_obeyed_rules(self, equipment_predictions: List[Tuple[str, float, Tuple[int, int, int, int,str]]]):
-            for face in self.face_objects:                
-                detected_equipments = {
-                    "hair_net":0,
-                    "beard_net":0,
-                    "safety_goggles":0,
-                    "blue_surgical_mask":0,
-                    "white_surgical_mask":0
-                }
-
-                for equipment_prediction in equipment_predictions:
-                    equipment_class = equipment_prediction[0]      
-                    equipment_bbox = equipment_prediction[2]
-                    if self.__calculate_overlap(face.get_face_bbox(), equipment_bbox) > self.EQUIPMENT_UPDATE_OVERLAP_THRESHOLD:
-                        transformed_class_name = face.transform_class_name(equipment_class, equipment_bbox)
-                        detected_equipments[transformed_class_name] = max(equipment_prediction[1], detected_equipments[transformed_class_name])
-
-                face.append_detection_confidences(detected_equipments)
-                face.update_obeyed_rules()
-
-    def draw_faces_on_frame(self, frame:np.ndarray, main_face_id:str = "", coordinate_transform_coefficients=[1,1]) -> np.ndarray:     
+    def __get_store_class_indices(self, equipment_detections: detections.Detections) -> np.ndarray:
+        # Returns the (N,) face store class index of each equipment detection, NET_CLASS_INDEX for the nets and -1 for the classes that are not tracked.
+        # The object detection model classifies both white hairnets and white beard nets as "white_net", they are told apart by their position on the face
+        store_class_indices_of_model = np.full(max(equipment_detections.class_names.keys(), default=-1) + 1, -1, dtype=np.int64)
+        for class_id, class_name in equipment_detections.class_names.items():
+            if class_name in ["white_net", "blue_net"]:
+                store_class_indices_of_model[class_id] = self.NET_CLASS_INDEX
+            elif class_name in FaceStore.EQUIPMENT_CLASS_INDICES:
+                store_class_indices_of_model[class_id] = FaceStore.EQUIPMENT_CLASS_INDICES[class_name]
+        return store_class_indices_of_model[equipment_detections.cls]
+
+    def __get_equipment_check_due_mask(self, current_time:float) -> np.ndarray:
+        store_slots = [face.store_slot for face in self.face_objects]
+        face_bboxes = np.array([face.get_face_bbox()[:4] for face in self.face_objects], dtype=np.int64).reshape(-1, 4)
+        return self.face_store.is_verification_due(store_slots, face_bboxes, current_time)
+
+    def get_track_ids_due_for_equipment_check(self, current_time:float = None) -> np.ndarray:
+        # Returns the track ids of the faces whose cached verdict is stale, the equipment detector only has to run for them
+        current_time = time.time() if current_time is None else current_time
+        track_ids = np.array([face.track_id for face in self.face_objects], dtype=np.int64)
+        return track_ids[self.__get_equipment_check_due_mask(current_time)]
+
+    def is_any_equipment_check_due(self, current_time:float = None) -> bool:
+        current_time = time.time() if current_time is None else current_time
+        return bool(np.any(self.__get_equipment_check_due_mask(current_time)))
+
+    def update_face_equipments_detection_confidences_and_obeyed_rules(self, equipment_detections: detections.Detections, track_ids:np.ndarray = None, detection_time:float = None):
+            # Every equipment box that is mostly inside a face box counts for that face. The highest confidence of each equipment class on each face
+            # is appended to the windows of the face store, then the rules of the faces are updated at once and their next equipment checks are scheduled.
+            # track_ids: the faces the equipment detector ran for, e.g. only the face crops of the stale tracks, None if it ran on the full frame
+            detection_time = time.time() if detection_time is None else detection_time
+            checked_track_ids = None if track_ids is None else set(np.asarray(track_ids).reshape(-1).tolist())
+            checked_faces = self.face_objects if checked_track_ids is None else [face for face in self.face_objects if face.track_id in checked_track_ids]
+            if len(checked_faces) == 0:
+                return
+            face_bboxes = np.array([face.get_face_bbox()[:4] for face in checked_faces], dtype=np.int64)
+            equipment_boxes = equipment_detections.boxes.astype(np.int64) # the overlap is calculated on integer pixel coordinates
+            face_indices, equipment_indices = box_association.find_contained_pairs(face_bboxes, equipment_boxes, containment_threshold=self.EQUIPMENT_UPDATE_OVERLAP_THRESHOLD, grid_cell_size=self.EQUIPMENT_GRID_CELL_SIZE, grid_min_pairs=self.EQUIPMENT_GRID_MIN_PAIRS)
+
+            # A net is a hairnet if its center is above the face center, otherwise a beard net
+            class_indices = self.__get_store_class_indices(equipment_detections)[equipment_indices]
+            face_center_y = (face_bboxes[face_indices, 1] + face_bboxes[face_indices, 3]) // 2
+            net_center_y = (equipment_boxes[equipment_indices, 1] + equipment_boxes[equipment_indices, 3]) // 2
+            class_indices = np.where(class_indices == self.NET_CLASS_INDEX, np.where(face_center_y > net_center_y, FaceStore.EQUIPMENT_CLASS_INDICES["hair_net"], FaceStore.EQUIPMENT_CLASS_INDICES["beard_net"]), class_indices)
+            is_tracked_class = class_indices >= 0
+
+            store_slots = [face.store_slot for face in checked_faces]
+            self.face_store.append_detection_confidence_pairs(store_slots, face_indices[is_tracked_class], class_indices[is_tracked_class], equipment_detections.conf[equipment_indices[is_tracked_class]])
+            self.face_store.update_obeyed_rules(store_slots)
+            self.face_store.schedule_verifications(store_slots, face_bboxes, detection_time)
+
+    def draw_faces_on_frame(self, frame:np.ndarray, main_face_id:int = -1, coordinate_transform_coefficients=[1,1]) -> np.ndarray:     
         for face in self.face_objects:
-            if main_face_id == face.get_face_bbox()[4]:
+            if main_face_id == face.track_id:
                 face.draw_face(frame=frame, is_main_face = True, stripe_stroke = 2, bold_stroke= 10, coordinate_transform_coefficients=coordinate_transform_coefficients)
             else:                
                 face.draw_face(frame=frame, is_main_face = False, coordinate_transform_coefficients=coordinate_transform_coefficients)
     
         #picasso.draw_image_on_frame(frame=frame, image_name="information", x=50, y=50, width=100, height=100, maintain_aspect_ratio=True)
     
-    def get_main_face_detection_id(self, main_face_according_to:str = "AREA", frame = None) -> str:
+    def get_main_face_track_id(self, main_face_according_to:str = "AREA", frame = None) -> int:
+        # Returns the track id of the main face, -1 if there is no face
         main_face = None
         if main_face_according_to == "AREA":
             max_area = 0
@@ -298,11 +599,11 @@ class FaceTrackerManager:
                     max_area = face_area
                     main_face = face
             if main_face is None:
-                return ""
-            return main_face.get_face_bbox()[4]
+                return -1
+            return main_face.track_id
         elif main_face_according_to == "CLOSEST_TO_CENTER":
             if frame is None:
-                return ""
+                return -1
             min_distance = float("inf")
             for face in self.face_objects:
                 center_of_face = (face.get_face_bbox()[0] + face.get_face_bbox()[2])//2, (face.get_face_bbox()[1] + face.get_face_bbox()[3])//2
@@ -312,15 +613,15 @@ class FaceTrackerManager:
                     main_face = face
 
             if main_face is None:
-                return ""
-            return main_face.get_face_bbox()[4]
+                return -1
+            return main_face.track_id
         else:
-            return ""
+            return -1
     
-    def should_turn_on_turnstiles(self, main_face_id:str = "") -> bool:
+    def should_turn_on_turnstiles(self, main_face_id:int = -1) -> bool:
         print(f"Face detected")
         for face in self.face_objects:
-            if main_face_id == face.get_face_bbox()[4]:
+            if main_face_id == face.track_id:
                 print("Face is allowed to pass") if face.is_allowed_to_pass() else print("Face is not allowed to pass")
                 return face.is_allowed_to_pass()
         else: # if for is completed without break
@@ -0,0 +1,71 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import numpy as np
+import cv2
+
+class FrameGeometry:
+    # Digital zoom, mirroring and resizing of the raw camera frame in a single precomputed stage.
+    # The zoomed region is mirrored once into a small buffer, then resized into the model input and display buffers. Nothing is allocated per frame.
+
+    def __init__(self, zoom_factor:float = 1.0, zoom_topleft_normalized:Tuple[float,float] = (0, 0), model_input_size:Tuple[int,int] = (640, 360), display_size:Tuple[int,int] = (1920, 1080)):
+        if zoom_topleft_normalized[0] + zoom_factor > 1 or zoom_topleft_normalized[1] + zoom_factor > 1:
+            raise ValueError("Zoomed region is out of frame boundaries")
+
+        self.ZOOM_FACTOR = zoom_factor # length of ROI edge in terms of the frame edge length
+        self.ZOOM_TOPLEFT_NORMALIZED = zoom_topleft_normalized
+        self.MODEL_INPUT_SIZE = model_input_size # (width, height)
+        self.DISPLAY_SIZE = display_size # (width, height)
+
+        self.raw_size = None # (width, height) of the raw frames the geometry is computed for
+        self.zoomed_region = None # [x1, y1, x2, y2] in raw frame coordinates
+
+        self.mirrored_zoomed_frame = None
+        self.model_input_frame = np.zeros((model_input_size[1], model_input_size[0], 3), dtype=np.uint8)
+        self.display_frame = np.zeros((display_size[1], display_size[0], 3), dtype=np.uint8)
+
+    def __update_geometry(self, raw_width:int, raw_height:int):
+        # The zoomed region is computed in raw frame coordinates, so a camera that does not match the display size needs no extra full-frame resize
+        x1 = int(self.ZOOM_TOPLEFT_NORMALIZED[0] * raw_width)
+        y1 = int(self.ZOOM_TOPLEFT_NORMALIZED[1] * raw_height)
+        x2 = int(x1 + self.ZOOM_FACTOR * raw_width)
+        y2 = int(y1 + self.ZOOM_FACTOR * raw_height)
+
+        self.raw_size = (raw_width, raw_height)
+        self.zoomed_region = [x1, y1, x2, y2]
+        self.mirrored_zoomed_frame = np.zeros((y2 - y1, x2 - x1, 3), dtype=np.uint8)
+
+    def process_frame(self, raw_frame:np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Returns (model_input_frame, display_frame). Both are reused on the next call, the raw frame is not modified.
+        if self.raw_size != (raw_frame.shape[1], raw_frame.shape[0]):
+            self.__update_geometry(raw_frame.shape[1], raw_frame.shape[0])
+
+        x1, y1, x2, y2 = self.zoomed_region
+        cv2.flip(raw_frame[y1:y2, x1:x2], 1, dst=self.mirrored_zoomed_frame) # mirror the frame so that the movements are more intuitive
+        cv2.resize(self.mirrored_zoomed_frame, self.MODEL_INPUT_SIZE, dst=self.model_input_frame)
+        cv2.resize(self.mirrored_zoomed_frame, self.DISPLAY_SIZE, dst=self.display_frame)
+        return self.model_input_frame, self.display_frame
+
+    def crop_model_region_from_raw(self, raw_frame:np.ndarray = None, model_region:Tuple[float,float,float,float] = None, output_size:Tuple[int,int] = (224, 224)) -> Tuple[np.ndarray, Tuple[float,float,float,float]]:
+        # Cuts a region given in model input coordinates out of the raw frame at full camera resolution, mirrors it and resizes it to 'output_size'.
+        # Returns (crop, (scale_x, offset_x, scale_y, offset_y)) so that a point (u,v) of the crop is at (u*scale_x + offset_x, v*scale_y + offset_y) in model input coordinates.
+        if self.raw_size != (raw_frame.shape[1], raw_frame.shape[0]):
+            self.__update_geometry(raw_frame.shape[1], raw_frame.shape[0])
+
+        zoom_x1, zoom_y1, zoom_x2, zoom_y2 = self.zoomed_region
+        raw_per_model_x = (zoom_x2 - zoom_x1) / self.MODEL_INPUT_SIZE[0]
+        raw_per_model_y = (zoom_y2 - zoom_y1) / self.MODEL_INPUT_SIZE[1]
+
+        # The model input is mirrored, so its left edge corresponds to the right edge of the zoomed region
+        raw_x1 = int(max(0, zoom_x2 - model_region[2] * raw_per_model_x))
+        raw_x2 = int(min(raw_frame.shape[1], zoom_x2 - model_region[0] * raw_per_model_x))
+        raw_y1 = int(max(0, zoom_y1 + model_region[1] * raw_per_model_y))
+        raw_y2 = int(min(raw_frame.shape[0], zoom_y1 + model_region[3] * raw_per_model_y))
+        if raw_x2 <= raw_x1 or raw_y2 <= raw_y1:
+            return None, None
+
+        crop = cv2.resize(cv2.flip(raw_frame[raw_y1:raw_y2, raw_x1:raw_x2], 1), output_size)
+
+        scale_x = (raw_x2 - raw_x1) / output_size[0] / raw_per_model_x
+        offset_x = (zoom_x2 - raw_x2) / raw_per_model_x
+        scale_y = (raw_y2 - raw_y1) / output_size[1] / raw_per_model_y
+        offset_y = (raw_y1 - zoom_y1) / raw_per_model_y
+        return crop, (scale_x, offset_x, scale_y, offset_y)
@@ -0,0 +1,191 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import platform, threading, time
+import numpy as np
+import cv2
+
+class CapturedFrame:
+    def __init__(self, frame:np.ndarray = None, sequence_number:int = 0, capture_timestamp:float = 0, is_duplicate:bool = False):
+        self.frame = frame # BGR frame, owned by the ring buffer of the frame source. Do not modify it in place
+        self.sequence_number = sequence_number # increases by one for each frame grabbed from the camera
+        self.capture_timestamp = capture_timestamp # time.time() when the frame was grabbed
+        self.is_duplicate = is_duplicate # True if the frame is identical to the previously read one, so it can skip inference
+
+class FrameSource:
+    # Grabs and decodes camera frames on its own thread into a small preallocated ring buffer.
+    # The consumer always gets the newest frame, so camera decode time is not added to the inference and render time of the main loop.
+
+    def __init__(self, camera_index:int = 0, resolutions_to_check:List[Tuple[int,int]] = None, fps:int = 30, ring_buffer_size:int = 3, stale_frame_timeout_s:float = 1.0, duplicate_check_stride:int = 16):
+        if ring_buffer_size < 3:
+            raise ValueError("Ring buffer size should be at least 3: one slot for the consumer, one for the newest frame and one to write into")
+
+        self.CAMERA_INDEX = camera_index
+        self.RESOLUTIONS_TO_CHECK = resolutions_to_check # should be in descending order of preference
+        self.FPS = fps
+        self.RING_BUFFER_SIZE = ring_buffer_size
+        self.STALE_FRAME_TIMEOUT_S = stale_frame_timeout_s # if no frame is grabbed for this long, the camera is considered disconnected
+        self.DUPLICATE_CHECK_STRIDE = duplicate_check_stride # every n'th pixel of every n'th row is compared to detect duplicate frames
+
+        self.cap = None
+        self.selected_resolution = None
+
+        self.ring_buffer = [None] * ring_buffer_size
+        self.ring_buffer_sequence_numbers = [0] * ring_buffer_size
+        self.ring_buffer_capture_timestamps = [0.0] * ring_buffer_size
+        self.ring_buffer_signatures = [None] * ring_buffer_size # subsampled copy of each frame, used to detect duplicate frames
+        self.latest_slot_index = None # slot of the newest frame
+        self.reader_slot_index = None # slot currently handed to the consumer, never overwritten by the capture thread
+        self.last_read_sequence_number = 0
+        self.last_read_frame_signature = None
+        self.previous_frame_signature = None
+
+        self.number_of_grabbed_frames = 0
+        self.number_of_failed_grabs = 0
+        self.number_of_duplicate_frames = 0
+
+        self.lock = threading.Lock()
+        self.new_frame_condition = threading.Condition(self.lock)
+        self.capture_thread = None
+        self.is_running = False
+
+    def open(self):
+        is_linux = platform.system() == "Linux"
+        if is_linux:
+            self.cap = cv2.VideoCapture(self.CAMERA_INDEX, cv2.CAP_V4L2)
+            print(f"V4L2 is used for camera connection because OS='{platform.system()}'")
+            fourcc = cv2.VideoWriter_fourcc(*'MJPG')
+            self.cap.set(cv2.CAP_PROP_FOURCC, fourcc)
+            self.cap.set(cv2.CAP_PROP_FPS, self.FPS)
+        else:
+            self.cap = cv2.VideoCapture(self.CAMERA_INDEX, cv2.CAP_DSHOW)
+            print(f"DShow is used for camera connection because OS='{platform.system()}'")
+
+        if not self.cap.isOpened():
+            raise ValueError("Unable to open the camera")
+
+        # Verify the codec
+        fourcc_actual = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        codec = (
+            chr((fourcc_actual & 0xFF)),
+            chr((fourcc_actual >> 8) & 0xFF),
+            chr((fourcc_actual >> 16) & 0xFF),
+            chr((fourcc_actual >> 24) & 0xFF)
+        )
+        codec = "".join(codec)
+        print(f"Camera codec: {codec}")
+
+        # Try resolutions until one works
+        for width, height in self.RESOLUTIONS_TO_CHECK:
+            print(f"    Trying resolution: {width}x{height}")
+            if self.check_resolution(width, height):
+                self.selected_resolution = (width, height)
+                print(f"->Selected resolution: {width}x{height}")
+                break
+
+        if not self.selected_resolution:
+            raise ValueError("None of the common resolutions are supported by the camera.")
+
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.selected_resolution[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.selected_resolution[1])
+
+        # Verify the resolution
+        actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        print(f"Camera resolution is validated to be: {actual_width}x{actual_height}")
+
+        # Frames are decoded directly into these buffers, no allocation happens per frame
+        for slot_index in range(self.RING_BUFFER_SIZE):
+            self.ring_buffer[slot_index] = np.zeros((actual_height, actual_width, 3), dtype=np.uint8)
+
+        return actual_width, actual_height
+
+    def check_resolution(self, width:int, height:int) -> bool:
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return (actual_width, actual_height) == (width, height)
+
+    def start(self):
+        if self.cap is None:
+            self.open()
+        self.is_running = True
+        self.capture_thread = threading.Thread(target=self.__capture_loop, name="FrameSource", daemon=True)
+        self.capture_thread.start()
+
+    def __get_slot_to_write(self) -> int:
+        for slot_index in range(self.RING_BUFFER_SIZE):
+            if slot_index != self.latest_slot_index and slot_index != self.reader_slot_index:
+                return slot_index
+
+    def __capture_loop(self):
+        while self.is_running:
+            with self.lock:
+                slot_index = self.__get_slot_to_write()
+
+            if not self.cap.grab():
+                self.number_of_failed_grabs += 1
+                time.sleep(0.01)
+                continue
+            capture_timestamp = time.time()
+
+            ret, frame = self.cap.retrieve(self.ring_buffer[slot_index])
+            if not ret or frame is None:
+                self.number_of_failed_grabs += 1
+                continue
+            if frame is not self.ring_buffer[slot_index]: # the backend allocated a new array instead of decoding into the given one
+                if frame.shape == self.ring_buffer[slot_index].shape and frame.dtype == np.uint8:
+                    np.copyto(self.ring_buffer[slot_index], frame)
+                else:
+                    self.ring_buffer[slot_index] = frame
+
+            # Some cameras return the previous frame again when the exposure is long. Such frames give the same predictions, so they are detected
+            frame_signature = self.ring_buffer[slot_index][::self.DUPLICATE_CHECK_STRIDE, ::self.DUPLICATE_CHECK_STRIDE].copy()
+            is_duplicate = self.previous_frame_signature is not None and np.array_equal(frame_signature, self.previous_frame_signature)
+            self.previous_frame_signature = frame_signature
+
+            with self.lock:
+                self.number_of_grabbed_frames += 1
+                if is_duplicate:
+                    self.number_of_duplicate_frames += 1
+                self.ring_buffer_sequence_numbers[slot_index] = self.number_of_grabbed_frames
+                self.ring_buffer_capture_timestamps[slot_index] = capture_timestamp
+                self.ring_buffer_signatures[slot_index] = frame_signature
+                self.latest_slot_index = slot_index
+                self.new_frame_condition.notify_all()
+
+    def read(self, timeout_s:float = 0.1) -> CapturedFrame:
+        # Waits up to 'timeout_s' for a frame newer than the previously read one. Returns None if the camera does not provide frames.
+        with self.lock:
+            if self.latest_slot_index is None or self.ring_buffer_sequence_numbers[self.latest_slot_index] <= self.last_read_sequence_number:
+                self.new_frame_condition.wait(timeout=timeout_s)
+            if self.latest_slot_index is None:
+                return None
+
+            slot_index = self.latest_slot_index
+            if time.time() - self.ring_buffer_capture_timestamps[slot_index] > self.STALE_FRAME_TIMEOUT_S:
+                return None
+
+            sequence_number = self.ring_buffer_sequence_numbers[slot_index]
+            frame_signature = self.ring_buffer_signatures[slot_index]
+            is_duplicate = sequence_number == self.last_read_sequence_number or (self.last_read_frame_signature is not None and np.array_equal(frame_signature, self.last_read_frame_signature)) # same frame read twice or the camera repeated it
+            self.reader_slot_index = slot_index
+            self.last_read_sequence_number = sequence_number
+            self.last_read_frame_signature = frame_signature
+
+            return CapturedFrame(frame=self.ring_buffer[slot_index], sequence_number=sequence_number, capture_timestamp=self.ring_buffer_capture_timestamps[slot_index], is_duplicate=is_duplicate)
+
+    def get_statistics(self) -> Dict:
+        return {
+            "number_of_grabbed_frames": self.number_of_grabbed_frames,
+            "number_of_failed_grabs": self.number_of_failed_grabs,
+            "number_of_duplicate_frames": self.number_of_duplicate_frames,
+        }
+
+    def release(self):
+        self.is_running = False
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=2)
+            self.capture_thread = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
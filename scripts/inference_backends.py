@@ -0,0 +1,224 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import os, ast, hashlib, math
+import numpy as np
+import cv2
+
+# Every backend returns one dict per input frame with the same structure:
+#   "orig_shape":  (height, width) of the input frame
+#   "boxes_xyxy":  (N,4) float32 boxes in input frame pixels
+#   "confidences": (N,) float32
+#   "class_ids":   (N,) int64
+#   "keypoints":   (N,17,3) float32 [x, y, confidence] for pose models, None otherwise. Like ultralytics, x and y are 0 if the confidence is below 0.5
+
+def calculate_model_hash(model_path:str = None) -> str:
+    sha256 = hashlib.sha256()
+    with open(model_path, "rb") as model_file:
+        for chunk in iter(lambda: model_file.read(1024*1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()[:16]
+
+def get_exported_model_path(model_path:str = None, export_format:str = "onnx") -> str:
+    # Exports the .pt model once and caches the exported artifact next to it, keyed by the hash of the .pt file, e.g. yolov8n-pose.<hash>.onnx
+    model_stem = os.path.splitext(model_path)[0]
+    exported_model_path = f"{model_stem}.{calculate_model_hash(model_path)}.{export_format}"
+    if os.path.exists(exported_model_path):
+        return exported_model_path
+
+    from ultralytics import YOLO
+    print(f"Exporting '{model_path}' to '{export_format}', this is done only once per model")
+    exported_path = YOLO(model_path).export(format=export_format, dynamic=True, simplify=False)
+    os.replace(exported_path, exported_model_path)
+    return exported_model_path
+
+def calculate_iou_matrix(boxes_a:np.ndarray = None, boxes_b:np.ndarray = None) -> np.ndarray:
+    # (N,4) x (M,4) xyxy boxes -> (N,M) intersection over union
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersections = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    areas_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    areas_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return intersections / (areas_a[:, None] + areas_b[None, :] - intersections + 1e-9)
+
+def letterbox(frame:np.ndarray = None, imgsz:int = 640, stride:int = 32) -> Tuple[np.ndarray, float, Tuple[int,int]]:
+    # Same as ultralytics LetterBox(auto=True): keep the aspect ratio and pad with gray up to the next multiple of the stride
+    # Returns (letterboxed_frame, gain, (pad_left, pad_top)) so that a point of the frame is at (x*gain + pad_left, y*gain + pad_top) in the letterboxed frame
+    frame_height, frame_width = frame.shape[:2]
+    gain = min(imgsz / frame_height, imgsz / frame_width)
+    resized_width, resized_height = int(round(frame_width * gain)), int(round(frame_height * gain))
+    padded_width, padded_height = math.ceil(resized_width / stride) * stride, math.ceil(resized_height / stride) * stride
+    pad_left, pad_top = int(round((padded_width - resized_width) / 2 - 0.1)), int(round((padded_height - resized_height) / 2 - 0.1))
+
+    if (resized_width, resized_height) != (frame_width, frame_height):
+        frame = cv2.resize(frame, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+    letterboxed = cv2.copyMakeBorder(frame, pad_top, padded_height - resized_height - pad_top, pad_left, padded_width - resized_width - pad_left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return letterboxed, gain, (pad_left, pad_top)
+
+def letterboxed_frames_to_blob(letterboxed_frames:List[np.ndarray] = None) -> np.ndarray:
+    # BGR HWC uint8 frames of the same shape -> RGB NCHW float32 in [0, 1]
+    blob = np.stack([letterboxed[:, :, ::-1].transpose(2, 0, 1) for letterboxed in letterboxed_frames])
+    return np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+NMS_FULL_IOU_MATRIX_MAX_BOXES = 512 # up to this (a few MB of temporaries), one N x N IoU matrix is faster than an IoU row per kept box
+
+def non_max_suppression(boxes_xyxy:np.ndarray = None, confidences:np.ndarray = None, class_ids:np.ndarray = None, iou_threshold:float = 0.7, max_detections:int = 300, max_nms:int = 3000) -> np.ndarray:
+    # Class-aware greedy NMS. Returns the indices of the kept boxes, in descending confidence order.
+    # Only the max_nms most confident boxes are considered (as ultralytics' max_nms), so a cluttered frame or a low confidence threshold cannot stall the loop.
+    # Up to NMS_FULL_IOU_MATRIX_MAX_BOXES boxes, the common case, the full N x N IoU matrix is built once. Above it, each kept box is compared only with
+    # the boxes that are still left, one IoU row at a time, so the memory stays O(N)
+    if len(boxes_xyxy) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    order = np.argsort(-confidences, kind="stable")[:max_nms]
+    boxes = boxes_xyxy[order] + (class_ids[order] * 7680.0)[:, None] # boxes of different classes never overlap after this offset
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    iou_matrix = calculate_iou_matrix(boxes, boxes) if len(boxes) <= NMS_FULL_IOU_MATRIX_MAX_BOXES else None
+
+    remaining_indices = np.arange(len(boxes))
+    kept_indices = []
+    while len(remaining_indices) > 0 and len(kept_indices) < max_detections:
+        i, remaining_indices = remaining_indices[0], remaining_indices[1:]
+        kept_indices.append(i)
+        if iou_matrix is not None:
+            remaining_indices = remaining_indices[iou_matrix[i, remaining_indices] <= iou_threshold]
+            continue
+        top_left = np.maximum(boxes[i, :2], boxes[remaining_indices, :2])
+        bottom_right = np.minimum(boxes[i, 2:], boxes[remaining_indices, 2:])
+        intersections = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+        ious = intersections / (areas[i] + areas[remaining_indices] - intersections + 1e-9)
+        remaining_indices = remaining_indices[ious <= iou_threshold]
+    return order[kept_indices]
+
+def set_pytorch_thread_count(thread_count:int = None):
+    # PyTorch has a single intra-op thread pool for the whole process, so the models of the PyTorch backend cannot have a thread count each.
+    # Set it once before the models run, it is shared by all of them
+    import torch
+    torch.set_num_threads(thread_count)
+
+class UltralyticsBackend:
+    # Runs the .pt model with PyTorch through ultralytics. Its intra-op threads are the process-wide PyTorch pool, see set_pytorch_thread_count
+    def __init__(self, model_path:str = None, task:str = "detect"):
+        from ultralytics import YOLO
+        self.TASK = task
+        self.yolo_object = YOLO(model_path)
+        self.names = self.yolo_object.names
+
+    def predict(self, frames:List[np.ndarray] = None, imgsz:int = None) -> List[Dict]:
+        predict_kwargs = {} if imgsz is None else {"imgsz": imgsz}
+        outputs = []
+        for results in self.yolo_object(frames, task = self.TASK, verbose= False, **predict_kwargs):
+            data = results.boxes.data # (N,6) [x1,y1,x2,y2,confidence,class]
+            if results.keypoints is not None:
+                import torch
+                data = torch.cat([data, results.keypoints.data.reshape(len(data), -1)], dim=1) # (N,6+51)
+            data = data.cpu().numpy().astype(np.float32) # single device to host transfer per frame
+
+            keypoints = None
+            if results.keypoints is not None:
+                keypoints = data[:, 6:].reshape(-1, 17, 3)
+                keypoints[:, :, :2][keypoints[:, :, 2] < 0.5] = 0 # same as ultralytics Keypoints.xy
+            outputs.append({
+                "orig_shape": tuple(results.orig_shape),
+                "boxes_xyxy": data[:, :4],
+                "confidences": data[:, 4],
+                "class_ids": data[:, 5].astype(np.int64),
+                "keypoints": keypoints,
+            })
+        return outputs
+
+class OnnxRuntimeBackend:
+    # Runs the model exported to ONNX with ONNX Runtime. Letterboxing, box and keypoint decoding and NMS are done here with NumPy,
+    # following the ultralytics defaults so that the outputs match the PyTorch path.
+    def __init__(self, model_path:str = None, task:str = "detect", intra_op_threads:int = None, execution_provider:str = "CPUExecutionProvider", imgsz:int = 640, confidence_threshold:float = 0.25, iou_threshold:float = 0.7, stride:int = 32, max_nms:int = 3000):
+        import onnxruntime
+
+        if execution_provider not in onnxruntime.get_available_providers():
+            raise ValueError(f"Execution provider '{execution_provider}' is not available. Available providers are: {onnxruntime.get_available_providers()}")
+
+        self.TASK = task
+        self.IMGSZ = imgsz
+        self.CONFIDENCE_THRESHOLD = confidence_threshold
+        self.IOU_THRESHOLD = iou_threshold
+        self.MAX_NMS = max_nms # only this many of the most confident candidates go into the NMS
+        self.STRIDE = stride
+
+        self.MODEL_PATH = model_path if model_path.endswith(".onnx") else get_exported_model_path(model_path, export_format="onnx")
+        session_options = onnxruntime.SessionOptions()
+        if intra_op_threads is not None:
+            session_options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(self.MODEL_PATH, sess_options=session_options, providers=[execution_provider])
+        self.input_name = self.session.get_inputs()[0].name
+        self.names = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map["names"])
+
+    def __decode(self, prediction:np.ndarray, orig_shape:Tuple[int,int], gain:float, pad:Tuple[int,int]) -> Dict:
+        prediction = prediction.T # (anchors, 4 + classes [+ 51 keypoint values])
+        xywh = prediction[:, :4]
+        if self.TASK == "pose":
+            confidences = prediction[:, 4]
+            class_ids = np.zeros(len(prediction), dtype=np.int64)
+        else:
+            class_scores = prediction[:, 4:4 + len(self.names)]
+            class_ids = np.argmax(class_scores, axis=1)
+            confidences = class_scores[np.arange(len(class_scores)), class_ids]
+
+        candidates = confidences > self.CONFIDENCE_THRESHOLD
+        xywh, confidences, class_ids = xywh[candidates], confidences[candidates], class_ids[candidates]
+        boxes_xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+
+        kept_indices = non_max_suppression(boxes_xyxy, confidences, class_ids, iou_threshold=self.IOU_THRESHOLD, max_nms=self.MAX_NMS)
+        boxes_xyxy, confidences, class_ids = boxes_xyxy[kept_indices], confidences[kept_indices], class_ids[kept_indices]
+
+        # Undo the letterbox and clip to the input frame
+        boxes_xyxy[:, [0, 2]] = np.clip((boxes_xyxy[:, [0, 2]] - pad[0]) / gain, 0, orig_shape[1])
+        boxes_xyxy[:, [1, 3]] = np.clip((boxes_xyxy[:, [1, 3]] - pad[1]) / gain, 0, orig_shape[0])
+
+        keypoints = None
+        if self.TASK == "pose":
+            keypoints = prediction[candidates][kept_indices, 5:].reshape(-1, 17, 3).copy()
+            keypoints[:, :, 0] = np.clip((keypoints[:, :, 0] - pad[0]) / gain, 0, orig_shape[1])
+            keypoints[:, :, 1] = np.clip((keypoints[:, :, 1] - pad[1]) / gain, 0, orig_shape[0])
+            keypoints[:, :, :2][keypoints[:, :, 2] < 0.5] = 0 # same as ultralytics Keypoints
+
+        return {
+            "orig_shape": tuple(orig_shape),
+            "boxes_xyxy": boxes_xyxy.astype(np.float32),
+            "confidences": confidences.astype(np.float32),
+            "class_ids": class_ids.astype(np.int64),
+            "keypoints": None if keypoints is None else keypoints.astype(np.float32),
+        }
+
+    def predict(self, frames:List[np.ndarray] = None, imgsz:int = None) -> List[Dict]:
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        imgsz = self.IMGSZ if imgsz is None else imgsz
+
+        letterboxed_frames = [letterbox(frame, imgsz=imgsz, stride=self.STRIDE) for frame in frames]
+        outputs = []
+        batch_start = 0
+        while batch_start < len(frames):
+            # Consecutive frames with the same letterboxed shape (e.g. face crops) are predicted as one batch
+            batch_end = batch_start + 1
+            while batch_end < len(frames) and letterboxed_frames[batch_end][0].shape == letterboxed_frames[batch_start][0].shape:
+                batch_end += 1
+
+            blob = letterboxed_frames_to_blob([letterboxed for letterboxed, _, _ in letterboxed_frames[batch_start:batch_end]])
+            predictions = self.session.run(None, {self.input_name: blob})[0]
+
+            for i, prediction in enumerate(predictions):
+                _, gain, pad = letterboxed_frames[batch_start + i]
+                outputs.append(self.__decode(prediction, frames[batch_start + i].shape[:2], gain, pad))
+            batch_start = batch_end
+        return outputs
+
+INFERENCE_BACKENDS = {
+    "pytorch": lambda model_path, task, intra_op_threads: UltralyticsBackend(model_path=model_path, task=task), # the thread pool is process-wide, see set_pytorch_thread_count
+    "onnxruntime": lambda model_path, task, intra_op_threads: OnnxRuntimeBackend(model_path=model_path, task=task, intra_op_threads=intra_op_threads, execution_provider="CPUExecutionProvider"),
+    "openvino": lambda model_path, task, intra_op_threads: OnnxRuntimeBackend(model_path=model_path, task=task, intra_op_threads=intra_op_threads, execution_provider="OpenVINOExecutionProvider"),
+}
+
+def create_inference_backend(backend_name:str = "pytorch", model_path:str = None, task:str = "detect", intra_op_threads:int = None):
+    # intra_op_threads is the thread count of the ONNX Runtime session of this model, it does not apply to the "pytorch" backend
+    if backend_name not in INFERENCE_BACKENDS.keys():
+        raise ValueError(f"Invalid inference backend. Available backends are: {INFERENCE_BACKENDS.keys()}")
+    if backend_name == "pytorch" and model_path.endswith(".onnx"):
+        raise ValueError(f"'{model_path}' is an ONNX model, use the 'onnxruntime' or 'openvino' backend")
+    return INFERENCE_BACKENDS[backend_name](model_path, task, intra_op_threads)
@@ -0,0 +1,62 @@
+from typing import List, Dict, Tuple, Callable #for python3.8 compatibility
+import concurrent.futures
+import time
+
+class InferenceExecutor:
+    # Runs independent models concurrently. Each model has its own worker thread, so a model always runs on the same thread.
+    # The heavy work releases the GIL, so the models overlap on CPU. The intra-op thread counts are set by the inference backends, see inference_backends.py
+
+    def __init__(self, model_names:List[str] = None, latency_smoothing_factor:float = 0.1):
+        self.LATENCY_SMOOTHING_FACTOR = latency_smoothing_factor
+
+        self.workers = {}
+        for model_name in model_names:
+            self.workers[model_name] = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"inference_{model_name}")
+
+        self.pending_futures = {} # model_name -> future of the submitted call
+        self.last_latencies_s = {model_name: 0.0 for model_name in model_names}
+        self.mean_latencies_s = {model_name: 0.0 for model_name in model_names}
+        self.last_wall_time_s = 0.0 # time between the first submit and the end of the join
+        self.first_submit_time = None
+
+    def __timed_call(self, model_name:str, function:Callable, args:tuple, kwargs:dict):
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.last_latencies_s[model_name] = time.perf_counter() - start_time
+        return result
+
+    def submit(self, model_name:str = None, function:Callable = None, *args, **kwargs):
+        if model_name in self.pending_futures:
+            raise ValueError(f"'{model_name}' is already running, join the previous call first")
+        if self.first_submit_time is None:
+            self.first_submit_time = time.perf_counter()
+        self.pending_futures[model_name] = self.workers[model_name].submit(self.__timed_call, model_name, function, args, kwargs)
+
+    def join(self) -> Dict:
+        # Waits for all submitted calls and returns model_name -> result. Exceptions raised by a model are raised here.
+        results = {}
+        try:
+            for model_name, future in self.pending_futures.items():
+                results[model_name] = future.result()
+                if self.mean_latencies_s[model_name] == 0: # first call
+                    self.mean_latencies_s[model_name] = self.last_latencies_s[model_name]
+                else:
+                    self.mean_latencies_s[model_name] = self.LATENCY_SMOOTHING_FACTOR * self.last_latencies_s[model_name] + (1 - self.LATENCY_SMOOTHING_FACTOR) * self.mean_latencies_s[model_name]
+        finally:
+            concurrent.futures.wait(self.pending_futures.values())
+            self.pending_futures = {}
+            if self.first_submit_time is not None:
+                self.last_wall_time_s = time.perf_counter() - self.first_submit_time
+            self.first_submit_time = None
+        return results
+
+    def get_latencies(self) -> Dict:
+        return {
+            "last_latencies_s": dict(self.last_latencies_s),
+            "mean_latencies_s": dict(self.mean_latencies_s),
+            "last_wall_time_s": self.last_wall_time_s,
+        }
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            worker.shutdown(wait=True)
@@ -0,0 +1,89 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import numpy as np
+
+class ConstantVelocityKalmanFilter:
+    # Constant velocity Kalman filters for many tracks at once, e.g. the face boxes as (center_x, center_y, width, height) or the wrists as (x, y).
+    # Every track lives in a slot of preallocated arrays, so predicting and updating all tracks are a few NumPy operations instead of a loop over objects.
+    # The measured values are independent of each other, thus the covariance of each value is kept as the 2x2 [position, velocity] block [pp, pv, vv].
+    # Time steps are in seconds of wall-clock time, so the tracks move correctly even if the detector does not run on every frame.
+
+    def __init__(self, measurement_dimension:int = 4, capacity:int = 16, measurement_noise = 4.0, acceleration_noise = 200.0, initial_velocity_noise = 100.0, max_extrapolation_time_s:float = 0.5):
+        self.MEASUREMENT_DIMENSION = measurement_dimension # number of measured values per track
+        self.MEASUREMENT_VARIANCES = np.broadcast_to(np.square(np.asarray(measurement_noise, dtype=np.float64)), (measurement_dimension,)) # measurement_noise is the standard deviation of a measurement, scalar or per value
+        self.ACCELERATION_VARIANCES = np.broadcast_to(np.square(np.asarray(acceleration_noise, dtype=np.float64)), (measurement_dimension,)) # acceleration_noise in unit/s^2, how quickly the velocity may change
+        self.INITIAL_VELOCITY_VARIANCES = np.broadcast_to(np.square(np.asarray(initial_velocity_noise, dtype=np.float64)), (measurement_dimension,)) # initial_velocity_noise in unit/s, uncertainty of the velocity of a new track
+        self.MAX_EXTRAPOLATION_TIME_S = max_extrapolation_time_s # predictions do not move further than this time after the last measurement
+
+        self.positions = np.zeros((capacity, measurement_dimension)) # estimate at the time of the last measurement
+        self.velocities = np.zeros((capacity, measurement_dimension)) # unit/s
+        self.covariances = np.zeros((capacity, measurement_dimension, 3)) # [pp, pv, vv] of each value
+        self.last_update_times = np.zeros(capacity) # time.time() of the last measurement
+        self.is_slot_used = np.zeros(capacity, dtype=bool)
+
+    def get_capacity(self) -> int:
+        return len(self.is_slot_used)
+
+    def __grow(self, minimum_capacity:int):
+        new_capacity = max(minimum_capacity, 2 * self.get_capacity())
+        def grown(array):
+            new_array = np.zeros((new_capacity,) + array.shape[1:], dtype=array.dtype)
+            new_array[:len(array)] = array
+            return new_array
+        self.positions, self.velocities, self.covariances = grown(self.positions), grown(self.velocities), grown(self.covariances)
+        self.last_update_times, self.is_slot_used = grown(self.last_update_times), grown(self.is_slot_used)
+
+    def create_tracks(self, measurements:np.ndarray = None, measurement_time:float = 0) -> np.ndarray:
+        # Starts a track at rest for each (M,D) measurement, returns their (M,) slots
+        measurements = np.asarray(measurements, dtype=np.float64).reshape(-1, self.MEASUREMENT_DIMENSION)
+        free_slots = np.flatnonzero(~self.is_slot_used)
+        if len(free_slots) < len(measurements):
+            self.__grow(self.get_capacity() - len(free_slots) + len(measurements))
+            free_slots = np.flatnonzero(~self.is_slot_used)
+        slots = free_slots[:len(measurements)]
+
+        self.positions[slots] = measurements
+        self.velocities[slots] = 0
+        self.covariances[slots, :, 0] = self.MEASUREMENT_VARIANCES
+        self.covariances[slots, :, 1] = 0
+        self.covariances[slots, :, 2] = self.INITIAL_VELOCITY_VARIANCES
+        self.last_update_times[slots] = measurement_time
+        self.is_slot_used[slots] = True
+        return slots
+
+    def delete_tracks(self, slots:np.ndarray = None):
+        self.is_slot_used[np.asarray(slots, dtype=np.int64)] = False
+
+    def predict(self, slots:np.ndarray = None, prediction_time:float = 0) -> np.ndarray:
+        # Returns the (M,D) extrapolated measurements of the tracks at the given time, the tracks are not changed
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        time_steps = np.minimum(np.maximum(prediction_time - self.last_update_times[slots], 0), self.MAX_EXTRAPOLATION_TIME_S)
+        return self.positions[slots] + self.velocities[slots] * time_steps[:, None]
+
+    def update(self, slots:np.ndarray = None, measurements:np.ndarray = None, measurement_time:float = 0) -> np.ndarray:
+        # Moves the tracks to the time of the (M,D) measurements and corrects them, returns the (M,D) filtered measurements
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        measurements = np.asarray(measurements, dtype=np.float64).reshape(-1, self.MEASUREMENT_DIMENSION)
+        time_steps = np.maximum(measurement_time - self.last_update_times[slots], 0)[:, None]
+
+        # Predict: x = F x, P = F P F^T + Q with F = [[1, dt], [0, 1]] and white noise acceleration Q
+        velocities = self.velocities[slots]
+        predicted_positions = self.positions[slots] + velocities * time_steps
+        covariances = self.covariances[slots]
+        pp, pv, vv = covariances[:, :, 0], covariances[:, :, 1], covariances[:, :, 2]
+        acceleration_variances = self.ACCELERATION_VARIANCES * time_steps
+        pp = pp + time_steps * (2 * pv + time_steps * (vv + acceleration_variances / 3))
+        pv = pv + time_steps * (vv + acceleration_variances / 2)
+        vv = vv + acceleration_variances
+
+        # Update: only the positions are measured, H = [1, 0]
+        position_gains = pp / (pp + self.MEASUREMENT_VARIANCES)
+        velocity_gains = pv / (pp + self.MEASUREMENT_VARIANCES)
+        innovations = measurements - predicted_positions
+        filtered_positions = predicted_positions + position_gains * innovations
+        self.positions[slots] = filtered_positions
+        self.velocities[slots] = velocities + velocity_gains * innovations
+        self.covariances[slots, :, 0] = (1 - position_gains) * pp
+        self.covariances[slots, :, 1] = (1 - position_gains) * pv
+        self.covariances[slots, :, 2] = vv - velocity_gains * pv
+        self.last_update_times[slots] = measurement_time
+        return filtered_positions
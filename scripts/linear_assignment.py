@@ -0,0 +1,90 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import numpy as np
+
+def solve_linear_assignment(cost_matrix:np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    # Minimum cost assignment of rows to columns (Hungarian method with shortest augmenting paths, O(n^3)).
+    # Every row is assigned if there are fewer rows than columns and vice versa. Returns (row_indices, column_indices) sorted by row,
+    # the same as scipy.optimize.linear_sum_assignment. The inner loops run over all columns at once with NumPy.
+    cost_matrix = np.asarray(cost_matrix, dtype=np.float64)
+    if cost_matrix.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    is_transposed = cost_matrix.shape[0] > cost_matrix.shape[1]
+    if is_transposed:
+        cost_matrix = cost_matrix.T
+    number_of_rows, number_of_columns = cost_matrix.shape
+
+    # Index 0 is a virtual column used as the root of the augmenting paths, rows and columns are 1-indexed below
+    row_potentials = np.zeros(number_of_rows + 1)
+    column_potentials = np.zeros(number_of_columns + 1)
+    column_assignments = np.zeros(number_of_columns + 1, dtype=np.int64) # row assigned to each column, 0 if none
+    previous_columns = np.zeros(number_of_columns + 1, dtype=np.int64) # previous column on the augmenting path
+
+    for row in range(1, number_of_rows + 1):
+        column_assignments[0] = row
+        current_column = 0
+        min_reduced_costs = np.full(number_of_columns + 1, np.inf)
+        is_column_used = np.zeros(number_of_columns + 1, dtype=bool)
+
+        while True:
+            is_column_used[current_column] = True
+            current_row = column_assignments[current_column]
+
+            # Relax all free columns through the current row
+            reduced_costs = cost_matrix[current_row - 1] - row_potentials[current_row] - column_potentials[1:]
+            is_free = ~is_column_used[1:]
+            is_improved = is_free & (reduced_costs < min_reduced_costs[1:])
+            min_reduced_costs[1:][is_improved] = reduced_costs[is_improved]
+            previous_columns[1:][is_improved] = current_column
+
+            next_column = int(np.argmin(np.where(is_free, min_reduced_costs[1:], np.inf))) + 1
+            delta = min_reduced_costs[next_column]
+
+            row_potentials[column_assignments[is_column_used]] += delta
+            column_potentials[is_column_used] -= delta
+            min_reduced_costs[1:][is_free] -= delta
+
+            current_column = next_column
+            if column_assignments[current_column] == 0: # reached a free column
+                break
+
+        # Flip the assignments along the augmenting path
+        while current_column != 0:
+            previous_column = previous_columns[current_column]
+            column_assignments[current_column] = column_assignments[previous_column]
+            current_column = previous_column
+
+    assigned_columns = np.flatnonzero(column_assignments[1:])
+    assigned_rows = column_assignments[1:][assigned_columns] - 1
+    if is_transposed:
+        assigned_rows, assigned_columns = assigned_columns, assigned_rows
+    order = np.argsort(assigned_rows)
+    return assigned_rows[order].astype(np.int64), assigned_columns[order].astype(np.int64)
+
+def solve_gated_assignment(cost_matrix:np.ndarray = None, is_allowed:np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    # Minimum cost assignment where only the allowed pairs can be matched, e.g. boxes that overlap enough. Returns only allowed pairs, sorted by row.
+    # In tracking most rows have a single allowed column which has no other allowed row. Such isolated pairs are matched directly
+    # and the Hungarian method only runs on the rows and columns that actually compete.
+    is_allowed = np.asarray(is_allowed, dtype=bool)
+    allowed_per_row = np.sum(is_allowed, axis=1)
+    allowed_per_column = np.sum(is_allowed, axis=0)
+
+    is_isolated = is_allowed & (allowed_per_row[:, None] == 1) & (allowed_per_column[None, :] == 1)
+    isolated_rows, isolated_columns = np.nonzero(is_isolated)
+
+    competing_rows = np.flatnonzero((allowed_per_row > 0) & ~np.any(is_isolated, axis=1))
+    competing_columns = np.flatnonzero((allowed_per_column > 0) & ~np.any(is_isolated, axis=0))
+    rows, columns = [isolated_rows], [isolated_columns]
+    if len(competing_rows) > 0 and len(competing_columns) > 0:
+        competing_is_allowed = is_allowed[np.ix_(competing_rows, competing_columns)]
+        competing_costs = np.asarray(cost_matrix, dtype=np.float64)[np.ix_(competing_rows, competing_columns)]
+        # Forbidden pairs cost more than any allowed assignment, so they are only used to fill rows that cannot be matched and are removed afterwards
+        forbidden_cost = np.max(np.abs(competing_costs[competing_is_allowed])) * (2 * min(competing_costs.shape) + 1) + 1
+        assigned_rows, assigned_columns = solve_linear_assignment(np.where(competing_is_allowed, competing_costs, forbidden_cost))
+        is_assigned_allowed = competing_is_allowed[assigned_rows, assigned_columns]
+        rows.append(competing_rows[assigned_rows[is_assigned_allowed]])
+        columns.append(competing_columns[assigned_columns[is_assigned_allowed]])
+
+    rows, columns = np.concatenate(rows).astype(np.int64), np.concatenate(columns).astype(np.int64)
+    order = np.argsort(rows)
+    return rows[order], columns[order]
@@ -0,0 +1,64 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import time
+import numpy as np
+import cv2
+
+class MotionGate:
+    # Decides whether the detectors should run on a frame. The frame is compared with the one of the last inference on a small grayscale copy,
+    # region by region. Motion starts when any region exceeds its threshold and ends only after all regions stay below a lower threshold for a while (hysteresis).
+
+    def __init__(self, downsampled_size:Tuple[int,int] = (64, 36), grid_size:Tuple[int,int] = (4, 4), region_thresholds = 6.0, release_ratio:float = 0.5, hold_time_s:float = 2.0, max_skip_time_s:float = 5.0):
+        self.DOWNSAMPLED_SIZE = downsampled_size # (width, height) of the grayscale copy the differences are computed on
+        self.GRID_SIZE = grid_size # (columns, rows) of regions
+        self.REGION_THRESHOLDS = np.broadcast_to(np.asarray(region_thresholds, dtype=np.float32), (grid_size[1], grid_size[0])) # mean absolute gray level difference per region, scalar or (rows, columns)
+        self.RELEASE_RATIO = release_ratio # motion ends when all regions are below REGION_THRESHOLDS * RELEASE_RATIO
+        self.HOLD_TIME_S = hold_time_s # motion is kept at least this long after the last region exceeded its threshold
+        self.MAX_SKIP_TIME_S = max_skip_time_s # inference runs at least this often, even if nothing changed
+
+        self.downsampled_bgr = np.zeros((downsampled_size[1], downsampled_size[0], 3), dtype=np.uint8)
+        self.downsampled_gray = np.zeros((downsampled_size[1], downsampled_size[0]), dtype=np.uint8)
+        self.reference_gray = None # downsampled frame of the last inference
+        self.difference = np.zeros((downsampled_size[1], downsampled_size[0]), dtype=np.uint8)
+        self.region_differences = np.zeros((grid_size[1], grid_size[0]), dtype=np.float32)
+
+        self.is_motion_active = False
+        self.last_time_motion_detected = 0
+        self.last_time_inference_executed = 0
+
+        self.number_of_executed_inferences = 0
+        self.number_of_skipped_inferences = 0
+
+    def should_run_inference(self, frame:np.ndarray = None, force:bool = False) -> bool:
+        cv2.resize(frame, self.DOWNSAMPLED_SIZE, dst=self.downsampled_bgr, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.downsampled_bgr, cv2.COLOR_BGR2GRAY, dst=self.downsampled_gray)
+
+        if self.reference_gray is not None:
+            cv2.absdiff(self.downsampled_gray, self.reference_gray, dst=self.difference)
+            self.region_differences[:] = cv2.resize(self.difference.astype(np.float32), self.GRID_SIZE, interpolation=cv2.INTER_AREA) # mean difference of each region
+
+            if np.any(self.region_differences > self.REGION_THRESHOLDS):
+                self.is_motion_active = True
+                self.last_time_motion_detected = time.time()
+            elif self.is_motion_active and not np.any(self.region_differences > self.REGION_THRESHOLDS * self.RELEASE_RATIO) and time.time() - self.last_time_motion_detected > self.HOLD_TIME_S:
+                self.is_motion_active = False
+
+        is_inference_needed = force or self.reference_gray is None or self.is_motion_active or time.time() - self.last_time_inference_executed > self.MAX_SKIP_TIME_S
+        if is_inference_needed:
+            if self.reference_gray is None:
+                self.reference_gray = np.zeros_like(self.downsampled_gray)
+            self.reference_gray[:] = self.downsampled_gray
+            self.last_time_inference_executed = time.time()
+            self.number_of_executed_inferences += 1
+        else:
+            self.number_of_skipped_inferences += 1
+
+        return is_inference_needed
+
+    def get_statistics(self) -> Dict:
+        total = self.number_of_executed_inferences + self.number_of_skipped_inferences
+        return {
+            "number_of_executed_inferences": self.number_of_executed_inferences,
+            "number_of_skipped_inferences": self.number_of_skipped_inferences,
+            "skipped_inference_ratio": self.number_of_skipped_inferences / total if total > 0 else 0.0,
+            "is_motion_active": self.is_motion_active,
+        }
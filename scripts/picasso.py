@@ -1,5 +1,7 @@
 import cv2
 import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Tuple #for python3.8 compatibility
 
 IMAGE_PATHS = {
     "information": "src/images/popups/information.png",
@@ -49,54 +51,162 @@ IMAGE_PATHS = {
     "arduino_connection_grey": "src/images/icons/arduino_connection_grey.png",
 }
 
-def get_image_as_frame(image_name:str=None, width:int=1920, height:int=1080, maintain_aspect_ratio:bool = True):
-    global IMAGE_PATHS
-    image_path = IMAGE_PATHS[image_name]
-    image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-
-    # Resize image
-    if maintain_aspect_ratio:
-        im_height, im_width = image.shape[0], image.shape[1]
-        scale = min((width / im_width), (height / im_height))
-        image = cv2.resize(image, (int(im_width * scale), int(im_height * scale)), interpolation=cv2.INTER_AREA)
-    else:
-        image = cv2.resize(image, (width, height),interpolation=cv2.INTER_AREA)
-
-    return image
-
-def draw_image_on_frame(frame:np.ndarray=None, image_name:str=None, x:int=None, y:int=None, width:int=100, height:int=100, maintain_aspect_ratio:bool = True):
-    global IMAGE_PATHS
-    image_path = IMAGE_PATHS[image_name]
-    image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-
-    # Resize image
-    if maintain_aspect_ratio:
-        im_height, im_width = image.shape[0], image.shape[1]
-        scale = min((width / im_width), (height / im_height))
-        image = cv2.resize(image, (int(im_width * scale), int(im_height * scale)), interpolation=cv2.INTER_AREA)
-    else:
-        image = cv2.resize(image, (width, height),interpolation=cv2.INTER_AREA)
+class Sprite:
+    # Blend-ready form of a resized image. Images with transparency are stored with premultiplied colors (bgr*alpha) and the inverse alpha (255-alpha),
+    # so that blending onto a frame is a single integer multiply-add: frame = (frame*inverse_alpha + premultiplied_bgr) / 255
+
+    def __init__(self, image:np.ndarray = None):
+        self.image = image # resized BGR or BGRA image, read-only
+        self.height, self.width = image.shape[0], image.shape[1]
+
+        self.bgr = None # used as is if the sprite is opaque
+        self.premultiplied_bgr = None # (H,W,3) uint16, bgr*alpha
+        self.inverse_alpha = None # (H,W,3) uint16, 255-alpha repeated for each channel so that no broadcasting is needed while blending
+
+        self.is_opaque = image.shape[2] == 3 or bool(np.all(image[:, :, 3] == 255))
+        if self.is_opaque:
+            self.bgr = np.ascontiguousarray(image[:, :, :3])
+        else:
+            alpha = image[:, :, 3:4].astype(np.uint16)
+            self.premultiplied_bgr = image[:, :, :3].astype(np.uint16) * alpha
+            self.inverse_alpha = np.repeat(255 - alpha, 3, axis=2)
+
+        self.nbytes = image.nbytes + (self.bgr.nbytes if self.is_opaque else self.premultiplied_bgr.nbytes + self.inverse_alpha.nbytes)
+
+class SpriteCache:
+    # Decodes every image once and memoizes its resized variants as sprites so that a frame never touches the disk after warm-up.
+    # Sprites are kept in LRU order and evicted when their total size exceeds the memory cap. Decoded originals are never evicted.
+
+    def __init__(self, image_paths:Dict[str,str] = None, max_memory_bytes:int = 128*1024*1024):
+        self.IMAGE_PATHS = image_paths
+        self.MAX_MEMORY_BYTES = max_memory_bytes # upper limit for the total size of the cached sprites
+
+        self.original_images = {} # image_name -> decoded image (BGR or BGRA)
+        self.resized_sprites = OrderedDict() # (image_name, width, height, maintain_aspect_ratio) -> Sprite, least recently used first
+        self.resized_sprites_memory_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def preload_images(self):
+        for image_name in self.IMAGE_PATHS.keys():
+            self.get_original_image(image_name)
+
+    def get_original_image(self, image_name:str = None) -> np.ndarray:
+        image = self.original_images.get(image_name)
+        if image is None:
+            image_path = self.IMAGE_PATHS[image_name]
+            image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                raise ValueError(f"Image '{image_name}' could not be read from '{image_path}'")
+            image.flags.writeable = False # cached images are shared between calls, they should never be modified in place
+            self.original_images[image_name] = image
+        return image
+
+    def get_sprite(self, image_name:str = None, width:int = 100, height:int = 100, maintain_aspect_ratio:bool = True) -> Sprite:
+        key = (image_name, width, height, maintain_aspect_ratio)
+        sprite = self.resized_sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.resized_sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        image = self.get_original_image(image_name)
+        if maintain_aspect_ratio:
+            im_height, im_width = image.shape[0], image.shape[1]
+            scale = min((width / im_width), (height / im_height))
+            image = cv2.resize(image, (int(im_width * scale), int(im_height * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            image = cv2.resize(image, (width, height),interpolation=cv2.INTER_AREA)
+        image.flags.writeable = False
+
+        sprite = Sprite(image=image)
+        self.resized_sprites[key] = sprite
+        self.resized_sprites_memory_bytes += sprite.nbytes
+        self.__evict_least_recently_used_sprites()
+        return sprite
+
+    def get_resized_image(self, image_name:str = None, width:int = 100, height:int = 100, maintain_aspect_ratio:bool = True) -> np.ndarray:
+        return self.get_sprite(image_name=image_name, width=width, height=height, maintain_aspect_ratio=maintain_aspect_ratio).image
+
+    def __evict_least_recently_used_sprites(self):
+        # The most recently added sprite is always kept, even if it alone exceeds the memory cap
+        while self.resized_sprites_memory_bytes > self.MAX_MEMORY_BYTES and len(self.resized_sprites) > 1:
+            _, evicted_sprite = self.resized_sprites.popitem(last=False)
+            self.resized_sprites_memory_bytes -= evicted_sprite.nbytes
+            self.evictions += 1
+
+    def get_statistics(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "number_of_original_images": len(self.original_images),
+            "number_of_resized_sprites": len(self.resized_sprites),
+            "resized_sprites_memory_bytes": self.resized_sprites_memory_bytes,
+        }
+
+    def reset_statistics(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+SPRITE_CACHE = SpriteCache(image_paths=IMAGE_PATHS)
+
+def preload_images():
+    # Call once at startup so that no image is decoded inside the main loop
+    SPRITE_CACHE.preload_images()
+
+def get_sprite_cache_statistics() -> Dict:
+    return SPRITE_CACHE.get_statistics()
 
-    # Draw image on frame
+def get_image_as_frame(image_name:str=None, width:int=1920, height:int=1080, maintain_aspect_ratio:bool = True):
+    # NOTE: the returned image is shared with the cache and is read-only, copy it before drawing on it
+    return SPRITE_CACHE.get_resized_image(image_name=image_name, width=width, height=height, maintain_aspect_ratio=maintain_aspect_ratio)
+
+def blend_premultiplied(frame_roi:np.ndarray = None, premultiplied_bgr:np.ndarray = None, inverse_alpha:np.ndarray = None):
+    # Blends in place: frame_roi = (frame_roi*inverse_alpha + premultiplied_bgr) / 255. All arrays should have the same (H,W,3) shape.
+    # The sum never exceeds 255*255, so the whole computation fits into uint16 without any float temporaries.
+    accumulator, shifted = _get_blend_scratch_buffers(frame_roi.shape)
+    np.multiply(frame_roi, inverse_alpha, out=accumulator)
+    np.add(accumulator, premultiplied_bgr, out=accumulator)
+    
+    # Exact rounded division by 255: (x + 128 + ((x + 128) >> 8)) >> 8
+    np.add(accumulator, 128, out=accumulator)
+    np.right_shift(accumulator, 8, out=shifted)
+    np.add(accumulator, shifted, out=accumulator)
+    np.right_shift(accumulator, 8, out=accumulator)
+    np.copyto(frame_roi, accumulator, casting="unsafe")
+
+_BLEND_SCRATCH_BUFFERS = [np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.uint16)]
+def _get_blend_scratch_buffers(shape:Tuple[int,int,int]) -> Tuple[np.ndarray, np.ndarray]:
+    # Scratch buffers only grow, so after warm-up blending does not allocate any memory
+    global _BLEND_SCRATCH_BUFFERS
+    size = shape[0] * shape[1] * shape[2]
+    if _BLEND_SCRATCH_BUFFERS[0].size < size:
+        _BLEND_SCRATCH_BUFFERS = [np.empty(size, dtype=np.uint16), np.empty(size, dtype=np.uint16)]
+    return _BLEND_SCRATCH_BUFFERS[0][:size].reshape(shape), _BLEND_SCRATCH_BUFFERS[1][:size].reshape(shape)
+
+def draw_sprite_on_frame(frame:np.ndarray=None, sprite:Sprite=None, x:int=None, y:int=None):
+    # Sprites running off any edge of the frame are clipped, including the negative x and y
     frame_height, frame_width = frame.shape[0], frame.shape[1]
-    resized_image_height, resized_image_width = image.shape[0], image.shape[1]
 
-    roi_x1 = x
-    roi_x2 = min(max(x + resized_image_width, 0), frame_width)
-    roi_y1 = y
-    roi_y2 = min(max(y + resized_image_height, 0), frame_height)
-
-    if roi_x1<0 or roi_y1<0 or (roi_x2 - roi_x1 <= 0) or (roi_y2 - roi_y1 <= 0):
+    roi_x1, roi_y1 = max(x, 0), max(y, 0)
+    roi_x2, roi_y2 = min(x + sprite.width, frame_width), min(y + sprite.height, frame_height)
+    if roi_x2 <= roi_x1 or roi_y2 <= roi_y1:
         return
-    
+
+    sprite_x1, sprite_y1 = roi_x1 - x, roi_y1 - y
+    sprite_x2, sprite_y2 = sprite_x1 + (roi_x2 - roi_x1), sprite_y1 + (roi_y2 - roi_y1)
+
     frame_roi = frame[roi_y1:roi_y2, roi_x1:roi_x2]
-    image_roi = image[0:(roi_y2-roi_y1), 0:(roi_x2-roi_x1)]
-    
-    if image.shape[2]==4:                                   # If image has alpha channel           
-        b, g, r, a = cv2.split(image_roi)                   # Split the icon into its channels            
-        image_alpha = a / 255.0                             # Normalize the alpha channel to be in the range [0, 1]
-        
-        for c in range(0, 3):                               # Loop over the RGB channels
-            frame_roi[:, :, c] = (frame_roi[:, :, c] * (1 - image_alpha) + image_roi[:, :, c] * image_alpha).astype(np.uint8)
+    if sprite.is_opaque:
+        frame_roi[:] = sprite.bgr[sprite_y1:sprite_y2, sprite_x1:sprite_x2]
     else:
-        frame[roi_y1:roi_y2, roi_x1:roi_x2] = image_roi
\ No newline at end of file
+        blend_premultiplied(frame_roi, sprite.premultiplied_bgr[sprite_y1:sprite_y2, sprite_x1:sprite_x2], sprite.inverse_alpha[sprite_y1:sprite_y2, sprite_x1:sprite_x2])
+
+def draw_image_on_frame(frame:np.ndarray=None, image_name:str=None, x:int=None, y:int=None, width:int=100, height:int=100, maintain_aspect_ratio:bool = True):
+    sprite = SPRITE_CACHE.get_sprite(image_name=image_name, width=width, height=height, maintain_aspect_ratio=maintain_aspect_ratio)
+    draw_sprite_on_frame(frame=frame, sprite=sprite, x=x, y=y)
@@ -1,148 +1,87 @@
-from ultralytics import YOLO
 from typing import List, Dict, Tuple #for python3.8 compatibility
-import cv2,math,time,os
-import time,pprint,copy
 import numpy as np
-import uuid
+import inference_backends
+import detections
 
 class PoseDetector(): 
-    #keypoints detected by the model in the detection order
-    KEYPOINT_NAMES = ["nose", "right_eye", "left_eye", "left_ear", "right_ear", "left_shoulder", "right_shoulder", "left_elbow" ,"right_elbow","left_wrist", "right_wrist", "left_hip", "right_hip", "left_knee", "right_knee", "left_ankle", "right_ankle"]
+    KEYPOINT_NAMES = detections.KEYPOINT_NAMES #keypoints detected by the model in the detection order
     POSE_MODEL_PATHS = {
-        "yolov8n":"trained_yolo_models/yolov8n-pose.pt"
+        "yolov8n":"trained_yolo_models/yolov8n-pose.pt",
+        "yolov8n_int8":"trained_yolo_models/yolov8n-pose_int8.onnx", # produced by training/quantize_models.py, needs the "onnxruntime" or "openvino" backend
     }
 
-    def __init__(self, model_name: str = None ) -> None:   
+    def __init__(self, model_name: str = None, inference_backend:str = "pytorch", intra_op_threads:int = None) -> None:   
         if model_name not in PoseDetector.POSE_MODEL_PATHS.keys():
             raise ValueError(f"Invalid model name. Available models are: {PoseDetector.POSE_MODEL_PATHS.keys()}")
         self.MODEL_PATH = PoseDetector.POSE_MODEL_PATHS[model_name]        
-        self.yolo_object = YOLO( self.MODEL_PATH, verbose= True)        
-        self.recent_prediction_results = None # This will be a list of dictionaries, each dictionary will contain the prediction results for a single detection
-
-    def __get_empty_prediction_dict_template(self) -> dict:
-        empty_prediction_dict = {   
-                    "DETECTOR_TYPE":"PoseDetector",                             # which detector made this prediction
-                    "detection_id":str(uuid.uuid4()),                           # unique id for the detection
-                    "frame_shape": [0,0],                                       # [0,0], [height , width] in pixels
-                    "class_name":"",                                            # hard_hat, no_hard_hat
-                    "bbox_confidence":0,                                        # 0.0 to 1.0
-                    "bbox_xyxy_px":[0,0,0,0],                                   # [x1,y1,x2,y2] in pixels
-                    "bbox_center_px": [0,0],                                    # [x,y] in pixels
-                    #------------------pose specific fields------------------
-                    "keypoints": {                                              # Keypoints are in the format [x,y,confidence]
-                        "left_eye": [0,0,0,0,0],
-                        "right_eye": [0,0,0,0,0],
-                        "nose": [0,0,0,0,0],
-                        "left_ear": [0,0,0,0,0],
-                        "right_ear": [0,0,0,0,0],
-                        "left_shoulder": [0,0,0,0,0],
-                        "right_shoulder": [0,0,0,0,0],
-                        "left_elbow": [0,0,0,0,0],
-                        "right_elbow": [0,0,0,0,0],
-                        "left_wrist": [0,0,0,0,0],
-                        "right_wrist": [0,0,0,0,0],
-                        "left_hip": [0,0,0,0,0],
-                        "right_hip": [0,0,0,0,0],
-                        "left_knee": [0,0,0,0,0],
-                        "right_knee": [0,0,0,0,0],
-                        "left_ankle": [0,0,0,0,0],
-                        "right_ankle": [0,0,0,0,0],
-                    }
-        }
-        return empty_prediction_dict
-    
-    def predict_frame_and_return_detections(self, frame:np.ndarray = None, bbox_confidence:float=0.75) -> List[Dict]:
-        self.recent_prediction_results = []
-        
-        results = self.yolo_object(frame, task = "pose", verbose= False)[0]
-        for i, result in enumerate(results):
-            boxes = result.boxes
-            box_cls_no = int(boxes.cls.cpu().numpy()[0])
-            box_cls_name = self.yolo_object.names[box_cls_no]
-            if box_cls_name not in ["person"]:
-                continue
-            box_conf = boxes.conf.cpu().numpy()[0]
-            if box_conf < bbox_confidence:
-                continue
-            box_xyxy = boxes.xyxy.cpu().numpy()[0]
-
-            prediction_dict_template = self.__get_empty_prediction_dict_template()
-            prediction_dict_template["frame_shape"] = list(results.orig_shape)
-            prediction_dict_template["detection_id"] = str(uuid.uuid4()) #unique id for the detection
-            prediction_dict_template["class_name"] = box_cls_name
-            prediction_dict_template["bbox_confidence"] = box_conf
-            prediction_dict_template["bbox_xyxy_px"] = box_xyxy # Bounding box in the format [x1,y1,x2,y2]
-            prediction_dict_template["bbox_center_px"] = [ (box_xyxy[0]+box_xyxy[2])/2, (box_xyxy[1]+box_xyxy[3])/2]
-            
-            key_points = result.keypoints  # Keypoints object for pose outputs
-            keypoint_confs = key_points.conf.cpu().numpy()[0]
-            keypoints_xy = key_points.xy.cpu().numpy()[0]
-                       
-            for keypoint_index, keypoint_name in enumerate(PoseDetector.KEYPOINT_NAMES):
-                keypoint_conf = keypoint_confs[keypoint_index] 
-                keypoint_x = keypoints_xy[keypoint_index][0]
-                keypoint_y = keypoints_xy[keypoint_index][1]
-                if keypoint_x == 0 and keypoint_y == 0: #if the keypoint is not detected
-                    #But this is also a prediction. Thus the confidence should not be set to zero. negative values are used to indicate that the keypoint is not detected
-                    keypoint_conf = -keypoint_conf
-
-                prediction_dict_template["keypoints"][keypoint_name] = [keypoint_x, keypoint_y , keypoint_conf]
-
-            self.recent_prediction_results.append(prediction_dict_template)
-
+        self.inference_backend = inference_backends.create_inference_backend(backend_name=inference_backend, model_path=self.MODEL_PATH, task="pose", intra_op_threads=intra_op_threads) # "pytorch", "onnxruntime" or "openvino"
+        self.FACE_BOX_EYE_DISTANCE_MULTIPLIER = 4.0 # edge length of the face box in terms of the distance between the eyes
+        self.NOSE_TO_EYE_DISTANCE_RATIO = 0.5 # horizontal eye-nose distance in terms of the distance between the eyes, used if one eye is not visible
+        self.EAR_TO_EYE_DISTANCE_RATIO = 1.5 # horizontal eye-ear distance in terms of the distance between the eyes, used if one eye and the nose are not visible
+        self.PERSON_CLASS_ID = [class_id for class_id, class_name in self.inference_backend.names.items() if class_name == "person"][0]
+        self.recent_prediction_results = detections.Detections.create_empty(detector_type="PoseDetector", class_names=self.inference_backend.names, with_keypoints=True) # predictions of the last frame
+
+    def predict_frame_and_return_detections(self, frame:np.ndarray = None, bbox_confidence:float=0.75) -> detections.Detections:
+        results = self.inference_backend.predict([frame])[0]
+        is_kept = (results["class_ids"] == self.PERSON_CLASS_ID) & (results["confidences"] >= bbox_confidence)
+        self.recent_prediction_results = detections.Detections(
+            detector_type="PoseDetector",
+            frame_shape=results["orig_shape"],
+            class_names=self.inference_backend.names,
+            boxes=results["boxes_xyxy"][is_kept],
+            conf=results["confidences"][is_kept],
+            cls=results["class_ids"][is_kept],
+            keypoints=results["keypoints"][is_kept],
+        )
         return self.recent_prediction_results
     
-    def return_face_bboxes_list(self, frame:np.ndarray = None, predictions:List[Dict] = None, keypoint_confidence_threshold:float = 0.75) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:      
+    def return_face_bboxes_list(self, frame:np.ndarray = None, predictions:detections.Detections = None, keypoint_confidence_threshold:float = 0.75, use_keypoint_fallbacks:bool = False) -> np.ndarray:      
+        # Returns an (N,5) int64 array of [x1, y1, x2, y2, detection_id], one row per person whose face could be located.
+        # The face box is a square around the eyes with an edge of 4 times the distance between the eyes. If 'use_keypoint_fallbacks' is True and only
+        # one eye is visible, the eye distance and the face center are estimated from that eye and the nose or, for a profile, the ear on the same side.
         if predictions is None:
             raise ValueError("No detections provided")
-        
-        extracted_face_coordinates = []
-        facial_keypoints = ["left_eye", "right_eye", "nose", "left_ear", "right_ear"]
-
-        for detection in predictions:
-            if detection["class_name"] != "person":
-                continue
-
-            detected_keypoints = {
-                "left_eye": False,
-                "right_eye": False,
-                "nose": False,
-                "left_ear": False,
-                "right_ear": False
-            }
-
-            for keypoint_name in facial_keypoints:
-                keypoint = detection["keypoints"][keypoint_name]
-                if keypoint[2] > keypoint_confidence_threshold: #means detected and confidence is above threshold
-                    detected_keypoints[keypoint_name] = True                    
-                else:
-                    continue
-
-            #determine the face bounding boxe using the location of the right and left eyes
-            if detected_keypoints["left_eye"] and detected_keypoints["right_eye"]:                   
-                frame_height, frame_width, _ = frame.shape
-
-                left_eye_center = (detection["keypoints"]["left_eye"][0],detection["keypoints"]["left_eye"][1])
-                right_eye_center = (detection["keypoints"]["right_eye"][0],detection["keypoints"]["right_eye"][1])             
-                distance_between_eyes = abs(left_eye_center[0] - right_eye_center[0])
-
-                face_center_x = (left_eye_center[0] + right_eye_center[0]) // 2
-                face_center_y = (left_eye_center[1] + right_eye_center[1]) // 2
-
-                # Define box size based on the distance between eyes
-                box_width = int(4.0 * distance_between_eyes) # Adjust the multiplier as needed
-                box_height = int(4.0 * distance_between_eyes) # Adjust the multiplier as needed
-
-                # Calculate the top-left and bottom-right coordinates
-                face_bbox_x1 = int(max(0, face_center_x - box_width // 2))
-                face_bbox_y1 = int(max(0, face_center_y - box_height // 2))
-                face_bbox_x2 = int(min(frame_width - 1, face_center_x + box_width // 2))
-                face_bbox_y2 = int(min(frame_height - 1, face_center_y + box_height // 2))
-
-                extracted_face_coordinates.append(copy.deepcopy((face_bbox_x1,face_bbox_y1, face_bbox_x2, face_bbox_y2, detection["detection_id"])))            
-           
-        return extracted_face_coordinates
-
-            
-
 
+        frame_height, frame_width, _ = frame.shape
+        keypoints = predictions.keypoints
+        is_person = predictions.cls == self.PERSON_CLASS_ID
+        is_visible = keypoints[:, :, 2] > keypoint_confidence_threshold
+
+        left_eye_index, right_eye_index = detections.KEYPOINT_INDICES["left_eye"], detections.KEYPOINT_INDICES["right_eye"]
+        left_eyes, right_eyes = keypoints[:, left_eye_index, :2], keypoints[:, right_eye_index, :2]
+        is_left_eye_visible, is_right_eye_visible = is_visible[:, left_eye_index], is_visible[:, right_eye_index]
+
+        #determine the face bounding boxes using the location of the right and left eyes
+        has_face = is_person & is_left_eye_visible & is_right_eye_visible
+        distances_between_eyes = np.abs(left_eyes[:, 0] - right_eyes[:, 0])
+        face_centers = (left_eyes + right_eyes) // 2
+
+        has_single_eye = is_person & (is_left_eye_visible ^ is_right_eye_visible)
+        if use_keypoint_fallbacks and np.any(has_single_eye):
+            visible_eyes = np.where(is_left_eye_visible[:, None], left_eyes, right_eyes)
+
+            # nose: the horizontal eye-nose distance is about half of the eye distance, the face is centered on the nose at eye height
+            noses = keypoints[:, detections.KEYPOINT_INDICES["nose"], :2]
+            has_eye_and_nose = has_single_eye & is_visible[:, detections.KEYPOINT_INDICES["nose"]]
+            distances_between_eyes = np.where(has_eye_and_nose, np.abs(visible_eyes[:, 0] - noses[:, 0]) / self.NOSE_TO_EYE_DISTANCE_RATIO, distances_between_eyes)
+            face_centers = np.where(has_eye_and_nose[:, None], np.floor(np.stack([noses[:, 0], visible_eyes[:, 1]], axis=1)), face_centers)
+
+            # ear on the same side as the visible eye: seen in profile, the face is centered between the eye and the ear
+            same_side_ear_indices = np.where(is_left_eye_visible, detections.KEYPOINT_INDICES["left_ear"], detections.KEYPOINT_INDICES["right_ear"])
+            same_side_ears = keypoints[np.arange(len(keypoints)), same_side_ear_indices, :2]
+            has_eye_and_ear = has_single_eye & ~has_eye_and_nose & is_visible[np.arange(len(keypoints)), same_side_ear_indices]
+            distances_between_eyes = np.where(has_eye_and_ear, np.abs(visible_eyes[:, 0] - same_side_ears[:, 0]) / self.EAR_TO_EYE_DISTANCE_RATIO, distances_between_eyes)
+            face_centers = np.where(has_eye_and_ear[:, None], np.stack([(visible_eyes[:, 0] + same_side_ears[:, 0]) // 2, visible_eyes[:, 1]], axis=1), face_centers)
+
+            has_face |= has_eye_and_nose | has_eye_and_ear
+
+        # Define box size based on the distance between eyes
+        half_box_sizes = (np.floor(self.FACE_BOX_EYE_DISTANCE_MULTIPLIER * distances_between_eyes[has_face]) // 2)[:, None]
+        face_centers = face_centers[has_face]
+
+        # Calculate the top-left and bottom-right coordinates
+        face_bboxes = np.empty((len(face_centers), 5), dtype=np.int64)
+        face_bboxes[:, 0:2] = np.floor(np.maximum(0, face_centers - half_box_sizes))
+        face_bboxes[:, 2:4] = np.floor(np.minimum([frame_width - 1, frame_height - 1], face_centers + half_box_sizes))
+        face_bboxes[:, 4] = predictions.ids[has_face]
+        return face_bboxes
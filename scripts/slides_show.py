@@ -1,12 +1,11 @@
 import os, time
 import cv2
 import numpy as np
-import copy
 from typing import List, Dict, Tuple #for python3.8 compatibility
 
 class SlideShow():
 
-    def __init__(self, slides_folder:str = None, slide_duration_s:float = 5):
+    def __init__(self, slides_folder:str = None, slide_duration_s:float = 5, display_size:Tuple[int,int] = None):
         #SLIDES RELATED
         self.last_time_slide_changed = 0
         self.current_slide_index = 0
@@ -25,6 +24,11 @@ class SlideShow():
 
         if len(self.SLIDE_IMAGES) == 0:
             raise Exception("No slide images found in the given folder")
+
+        self.scaled_slide_images = {} # (width, height) -> slides resized to that size, read-only
+        self.crossfade_frame = None # preallocated output of the crossfade between the slide and the frame
+        if display_size is not None:
+            self.get_scaled_slide_images(width=display_size[0], height=display_size[1])
     
     def should_change_slide(self) -> bool:
         time_elapsed = time.time() - self.last_time_slide_changed
@@ -35,9 +39,21 @@ class SlideShow():
         self.current_slide_index = (self.current_slide_index + 1) % len(self.SLIDE_IMAGES)
         self.last_time_slide_changed = time.time()
 
-    def get_slide_images(self, width:int, height:int) -> List[np.ndarray]:
-        return_slide_frame = cv2.resize(copy.deepcopy(self.SLIDE_IMAGES[self.current_slide_index]), (width, height))
-        return return_slide_frame
+    def get_scaled_slide_images(self, width:int, height:int) -> List[np.ndarray]:
+        # Slides are resized once per target size instead of every frame
+        if (width, height) not in self.scaled_slide_images:
+            scaled_slide_images = []
+            for slide_image in self.SLIDE_IMAGES:
+                scaled_slide_image = cv2.resize(slide_image, (width, height))
+                scaled_slide_image.flags.writeable = False
+                scaled_slide_images.append(scaled_slide_image)
+            self.scaled_slide_images[(width, height)] = scaled_slide_images
+        return self.scaled_slide_images[(width, height)]
+
+    def get_slide_images(self, width:int, height:int) -> np.ndarray:
+        if self.opacity == 0: # slide is not visible, no need to fetch it
+            return None
+        return self.get_scaled_slide_images(width=width, height=height)[self.current_slide_index]
     
     def increase_opacity(self):
         if self.is_opacity_increasing == False:
@@ -55,11 +71,15 @@ class SlideShow():
         self.opacity = max(0.0, self.opacity - 0.05)
 
     def draw_slide_on_top_of_frame(self, frame:np.ndarray, slide_frame:np.ndarray):
-        if self.opacity == 0: # If opacity is 0, no need to draw slide on top of frame, extra processing
+        if self.opacity == 0 or slide_frame is None: # If opacity is 0, no need to draw slide on top of frame, extra processing
             return frame
-        return_frame = copy.deepcopy(frame)
-        cv2.addWeighted(slide_frame, self.opacity, return_frame, 1 - self.opacity, 0, return_frame)
-        return return_frame
+        if self.opacity >= 1.0: # slide covers the frame completely, it is returned as is (read-only)
+            return slide_frame
+
+        if self.crossfade_frame is None or self.crossfade_frame.shape != frame.shape:
+            self.crossfade_frame = np.empty_like(frame)
+        cv2.addWeighted(slide_frame, self.opacity, frame, 1 - self.opacity, 0, dst=self.crossfade_frame)
+        return self.crossfade_frame
     
 
     
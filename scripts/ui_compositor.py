@@ -0,0 +1,146 @@
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import numpy as np
+import picasso
+
+class OverlayCompositor:
+    # Pre-renders static UI layers (buttons, status icons, popups) into a single premultiplied BGR + inverse-alpha overlay.
+    # The overlay is re-rendered only inside the regions of the layers whose state changed, and it is applied to the camera frame in one blend pass.
+
+    def __init__(self, width:int = 1920, height:int = 1080):
+        self.WIDTH = width
+        self.HEIGHT = height
+
+        self.layers = {} # layer_name -> (z_index, image_name, x, y, width, height, maintain_aspect_ratio)
+        self.layer_regions = {} # layer_name -> [x1, y1, x2, y2] region covered by the layer, clipped to the overlay
+        self.dirty_regions = [] # [x1, y1, x2, y2] regions of the overlay that should be re-rendered before the next blend
+        self.blend_regions = [] # (x1, y1, x2, y2, is_opaque) non-overlapping regions that are applied to the frame
+
+        self.overlay_premultiplied_bgr = np.zeros((height, width, 3), dtype=np.uint16) # bgr*alpha
+        self.overlay_inverse_alpha = np.full((height, width, 3), 255, dtype=np.uint16) # 255-alpha
+        self.overlay_bgr = np.zeros((height, width, 3), dtype=np.uint8) # used to copy fully opaque regions directly
+
+        self.number_of_renders = 0 # how many times the overlay was re-rendered due to a state change
+
+    def set_layer(self, layer_name:str = None, image_name:str = None, x:int = 0, y:int = 0, width:int = 100, height:int = 100, maintain_aspect_ratio:bool = False, z_index:int = 0):
+        layer = (z_index, image_name, x, y, width, height, maintain_aspect_ratio)
+        if self.layers.get(layer_name) == layer:
+            return
+
+        self.remove_layer(layer_name)
+        sprite = picasso.SPRITE_CACHE.get_sprite(image_name=image_name, width=width, height=height, maintain_aspect_ratio=maintain_aspect_ratio)
+        visible_x1, visible_y1, visible_x2, visible_y2 = self.__get_visible_bounds(sprite)
+        region = [max(x + visible_x1, 0), max(y + visible_y1, 0), min(x + visible_x2, self.WIDTH), min(y + visible_y2, self.HEIGHT)]
+
+        self.layers[layer_name] = layer
+        if region[2] > region[0] and region[3] > region[1]:
+            self.layer_regions[layer_name] = region
+            self.dirty_regions.append(region)
+
+    def __get_visible_bounds(self, sprite:picasso.Sprite) -> Tuple[int,int,int,int]:
+        # Fully transparent borders of a sprite are not part of its region, so they are never blended
+        if sprite.is_opaque:
+            return 0, 0, sprite.width, sprite.height
+        visible_mask = sprite.inverse_alpha[:, :, 0] < 255
+        visible_rows, visible_columns = np.flatnonzero(visible_mask.any(axis=1)), np.flatnonzero(visible_mask.any(axis=0))
+        if len(visible_rows) == 0:
+            return 0, 0, 0, 0
+        return int(visible_columns[0]), int(visible_rows[0]), int(visible_columns[-1]) + 1, int(visible_rows[-1]) + 1
+
+    def remove_layer(self, layer_name:str = None):
+        if layer_name not in self.layers:
+            return
+        del self.layers[layer_name]
+        region = self.layer_regions.pop(layer_name, None)
+        if region is not None:
+            self.dirty_regions.append(region)
+
+    def is_dirty(self) -> bool:
+        return len(self.dirty_regions) > 0
+
+    def __render_dirty_regions(self):
+        layers_in_z_order = sorted(self.layer_regions.keys(), key=lambda layer_name: self.layers[layer_name][0])
+
+        for dirty_x1, dirty_y1, dirty_x2, dirty_y2 in self.dirty_regions:
+            premultiplied_bgr = self.overlay_premultiplied_bgr[dirty_y1:dirty_y2, dirty_x1:dirty_x2]
+            inverse_alpha = self.overlay_inverse_alpha[dirty_y1:dirty_y2, dirty_x1:dirty_x2]
+            premultiplied_bgr[:] = 0
+            inverse_alpha[:] = 255
+
+            for layer_name in layers_in_z_order:
+                _, image_name, x, y, width, height, maintain_aspect_ratio = self.layers[layer_name]
+                layer_x1, layer_y1, layer_x2, layer_y2 = self.layer_regions[layer_name]
+                x1, y1 = max(layer_x1, dirty_x1), max(layer_y1, dirty_y1)
+                x2, y2 = min(layer_x2, dirty_x2), min(layer_y2, dirty_y2)
+                if x2 <= x1 or y2 <= y1:
+                    continue
+
+                sprite = picasso.SPRITE_CACHE.get_sprite(image_name=image_name, width=width, height=height, maintain_aspect_ratio=maintain_aspect_ratio)
+                self.__composite_sprite_over_overlay(sprite, sprite_x1=x1 - x, sprite_y1=y1 - y, overlay_region=(x1, y1, x2, y2))
+
+            # Opaque pixels are copied instead of blended, so their colors are kept in uint8 as well
+            self.overlay_bgr[dirty_y1:dirty_y2, dirty_x1:dirty_x2] = (premultiplied_bgr.astype(np.uint32) + 127) // 255
+
+        self.dirty_regions = []
+        self.__update_blend_regions()
+        self.number_of_renders += 1
+
+    def __composite_sprite_over_overlay(self, sprite:picasso.Sprite, sprite_x1:int, sprite_y1:int, overlay_region:Tuple[int,int,int,int]):
+        # Porter-Duff 'over' in premultiplied form: P = Ps + P*Is/255, I = I*Is/255. Only runs when the state changes, so uint32 temporaries are fine.
+        x1, y1, x2, y2 = overlay_region
+        sprite_x2, sprite_y2 = sprite_x1 + (x2 - x1), sprite_y1 + (y2 - y1)
+        premultiplied_bgr = self.overlay_premultiplied_bgr[y1:y2, x1:x2]
+        inverse_alpha = self.overlay_inverse_alpha[y1:y2, x1:x2]
+
+        if sprite.is_opaque:
+            premultiplied_bgr[:] = sprite.bgr[sprite_y1:sprite_y2, sprite_x1:sprite_x2].astype(np.uint16) * 255
+            inverse_alpha[:] = 0
+            return
+
+        sprite_premultiplied_bgr = sprite.premultiplied_bgr[sprite_y1:sprite_y2, sprite_x1:sprite_x2]
+        sprite_inverse_alpha = sprite.inverse_alpha[sprite_y1:sprite_y2, sprite_x1:sprite_x2].astype(np.uint32)
+        premultiplied_bgr[:] = sprite_premultiplied_bgr + (premultiplied_bgr * sprite_inverse_alpha + 127) // 255
+        inverse_alpha[:] = (inverse_alpha * sprite_inverse_alpha + 127) // 255
+
+    def __update_blend_regions(self):
+        # Overlapping layer regions are merged into their bounding boxes so that no pixel is blended twice.
+        # Transparent pixels inside a merged region blend as an exact no-op.
+        merged_regions = [list(region) for region in self.layer_regions.values()]
+        is_merged = True
+        while is_merged:
+            is_merged = False
+            for i in range(len(merged_regions)):
+                for j in range(i + 1, len(merged_regions)):
+                    a, b = merged_regions[i], merged_regions[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        merged_regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del merged_regions[j]
+                        is_merged = True
+                        break
+                if is_merged:
+                    break
+
+        self.blend_regions = []
+        for x1, y1, x2, y2 in merged_regions:
+            is_opaque = not np.any(self.overlay_inverse_alpha[y1:y2, x1:x2])
+            self.blend_regions.append((x1, y1, x2, y2, is_opaque))
+
+    def apply_to_frame(self, frame:np.ndarray = None):
+        if frame.shape[0] != self.HEIGHT or frame.shape[1] != self.WIDTH:
+            raise ValueError(f"Frame size {frame.shape[1]}x{frame.shape[0]} does not match the overlay size {self.WIDTH}x{self.HEIGHT}")
+
+        if self.is_dirty():
+            self.__render_dirty_regions()
+
+        for x1, y1, x2, y2, is_opaque in self.blend_regions:
+            if is_opaque:
+                frame[y1:y2, x1:x2] = self.overlay_bgr[y1:y2, x1:x2]
+            else:
+                picasso.blend_premultiplied(frame[y1:y2, x1:x2], self.overlay_premultiplied_bgr[y1:y2, x1:x2], self.overlay_inverse_alpha[y1:y2, x1:x2])
+
+    def get_statistics(self) -> Dict:
+        return {
+            "number_of_layers": len(self.layers),
+            "number_of_renders": self.number_of_renders,
+            "number_of_blend_regions": len(self.blend_regions),
+            "blended_pixels_per_frame": sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2, _ in self.blend_regions),
+        }
@@ -3,12 +3,13 @@ import numpy as np
 import time
 import picasso
 import cv2 
+import detections
+import kalman_filter
 
 class WristCursor:
 
     def __init__(self):
         self.PARAM_WRIST_UP_FACTOR = 0.03 # cursor should be above the wrist by this factor for better UX
-        self.CURSOR_SMOOTHING_FACTOR = 0.2 # smoothing factor for cursor movement
 
         self.WRIST_DETECTION_THRESHOLD = 0.65 # if the confidence of the wrist detection is below this value, it will be ignored
         self.DETECTION_TIMEOUT_S = 1.25 # if the wrist is not detected for this amount of time in seconds, the cursor will be hidden
@@ -37,6 +38,11 @@ class WristCursor:
         self.last_time_wrist_updated = [0,0] # wrist-1, wrist-2 last update time
         self.normalized_wrist_coordinates = [[0,0],[0,0]] # wrist-1, wrist-2
         self.normalized_cursor_coordinates = [[0,0], [0,0]] # cursor-1, cursor-2
+        self.cursor_track_id = -1 # track id of the person the cursors belong to
+
+        # Motion model of the wrists in normalized coordinates, it smooths the detections and extrapolates the cursors between the pose detections
+        self.wrist_motion_model = kalman_filter.ConstantVelocityKalmanFilter(measurement_dimension=2, capacity=2, measurement_noise=0.01, acceleration_noise=3.0, initial_velocity_noise=0.5, max_extrapolation_time_s=0.25)
+        self.wrist_kalman_slots = [-1, -1] # wrist-1, wrist-2, -1 if the wrist is not tracked
 
         self.how_to_use_started_holding_time = 0
         self.pass_me_started_holding_time = 0
@@ -44,43 +50,48 @@ class WristCursor:
     def is_inside_normalized_region(self, region:List[Tuple[float,float,float,float]], point:List[Tuple[float,float]]):
         return region[0] < point[0] < region[2] and region[1] < point[1] < region[3]
     
-    def update_wrist_cursor_position(self, main_face_pose_detection_id:str="", pose_pred_dicts:List[Dict]=None, predicted_frame:np.ndarray=None):
+    def __set_cursor_coordinates(self, wrist_index:int, normalized_wrist_coordinates:np.ndarray):
+        self.normalized_wrist_coordinates[wrist_index] = [float(normalized_wrist_coordinates[0]), float(normalized_wrist_coordinates[1])]
+        self.normalized_cursor_coordinates[wrist_index] = [self.normalized_wrist_coordinates[wrist_index][0], max(0, self.normalized_wrist_coordinates[wrist_index][1] - self.PARAM_WRIST_UP_FACTOR)]
+
+    def update_wrist_cursor_position(self, main_face_track_id:int=-1, pose_detections:detections.Detections=None, predicted_frame:np.ndarray=None, detection_time:float=None):
         #0.1 up the wrist
+        detection_time = time.time() if detection_time is None else detection_time
 
         # UPDATE WRIST POSITIONS AND LAST DETECTION TIMES
-        for pose_pred_dict in pose_pred_dicts:
-            if pose_pred_dict["detection_id"] == main_face_pose_detection_id:
-
-
-                if pose_pred_dict["keypoints"]["left_wrist"][2] > self.WRIST_DETECTION_THRESHOLD: 
-                    left_wrist_resized = pose_pred_dict["keypoints"]["left_wrist"]
-
-                    new_left_wrist_x = left_wrist_resized[0] / predicted_frame.shape[1]
-                    new_left_wrist_y = left_wrist_resized[1] / predicted_frame.shape[0]
+        detection_index = pose_detections.get_index_of_track_id(main_face_track_id)
+        if detection_index == -1:
+            return
 
-                    self.normalized_wrist_coordinates[0][0] = self.CURSOR_SMOOTHING_FACTOR * new_left_wrist_x + (1 - self.CURSOR_SMOOTHING_FACTOR) * self.normalized_wrist_coordinates[0][0]
-                    self.normalized_wrist_coordinates[0][1] = self.CURSOR_SMOOTHING_FACTOR * new_left_wrist_y + (1 - self.CURSOR_SMOOTHING_FACTOR) * self.normalized_wrist_coordinates[0][1]
+        # The motion model belongs to one person, the cursor jumps to the new main person instead of sliding from the previous one
+        is_new_track = main_face_track_id != self.cursor_track_id
+        self.cursor_track_id = main_face_track_id
 
-                    self.normalized_cursor_coordinates[0] = self.normalized_wrist_coordinates[0]
-                    self.normalized_cursor_coordinates[0][1] = max(0,self.normalized_cursor_coordinates[0][1] - self.PARAM_WRIST_UP_FACTOR)
-
-                    self.last_time_wrist_updated[0] = time.time()
-
-                if pose_pred_dict["keypoints"]["right_wrist"][2] >  self.WRIST_DETECTION_THRESHOLD:               
-                    right_wrist_resized = pose_pred_dict["keypoints"]["right_wrist"]
-
-                    new_right_wrist_x = right_wrist_resized[0] / predicted_frame.shape[1]
-                    new_right_wrist_y = right_wrist_resized[1] / predicted_frame.shape[0]
-
-                    self.normalized_wrist_coordinates[1][0] = self.CURSOR_SMOOTHING_FACTOR * new_right_wrist_x + (1 - self.CURSOR_SMOOTHING_FACTOR) * self.normalized_wrist_coordinates[1][0]
-                    self.normalized_wrist_coordinates[1][1] = self.CURSOR_SMOOTHING_FACTOR * new_right_wrist_y + (1 - self.CURSOR_SMOOTHING_FACTOR) * self.normalized_wrist_coordinates[1][1]
+        for wrist_index, wrist_name in enumerate(["left_wrist", "right_wrist"]):
+            wrist_x, wrist_y, wrist_conf = pose_detections.keypoints[detection_index, detections.KEYPOINT_INDICES[wrist_name]]
+            if wrist_conf <= self.WRIST_DETECTION_THRESHOLD:
+                continue
 
-                    self.normalized_cursor_coordinates[1] = self.normalized_wrist_coordinates[1]
-                    self.normalized_cursor_coordinates[1][1] = max(0,self.normalized_cursor_coordinates[1][1] - self.PARAM_WRIST_UP_FACTOR)
+            new_normalized_wrist_coordinates = [wrist_x / predicted_frame.shape[1], wrist_y / predicted_frame.shape[0]]
+            is_wrist_lost = detection_time - self.last_time_wrist_updated[wrist_index] > self.DETECTION_TIMEOUT_S
+            if is_new_track or is_wrist_lost or self.wrist_kalman_slots[wrist_index] == -1:
+                if self.wrist_kalman_slots[wrist_index] != -1:
+                    self.wrist_motion_model.delete_tracks([self.wrist_kalman_slots[wrist_index]])
+                self.wrist_kalman_slots[wrist_index] = int(self.wrist_motion_model.create_tracks(new_normalized_wrist_coordinates, detection_time)[0])
+                filtered_coordinates = new_normalized_wrist_coordinates
+            else:
+                filtered_coordinates = self.wrist_motion_model.update([self.wrist_kalman_slots[wrist_index]], new_normalized_wrist_coordinates, detection_time)[0]
 
-                    self.last_time_wrist_updated[1] = time.time()
+            self.__set_cursor_coordinates(wrist_index, filtered_coordinates)
+            self.last_time_wrist_updated[wrist_index] = detection_time
 
-                break
+    def extrapolate_wrist_cursor_position(self, current_time:float=None):
+        # Moves the cursors to the wrist positions the motion model predicts for the current time, used on the frames the pose detector does not run on
+        current_time = time.time() if current_time is None else current_time
+        for wrist_index in range(2):
+            if self.wrist_kalman_slots[wrist_index] == -1 or current_time - self.last_time_wrist_updated[wrist_index] > self.DETECTION_TIMEOUT_S:
+                continue
+            self.__set_cursor_coordinates(wrist_index, self.wrist_motion_model.predict([self.wrist_kalman_slots[wrist_index]], current_time)[0])
 
     def update_wrist_cursor_mode(self):
         is_cursor_1_active = True if (time.time()-self.last_time_wrist_updated[0]) < self.DETECTION_TIMEOUT_S else False
@@ -133,33 +144,32 @@ class WristCursor:
             else:
                 picasso.draw_image_on_frame(frame=frame, image_name="wrist_mouse_icon_transparent", x=cursor_topleft_x, y=cursor_topleft_y, width=cursor_image_edge_length, height=cursor_image_edge_length, maintain_aspect_ratio = True)
 
-    def draw_buttons_on_frame(self, frame:np.ndarray=None):
+    def get_button_placements(self, frame_width:int = 1920, frame_height:int = 1080) -> List[Tuple[str, str, int, int, int, int]]:
+        # returns (button_name, image_name, x, y, width, height) for each button according to the current mode
+        button_images = {
+            "how_to_use": ("nasil_kullanirim_clicked", "nasil_kullanirim_unclicked", ["how_to_use_holding", "how_to_use_activated"]),
+            "pass_me": ("beni_gecir_clicked", "beni_gecir_unclicked", ["pass_me_holding", "pass_me_activated"]),
+        }
 
-        # HOW TO USE BUTTON =======================
-        how_to_use_x1 = int(self.PARAM_BUTTON_REGIONS["how_to_use"][0]*frame.shape[1])
-        how_to_use_y1 = int(self.PARAM_BUTTON_REGIONS["how_to_use"][1]*frame.shape[0])
-        how_to_use_x2 = int(self.PARAM_BUTTON_REGIONS["how_to_use"][2]*frame.shape[1])
-        how_to_use_y2 = int(self.PARAM_BUTTON_REGIONS["how_to_use"][3]*frame.shape[0])
-        how_to_use_width = how_to_use_x2 - how_to_use_x1
-        how_to_use_height = how_to_use_y2 - how_to_use_y1
+        button_placements = []
+        for button_name, (clicked_image_name, unclicked_image_name, clicked_modes) in button_images.items():
+            x1 = int(self.PARAM_BUTTON_REGIONS[button_name][0]*frame_width)
+            y1 = int(self.PARAM_BUTTON_REGIONS[button_name][1]*frame_height)
+            x2 = int(self.PARAM_BUTTON_REGIONS[button_name][2]*frame_width)
+            y2 = int(self.PARAM_BUTTON_REGIONS[button_name][3]*frame_height)
+            image_name = clicked_image_name if self.mode in clicked_modes else unclicked_image_name
+            button_placements.append((button_name, image_name, x1, y1, x2 - x1, y2 - y1))
 
-        if self.mode in ["how_to_use_holding", "how_to_use_activated"]:
-            picasso.draw_image_on_frame(frame=frame, image_name="nasil_kullanirim_clicked", x=how_to_use_x1, y=how_to_use_y1, width=how_to_use_width, height=how_to_use_height, maintain_aspect_ratio = False)
-        else:
-            picasso.draw_image_on_frame(frame=frame, image_name="nasil_kullanirim_unclicked", x=how_to_use_x1, y=how_to_use_y1, width=how_to_use_width, height=how_to_use_height, maintain_aspect_ratio = False)
-        
-        # PASS ME BUTTON =======================
-        pass_me_x1 = int(self.PARAM_BUTTON_REGIONS["pass_me"][0]*frame.shape[1])
-        pass_me_y1 = int(self.PARAM_BUTTON_REGIONS["pass_me"][1]*frame.shape[0])
-        pass_me_x2 = int(self.PARAM_BUTTON_REGIONS["pass_me"][2]*frame.shape[1])
-        pass_me_y2 = int(self.PARAM_BUTTON_REGIONS["pass_me"][3]*frame.shape[0])
-        pass_me_width = pass_me_x2 - pass_me_x1
-        pass_me_height = pass_me_y2 - pass_me_y1     
-
-        if self.mode in ["pass_me_holding", "pass_me_activated"]:
-            picasso.draw_image_on_frame(frame=frame, image_name="beni_gecir_clicked", x=pass_me_x1, y=pass_me_y1, width=pass_me_width, height=pass_me_height, maintain_aspect_ratio = False)
-        else:
-            picasso.draw_image_on_frame(frame=frame, image_name="beni_gecir_unclicked", x=pass_me_x1, y=pass_me_y1, width=pass_me_width, height=pass_me_height, maintain_aspect_ratio = False)
+        return button_placements
+
+    def draw_buttons_on_frame(self, frame:np.ndarray=None):
+        for _, image_name, x, y, width, height in self.get_button_placements(frame_width=frame.shape[1], frame_height=frame.shape[0]):
+            picasso.draw_image_on_frame(frame=frame, image_name=image_name, x=x, y=y, width=width, height=height, maintain_aspect_ratio = False)
+
+    def set_button_layers(self, overlay_compositor = None):
+        # The buttons only change when the mode changes, so they are rendered as static layers of the overlay compositor
+        for button_name, image_name, x, y, width, height in self.get_button_placements(frame_width=overlay_compositor.WIDTH, frame_height=overlay_compositor.HEIGHT):
+            overlay_compositor.set_layer(layer_name=f"{button_name}_button", image_name=image_name, x=x, y=y, width=width, height=height, maintain_aspect_ratio=False)
 
     def display_pass_me_holding_percentage(self,frame:np.ndarray=None, is_arduion_connected:bool=False, is_turnstile_on:bool=False):
 
@@ -0,0 +1,214 @@
+# Simulates the Arduino codes in arduino_codes/ on a pseudo-terminal, so that the serial code can run without an Uno or a Nano.
+# The state machine follows the .ino sketches: the 'i' handshake, the command frames of scripts/arduino_protocol.py with their acks,
+# the latched turnstile that stays activated for TURNSTILE_ON_TIME_MS after the release and the COMMUNICATION_TIMEOUT_MS.
+# The pseudo-terminal is linked to a fixed path, which can be given to ArduinoCommunicator as an extra port (PARAM_ARDUINO_EXTRA_PORTS in miru_main.py).
+# Faults for the benchmarks: unplug() / replug(), reboot(boot_time_s) and line noise (garbage bytes to the host, corrupted bytes from the host).
+# Linux and macOS only (os.openpty). Run alone to use it with miru: python3.8 testing/arduino_simulator.py
+import os, random, select, sys, threading, time, tty
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+
+import arduino_protocol
+
+PARAM_PORT_LINK_PATH = "/tmp/miru_arduino_simulator"
+
+class ArduinoSimulator:
+    def __init__(self, port_link_path:str = PARAM_PORT_LINK_PATH, baud_rate:int = 9600, turnstile_on_time_ms:int = 3500, communication_timeout_ms:int = 10000, frame_timeout_ms:int = 50, expected_response:str = "THIS_IS_ARDUINO", random_seed:int = 0):
+        self.PORT_LINK_PATH = port_link_path # the host opens this path, it points to the current pseudo-terminal
+        self.BYTE_TIME_S = 10 / baud_rate # start bit + 8 data bits + stop bit, the transfers are delayed as on the real serial line
+        self.TURNSTILE_ON_TIME_MS = turnstile_on_time_ms
+        self.COMMUNICATION_TIMEOUT_MS = communication_timeout_ms
+        self.FRAME_TIMEOUT_MS = frame_timeout_ms
+        self.EXPECTED_RESPONSE = expected_response
+
+        self.master_fd = None
+        self.slave_fd = None # kept open, so that the master does not fail while the host has the port closed
+        self.lock = threading.Lock() # the firmware state is read from the benchmark thread
+        self.random_generator = random.Random(random_seed)
+        self.thread = None
+        self.is_running = False
+
+        self.garbage_probability = 0.0 # probability of random bytes before each reply
+        self.corruption_probability = 0.0 # probability of a bit flip in each received byte
+        self.reboot_end_time = None # the simulator does not answer until then
+
+        self.received_commands = [] # (time, sequence number, command) of every frame with a valid CRC
+        self.number_of_received_bytes = 0
+        self.number_of_corrupted_frames = 0
+        self.number_of_boots = 0
+        self.__boot()
+
+    def __boot(self):
+        # The state of the sketch after a reset
+        self.boot_time = time.perf_counter()
+        self.last_time_communication_ms = 0
+        self.last_time_turnstile_activated = 0
+        self.is_turnstile_latched = False
+        self.frame = bytearray()
+        self.last_time_frame_byte_ms = 0
+        self.number_of_boots += 1
+
+    def millis(self) -> int:
+        return int(1000 * (time.perf_counter() - self.boot_time))
+
+    def start(self):
+        self.replug()
+        self.is_running = True
+        self.thread = threading.Thread(target=self.__loop, name="ArduinoSimulator", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.unplug()
+
+    def replug(self):
+        # A new pseudo-terminal appears at PORT_LINK_PATH and the Arduino boots, as when the USB cable is plugged in
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd) # no echo and no line processing, as on a real serial port
+        temporary_link_path = self.PORT_LINK_PATH + ".tmp"
+        if os.path.lexists(temporary_link_path):
+            os.remove(temporary_link_path)
+        os.symlink(os.ttyname(slave_fd), temporary_link_path)
+        os.replace(temporary_link_path, self.PORT_LINK_PATH)
+        with self.lock:
+            self.master_fd, self.slave_fd = master_fd, slave_fd
+            self.reboot_end_time = None
+            self.__boot()
+
+    def unplug(self):
+        # The pseudo-terminal is closed and its path disappears, the open port of the host fails on the next read or write
+        with self.lock:
+            master_fd, slave_fd = self.master_fd, self.slave_fd
+            self.master_fd, self.slave_fd = None, None
+        if os.path.lexists(self.PORT_LINK_PATH):
+            os.remove(self.PORT_LINK_PATH)
+        for fd in [master_fd, slave_fd]:
+            if fd is not None:
+                os.close(fd)
+
+    def reboot(self, boot_time_s:float = 0.0):
+        # The received bytes are ignored for boot_time_s, then the sketch starts over with its initial state
+        with self.lock:
+            self.reboot_end_time = time.perf_counter() + boot_time_s
+
+    def set_line_noise(self, garbage_probability:float = 0.0, corruption_probability:float = 0.0):
+        with self.lock:
+            self.garbage_probability = garbage_probability
+            self.corruption_probability = corruption_probability
+
+    def inject_garbage(self, number_of_bytes:int = 16):
+        self.__write(bytes(self.random_generator.randrange(256) for _ in range(number_of_bytes)))
+
+    def is_turnstile_activated(self) -> bool:
+        # update_turnstile() of the sketch
+        with self.lock:
+            return self.__is_turnstile_activated()
+
+    def __is_turnstile_activated(self) -> bool:
+        if (self.millis() - self.last_time_communication_ms) > self.COMMUNICATION_TIMEOUT_MS:
+            return True # If miru does not send any command from the serial, keep turnstile activated
+        return self.is_turnstile_latched or (self.millis() - self.last_time_turnstile_activated) < self.TURNSTILE_ON_TIME_MS
+
+    def get_turnstile_latch_state(self) -> bool:
+        with self.lock:
+            return self.is_turnstile_latched
+
+    def __loop(self):
+        while self.is_running:
+            master_fd = self.master_fd
+            if master_fd is None:
+                time.sleep(0.01)
+                continue
+            try:
+                readable_fds, _, _ = select.select([master_fd], [], [], 0.01)
+                data = os.read(master_fd, 256) if readable_fds else b""
+            except (OSError, ValueError): # unplugged meanwhile
+                continue
+            if self.reboot_end_time is not None:
+                if time.perf_counter() < self.reboot_end_time:
+                    continue # the bytes sent during the boot are lost
+                with self.lock:
+                    self.reboot_end_time = None
+                    self.__boot()
+            if len(data) == 0:
+                continue
+            time.sleep(len(data) * self.BYTE_TIME_S) # the bytes arrive at the baud rate
+            for byte in data:
+                if self.random_generator.random() < self.corruption_probability:
+                    byte ^= 1 << self.random_generator.randrange(8)
+                reply = self.__handle_byte(byte)
+                if reply:
+                    self.__write(reply)
+
+    def __handle_byte(self, c:int) -> bytes:
+        # read_serial() of the sketch, returns the reply to write
+        with self.lock:
+            self.number_of_received_bytes += 1
+            self.last_time_communication_ms = self.millis()
+            if len(self.frame) > 0 and (self.millis() - self.last_time_frame_byte_ms) > self.FRAME_TIMEOUT_MS:
+                self.frame.clear() # the rest of the frame is lost, start over
+            self.last_time_frame_byte_ms = self.millis()
+
+            if len(self.frame) == 0:
+                if c == arduino_protocol.FRAME_START_BYTE:
+                    self.frame.append(c)
+                elif c == ord('i'): # send a reply so that the computer knows this is the arduino port
+                    return (self.EXPECTED_RESPONSE + "\r\n").encode()
+                return b""
+            self.frame.append(c)
+            if len(self.frame) < arduino_protocol.FRAME_LENGTH:
+                return b""
+            frame = bytes(self.frame)
+            self.frame.clear()
+            if arduino_protocol.calculate_crc8(frame[:-1]) != frame[-1]:
+                self.number_of_corrupted_frames += 1
+                return b"" # corrupted frames are not acked, miru retransmits them
+            return self.__handle_frame(frame[1], frame[2])
+
+    def __handle_frame(self, sequence_number:int, command:int) -> bytes:
+        # handle_frame() of the sketch
+        self.received_commands.append((time.perf_counter(), sequence_number, command))
+        status = 0
+        if command == arduino_protocol.COMMAND_TURNSTILE_ON:
+            self.is_turnstile_latched = True
+        elif command == arduino_protocol.COMMAND_TURNSTILE_OFF:
+            if self.is_turnstile_latched:
+                self.is_turnstile_latched = False
+                self.last_time_turnstile_activated = self.millis()
+        elif command != arduino_protocol.COMMAND_PING:
+            status |= arduino_protocol.STATUS_UNKNOWN_COMMAND
+        if self.is_turnstile_latched:
+            status |= arduino_protocol.STATUS_TURNSTILE_LATCHED
+        if self.__is_turnstile_activated():
+            status |= arduino_protocol.STATUS_TURNSTILE_ACTIVATED
+        return arduino_protocol.encode_ack(sequence_number, status, self.millis())
+
+    def __write(self, data:bytes):
+        if self.random_generator.random() < self.garbage_probability:
+            data = bytes(self.random_generator.randrange(256) for _ in range(self.random_generator.randint(1, 8))) + data
+        time.sleep(len(data) * self.BYTE_TIME_S)
+        master_fd = self.master_fd
+        if master_fd is None:
+            return
+        try:
+            os.write(master_fd, data)
+        except OSError:
+            pass # unplugged meanwhile
+
+if __name__ == "__main__":
+    simulator = ArduinoSimulator()
+    simulator.start()
+    print(f"Simulated Arduino at {simulator.PORT_LINK_PATH}, add it to PARAM_ARDUINO_EXTRA_PORTS in miru_main.py. Ctrl+C to stop")
+    is_turnstile_activated = None
+    try:
+        while True:
+            if simulator.is_turnstile_activated() != is_turnstile_activated:
+                is_turnstile_activated = simulator.is_turnstile_activated()
+                print(f"{time.strftime('%H:%M:%S', time.gmtime(time.time()))} -> Turnstile is {'activated' if is_turnstile_activated else 'blocked'}")
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,133 @@
+# Compares the serial traffic of the previous per-frame turnstile protocol with the change-driven protocol of ArduinoCommunicator at different frame rates.
+# The Arduino is replaced by a fake serial port that answers the 'i' handshake, acks the command frames and records the time of every written command.
+# The main loop requests the turnstile for two periods. Reports the written bytes per second, the latency from a change of the request to the written
+# command, the time the main loop spends in the communicator per frame and the round trip times of the acks.
+# No hardware is needed. Run from any folder: python3.8 testing/benchmark_arduino_protocol.py
+import os, sys, tempfile, threading, time, types
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import arduino_communicator
+import arduino_protocol
+
+PARAM_FPS = [10, 30, 60]
+PARAM_DURATION_S = 6
+PARAM_ACTIVATION_PERIODS_S = [(1.0, 3.0), (4.0, 4.5)] # the turnstile is requested during these periods of the run
+PARAM_WRITE_DELAY_S = 0.01 # as in miru_main.py
+
+class FakeSerial:
+    # Stands in for serial.Serial. Written commands are recorded with their time, 'i' and the command frames are answered like the Arduino does
+    written_bytes = [] # (time, byte) of all instances
+    written_commands = [] # (time, command) of all instances
+
+    def __init__(self, port:str = None, baudrate:int = 9600, timeout:float = None):
+        self.timeout = timeout
+        self.response = bytearray()
+        self.frame = bytearray()
+        self.start_time = time.perf_counter()
+        self.is_open = True
+        self.lock = threading.Lock()
+        self.response_available = threading.Condition(self.lock)
+
+    def isOpen(self) -> bool:
+        return self.is_open
+
+    @property
+    def in_waiting(self) -> int:
+        with self.lock:
+            return len(self.response)
+
+    def write(self, data:bytes) -> int:
+        write_time = time.perf_counter()
+        with self.lock:
+            for byte in data:
+                FakeSerial.written_bytes.append((write_time, bytes([byte])))
+                if len(self.frame) == 0 and byte == ord("i"):
+                    self.response += b"THIS_IS_ARDUINO\r\n"
+                elif len(self.frame) > 0 or byte == arduino_protocol.FRAME_START_BYTE:
+                    self.frame.append(byte)
+                    if len(self.frame) == arduino_protocol.FRAME_LENGTH:
+                        FakeSerial.written_commands.append((write_time, self.frame[2]))
+                        uptime_ms = int(1000 * (write_time - self.start_time))
+                        self.response += arduino_protocol.encode_ack(self.frame[1], 0, uptime_ms)
+                        self.frame.clear()
+            self.response_available.notify_all()
+        return len(data)
+
+    def read(self, size:int = 1) -> bytes:
+        with self.lock:
+            if len(self.response) == 0:
+                self.response_available.wait(self.timeout)
+            data = bytes(self.response[:size])
+            del self.response[:size]
+        return data
+
+    def readline(self) -> bytes:
+        with self.lock:
+            line = bytes(self.response)
+            self.response.clear()
+        return line
+
+    def close(self):
+        self.is_open = False
+
+def is_activation_requested(elapsed_time_s:float) -> bool:
+    return any(start_time <= elapsed_time_s < end_time for start_time, end_time in PARAM_ACTIVATION_PERIODS_S)
+
+def run_legacy(fps:int) -> tuple:
+    # The previous protocol: '1' or '0' is written on every frame and the main loop sleeps WRITE_DELAY_S after each write.
+    # Returns (written bytes per second, None since the command is written inside the frame, main loop time per frame in us)
+    FakeSerial.written_bytes = []
+    serial_connection = FakeSerial()
+    communicator_s, number_of_frames, start_time = 0.0, 0, time.perf_counter()
+    while time.perf_counter() - start_time < PARAM_DURATION_S:
+        frame_start_time = time.perf_counter()
+        serial_connection.write(b"1" if is_activation_requested(frame_start_time - start_time) else b"0")
+        time.sleep(PARAM_WRITE_DELAY_S)
+        communicator_s += time.perf_counter() - frame_start_time
+        number_of_frames += 1
+        time.sleep(max(0, 1 / fps - (time.perf_counter() - frame_start_time)))
+    return len(FakeSerial.written_bytes) / PARAM_DURATION_S, None, 1e6 * communicator_s / number_of_frames
+
+def run_change_driven(fps:int, communicator:arduino_communicator.ArduinoCommunicator) -> tuple:
+    # Returns (written bytes per second, mean latency in ms, main loop time per frame in us)
+    FakeSerial.written_bytes, FakeSerial.written_commands = [], []
+    request_times = [] # time of each change of the request
+    communicator_s, number_of_frames, start_time = 0.0, 0, time.perf_counter()
+    while time.perf_counter() - start_time < PARAM_DURATION_S:
+        frame_start_time = time.perf_counter()
+        is_activated = is_activation_requested(frame_start_time - start_time)
+        if is_activated != communicator.is_turnstile_activation_requested:
+            request_times.append((frame_start_time, arduino_protocol.COMMAND_TURNSTILE_ON if is_activated else arduino_protocol.COMMAND_TURNSTILE_OFF))
+        communicator.set_turnstile_activation(is_activated=is_activated)
+        communicator_s += time.perf_counter() - frame_start_time
+        number_of_frames += 1
+        time.sleep(max(0, 1 / fps - (time.perf_counter() - frame_start_time)))
+    time.sleep(0.1) # the last command may still be in the queue
+
+    latencies_s = [min(write_time for write_time, written_command in FakeSerial.written_commands if write_time >= request_time and written_command == command) - request_time for request_time, command in request_times]
+    return len(FakeSerial.written_bytes) / PARAM_DURATION_S, 1000 * float(np.mean(latencies_s)), 1e6 * communicator_s / number_of_frames
+
+if __name__ == "__main__":
+    # Only the fake port is found by the port search
+    arduino_communicator.serial.Serial = FakeSerial
+    arduino_communicator.serial.tools.list_ports.comports = lambda: [types.SimpleNamespace(device="FAKE", vid=None, pid=None, serial_number=None)]
+    communicator = arduino_communicator.ArduinoCommunicator(baud_rate=9600, serial_timeout=1, connection_test_period_s=60, write_delay_s=PARAM_WRITE_DELAY_S, arduino_reboot_time=0, last_port_file_path=os.path.join(tempfile.gettempdir(), "benchmark_arduino_port.json"))
+    communicator.start()
+    while not communicator.get_connection_status():
+        time.sleep(0.01)
+
+    print(f"{'fps':>5}{'protocol':>15}{'bytes/s':>10}{'latency (ms)':>14}{'main loop (us/frame)':>22}")
+    for fps in PARAM_FPS:
+        for protocol_name, run in [("per-frame", lambda: run_legacy(fps)), ("change-driven", lambda: run_change_driven(fps, communicator))]:
+            bytes_per_s, latency_ms, communicator_us = run()
+            latency_text = "in frame" if latency_ms is None else f"{latency_ms:.2f}"
+            print(f"{fps:>5}{protocol_name:>15}{bytes_per_s:>10.1f}{latency_text:>14}{communicator_us:>22.1f}")
+
+    round_trip_statistics = communicator.get_round_trip_statistics()
+    print(f"\nack round trip over {round_trip_statistics['number_of_round_trips']} frames: mean {round_trip_statistics['mean_ms']:.3f} ms, p50 {round_trip_statistics['p50_ms']:.3f} ms, p95 {round_trip_statistics['p95_ms']:.3f} ms, p99 {round_trip_statistics['p99_ms']:.3f} ms, max {round_trip_statistics['max_ms']:.3f} ms")
+    print(f"retransmissions: {communicator.number_of_retransmissions}, lost frames: {communicator.number_of_lost_frames}")
+    communicator.stop()
@@ -0,0 +1,125 @@
+# Drives ArduinoCommunicator against the simulated Arduino of testing/arduino_simulator.py over a pseudo-terminal, so the whole serial path runs
+# as with the hardware: port search, handshake, frames at 9600 baud, acks and retransmissions.
+# 1) Cycles: the turnstile request is toggled PARAM_NUMBER_OF_CYCLES times, each command is preceded by a ping. Reports the latency from the request to
+#    the command applied by the simulator, the ack round trip times and the time the main loop spends in the communicator calls.
+# 2) Faults: the main loop runs at PARAM_FPS while a fault is injected. Reports how fast the fault is noticed, the reconnect time after the fault ends,
+#    the main loop stall and the retransmissions.
+# No hardware is needed, Linux or macOS. Run from any folder: python3.8 testing/benchmark_arduino_serial.py
+import os, sys, tempfile, time
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+sys.path.append(os.path.join(project_directory, 'testing'))
+os.chdir(project_directory)
+
+import arduino_communicator
+import arduino_protocol
+import arduino_simulator
+
+PARAM_NUMBER_OF_CYCLES = 2000
+PARAM_COMMAND_TIMEOUT_S = 2 # a cycle fails if the simulator does not apply the command in this time
+PARAM_FPS = 30
+PARAM_FAULT_START_S = 2 # the fault is injected this long after the start of its run
+PARAM_FAULT_RUN_DURATION_S = 12 # the fault, the reconnect after about arduino_reboot_time and some margin
+PARAM_REQUEST_TOGGLE_PERIOD_S = 1.0 # the main loop toggles the turnstile request with this period during the faults
+PARAM_FAULTS = { # name: (fault duration in s, function that starts the fault, function that ends it)
+    "unplug": (2.0, lambda simulator: simulator.unplug(), lambda simulator: simulator.replug()),
+    "garbage": (5.0, lambda simulator: simulator.set_line_noise(garbage_probability=0.2, corruption_probability=0.01), lambda simulator: simulator.set_line_noise()),
+    "slow reboot": (4.0, lambda simulator: simulator.reboot(boot_time_s=4.0), lambda simulator: None),
+}
+# as in miru_main.py, except that the connection is tested before every command
+PARAM_COMMUNICATOR_SETTINGS = {"baud_rate": 9600, "serial_timeout": 1, "connection_test_period_s": 0, "write_delay_s": 0.01, "arduino_reboot_time": 3}
+
+def percentiles_text(values_ms:list) -> str:
+    if len(values_ms) == 0:
+        return "-"
+    return f"p50 {np.percentile(values_ms, 50):.3f}, p99 {np.percentile(values_ms, 99):.3f}, max {np.max(values_ms):.3f}"
+
+def wait_for_connection(communicator:arduino_communicator.ArduinoCommunicator, timeout_s:float) -> float:
+    # Returns the time it took to connect, None if it did not
+    start_time = time.perf_counter()
+    while communicator.get_connection_state() != "CONNECTED":
+        if time.perf_counter() - start_time > timeout_s:
+            return None
+        time.sleep(0.001)
+    return time.perf_counter() - start_time
+
+def run_cycles(communicator:arduino_communicator.ArduinoCommunicator, simulator:arduino_simulator.ArduinoSimulator):
+    latencies_ms, stalls_ms, number_of_failed_cycles = [], [], 0
+    for cycle_index in range(PARAM_NUMBER_OF_CYCLES):
+        is_activated = cycle_index % 2 == 0
+        request_time = time.perf_counter()
+        communicator.set_turnstile_activation(is_activated=is_activated)
+        communicator.get_connection_status()
+        stalls_ms.append(1000 * (time.perf_counter() - request_time))
+        while simulator.get_turnstile_latch_state() != is_activated and time.perf_counter() - request_time < PARAM_COMMAND_TIMEOUT_S:
+            time.sleep(0.0002)
+        if simulator.get_turnstile_latch_state() != is_activated:
+            number_of_failed_cycles += 1
+            continue
+        command = arduino_protocol.COMMAND_TURNSTILE_ON if is_activated else arduino_protocol.COMMAND_TURNSTILE_OFF
+        applied_time = min(receive_time for receive_time, _, received_command in simulator.received_commands[-8:] if receive_time >= request_time and received_command == command)
+        latencies_ms.append(1000 * (applied_time - request_time))
+
+    round_trip_statistics = communicator.get_round_trip_statistics()
+    statistics = communicator.get_statistics()
+    print(f"{PARAM_NUMBER_OF_CYCLES} cycles, {number_of_failed_cycles} failed, {round_trip_statistics['number_of_round_trips']} frames in the round trip window")
+    print(f"  request -> applied by the Arduino (ms): {percentiles_text(latencies_ms)}")
+    print(f"  ack round trip (ms):                    p50 {round_trip_statistics['p50_ms']:.3f}, p99 {round_trip_statistics['p99_ms']:.3f}, max {round_trip_statistics['max_ms']:.3f}")
+    print(f"  main loop in the communicator (ms):     {percentiles_text(stalls_ms)}")
+    print(f"  retransmissions: {statistics['number_of_retransmissions']}, lost frames: {statistics['number_of_lost_frames']}")
+
+def run_fault(communicator:arduino_communicator.ArduinoCommunicator, simulator:arduino_simulator.ArduinoSimulator, fault_name:str):
+    fault_duration_s, start_fault, end_fault = PARAM_FAULTS[fault_name]
+    statistics_before = communicator.get_statistics()
+    stalls_ms, fault_start_time, fault_end_time, disconnect_time, reconnect_time = [], None, None, None, None
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < PARAM_FAULT_RUN_DURATION_S:
+        frame_start_time = time.perf_counter()
+        elapsed_time_s = frame_start_time - start_time
+        if fault_start_time is None and elapsed_time_s >= PARAM_FAULT_START_S:
+            start_fault(simulator)
+            fault_start_time = time.perf_counter()
+        if fault_start_time is not None and fault_end_time is None and time.perf_counter() - fault_start_time >= fault_duration_s:
+            end_fault(simulator)
+            fault_end_time = time.perf_counter()
+
+        # what the main loop of miru does on each frame
+        communicator.set_turnstile_activation(is_activated=int(elapsed_time_s / PARAM_REQUEST_TOGGLE_PERIOD_S) % 2 == 0)
+        is_connected = communicator.get_connection_status()
+        stalls_ms.append(1000 * (time.perf_counter() - frame_start_time))
+
+        if fault_start_time is not None and disconnect_time is None and not is_connected:
+            disconnect_time = time.perf_counter()
+        if disconnect_time is not None and reconnect_time is None and is_connected:
+            reconnect_time = time.perf_counter()
+        time.sleep(max(0, 1 / PARAM_FPS - (time.perf_counter() - frame_start_time)))
+
+    statistics = communicator.get_statistics()
+    print(f"{fault_name} for {fault_duration_s:.1f} s")
+    if disconnect_time is None:
+        print("  the connection is kept")
+    else:
+        print(f"  disconnect noticed {disconnect_time - fault_start_time:.2f} s after the fault started")
+        print(f"  reconnected {reconnect_time - fault_end_time:.2f} s after the fault ended" if reconnect_time is not None else "  not reconnected")
+    print(f"  main loop in the communicator (ms): {percentiles_text(stalls_ms)}")
+    print(f"  retransmissions: {statistics['number_of_retransmissions'] - statistics_before['number_of_retransmissions']}, lost frames: {statistics['number_of_lost_frames'] - statistics_before['number_of_lost_frames']}, Arduino reboots noticed: {statistics['number_of_arduino_reboots'] - statistics_before['number_of_arduino_reboots']}")
+
+if __name__ == "__main__":
+    port_link_path = os.path.join(tempfile.gettempdir(), "benchmark_arduino_simulator")
+    simulator = arduino_simulator.ArduinoSimulator(port_link_path=port_link_path)
+    simulator.start()
+    communicator = arduino_communicator.ArduinoCommunicator(**PARAM_COMMUNICATOR_SETTINGS, extra_ports=[port_link_path], last_port_file_path=os.path.join(tempfile.gettempdir(), "benchmark_arduino_port.json"))
+    communicator.start()
+    connection_time_s = wait_for_connection(communicator, timeout_s=30)
+    if connection_time_s is None:
+        print("The simulated Arduino is not found")
+    else:
+        print(f"connected to {communicator.arduino_port} in {connection_time_s:.2f} s (includes arduino_reboot_time = {PARAM_COMMUNICATOR_SETTINGS['arduino_reboot_time']} s)\n")
+        run_cycles(communicator, simulator)
+        for fault_name in PARAM_FAULTS:
+            print("")
+            run_fault(communicator, simulator, fault_name)
+    communicator.stop()
+    simulator.stop()
@@ -0,0 +1,73 @@
+# Replays synthetic equipment confidence sequences of people in front of the turnstile through the rule decision methods of the FaceStore.
+# Compliant people wear a hairnet and goggles, borderline ones wear them but are detected weakly, non-compliant ones miss one of them and only get
+# occasional false detections. Reports the median time until a compliant person is allowed to pass and the rate of non-compliant people allowed to pass.
+# No model is needed. Run from any folder: python3.8 testing/benchmark_decision_engine.py
+import os, sys
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import face_tracker_memory
+
+PARAM_DECISION_METHODS = ["WINDOW_MEAN", "SPRT"]
+PARAM_NUMBER_OF_PEOPLE = 2000 # per group
+PARAM_NUMBER_OF_DETECTIONS = 45 # equipment detections while a person stands in front of the turnstile
+PARAM_FPS = 30
+PARAM_POSE_DETECTION_EVERY_N_FRAMES = 2 # the equipment detector runs together with the pose detector
+# (probability of a detection of worn equipment, confidence range of the detections) of each group, non-compliant people get false detections instead
+PARAM_GROUPS = {
+    "compliant": (0.90, (0.50, 0.95)),
+    "borderline": (0.60, (0.25, 0.60)),
+}
+PARAM_FALSE_DETECTION_PROBABILITY = 0.05
+PARAM_FALSE_DETECTION_CONFIDENCE_RANGE = (0.25, 0.60)
+
+def create_confidences(group_name:str, random_generator:np.random.Generator) -> np.ndarray:
+    # Returns (detections, people, classes) confidences of a group
+    class_names = face_tracker_memory.FaceStore.EQUIPMENT_CLASS_NAMES
+    shape = (PARAM_NUMBER_OF_DETECTIONS, PARAM_NUMBER_OF_PEOPLE, len(class_names))
+    is_worn = np.zeros(shape[1:], dtype=bool)
+    is_worn[:, [class_names.index("hair_net"), class_names.index("safety_goggles")]] = True
+    if group_name == "non_compliant": # everyone misses the hairnet, the goggles or both
+        missing_equipment = random_generator.integers(0, 3, size=PARAM_NUMBER_OF_PEOPLE)
+        is_worn[missing_equipment != 1, class_names.index("hair_net")] = False
+        is_worn[missing_equipment != 0, class_names.index("safety_goggles")] = False
+        detection_probability, confidence_range = PARAM_GROUPS["compliant"]
+    else:
+        detection_probability, confidence_range = PARAM_GROUPS[group_name]
+    is_mask_worn = random_generator.random(PARAM_NUMBER_OF_PEOPLE) < 0.5
+    is_worn[is_mask_worn, class_names.index("blue_surgical_mask")] = True
+
+    is_detected = np.where(is_worn[None], random_generator.random(shape) < detection_probability, random_generator.random(shape) < PARAM_FALSE_DETECTION_PROBABILITY)
+    detected_confidences = np.where(is_worn[None], random_generator.uniform(*confidence_range, size=shape), random_generator.uniform(*PARAM_FALSE_DETECTION_CONFIDENCE_RANGE, size=shape))
+    return np.where(is_detected, detected_confidences, 0.0)
+
+def replay(confidences:np.ndarray, decision_method:str) -> np.ndarray:
+    # Returns the (people,) number of detections until each person is allowed to pass, -1 if never
+    face_store = face_tracker_memory.FaceStore(capacity=confidences.shape[1], sample_size=5, decision_method=decision_method)
+    store_slots = face_store.allocate_slots(confidences.shape[1])
+    detections_to_decision = np.full(confidences.shape[1], -1)
+    for detection_index, detection_confidences in enumerate(confidences):
+        face_store.append_detection_confidences(store_slots, detection_confidences)
+        face_store.update_obeyed_rules(store_slots)
+        is_newly_allowed = face_store.is_allowed_to_pass(store_slots) & (detections_to_decision < 0)
+        detections_to_decision[is_newly_allowed] = detection_index + 1
+    return detections_to_decision
+
+if __name__ == "__main__":
+    random_generator = np.random.default_rng(0)
+    ms_per_detection = 1000 * PARAM_POSE_DETECTION_EVERY_N_FRAMES / PARAM_FPS
+    group_confidences = {group_name: create_confidences(group_name, random_generator) for group_name in ["compliant", "borderline", "non_compliant"]}
+    print(f"{'method':>12}{'group':>15}{'median detections':>19}{'median ms':>11}{'p95 ms':>9}{'never passed':>14}{'false accept':>14}")
+    for decision_method in PARAM_DECISION_METHODS:
+        for group_name, confidences in group_confidences.items():
+            detections_to_decision = replay(confidences, decision_method)
+            is_passed = detections_to_decision > 0
+            if group_name == "non_compliant":
+                print(f"{decision_method:>12}{group_name:>15}{'-':>19}{'-':>11}{'-':>9}{'-':>14}{np.mean(is_passed):>13.2%}")
+                continue
+            median_detections = np.median(detections_to_decision[is_passed]) if np.any(is_passed) else np.nan
+            p95_detections = np.percentile(detections_to_decision[is_passed], 95) if np.any(is_passed) else np.nan
+            print(f"{decision_method:>12}{group_name:>15}{median_detections:>19.1f}{median_detections * ms_per_detection:>11.0f}{p95_detections * ms_per_detection:>9.0f}{np.mean(~is_passed):>13.2%}{'-':>14}")
@@ -0,0 +1,110 @@
+# Compares the equipment to face association of FaceTrackerManager with the previous per-face loop, for crowds of 1 to 200 faces.
+# The vectorized association is timed with the full containment matrix and with the grid index. All three must give the same confidences.
+# No model is needed. Run from any folder: python3.8 testing/benchmark_equipment_association.py
+import os, sys, time
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import detections, face_tracker_memory
+
+PARAM_FRAME_SIZE = (1920, 1080) # a large frame, so that big crowds fit
+PARAM_NUMBER_OF_FACES = [1, 5, 20, 50, 100, 200]
+PARAM_NUMBER_OF_REPEATS = 200
+PARAM_CLUTTER_BOXES_PER_FACE = 2 # equipment boxes that belong to no face
+PARAM_EQUIPMENT_CLASS_NAMES = {0: "white_net", 1: "blue_net", 2: "safety_goggles", 3: "blue_surgical_mask", 4: "white_surgical_mask"}
+
+def create_scene(number_of_faces:int, random_generator:np.random.Generator) -> tuple:
+    # Returns (face_bboxes (F,5), equipment detections): every face wears a hairnet, goggles and often a mask or a beard net
+    sizes = random_generator.uniform(30, 80, size=number_of_faces)
+    centers = random_generator.uniform([40, 40], [PARAM_FRAME_SIZE[0] - 40, PARAM_FRAME_SIZE[1] - 40], size=(number_of_faces, 2))
+    face_bboxes = np.empty((number_of_faces, 5), dtype=np.int64)
+    face_bboxes[:, 0:2] = centers - sizes[:, None] / 2
+    face_bboxes[:, 2:4] = centers + sizes[:, None] / 2
+    face_bboxes[:, 4] = np.arange(number_of_faces)
+
+    # (relative center y, relative height, class id) of the equipments on a face of size 1 centered at 0
+    equipment_templates = [(-0.35, 0.25, 0), (-0.10, 0.15, 2), (0.25, 0.25, 3), (0.30, 0.30, 1)]
+    boxes, classes = [], []
+    for relative_center_y, relative_height, class_id in equipment_templates:
+        is_worn = random_generator.random(number_of_faces) < 0.8
+        equipment_centers = centers[is_worn] + np.stack([np.zeros(np.sum(is_worn)), relative_center_y * sizes[is_worn]], axis=1)
+        half_sizes = np.stack([0.35 * sizes[is_worn], relative_height / 2 * sizes[is_worn]], axis=1)
+        boxes.append(np.concatenate([equipment_centers - half_sizes, equipment_centers + half_sizes], axis=1))
+        classes.append(np.full(np.sum(is_worn), class_id))
+    clutter_centers = random_generator.uniform([0, 0], PARAM_FRAME_SIZE, size=(number_of_faces * PARAM_CLUTTER_BOXES_PER_FACE, 2))
+    boxes.append(np.concatenate([clutter_centers - 10, clutter_centers + 10], axis=1))
+    classes.append(random_generator.integers(0, len(PARAM_EQUIPMENT_CLASS_NAMES), size=len(clutter_centers)))
+
+    boxes, classes = np.concatenate(boxes), np.concatenate(classes)
+    equipment_detections = detections.Detections(detector_type="EquipmentDetector", frame_shape=(PARAM_FRAME_SIZE[1], PARAM_FRAME_SIZE[0]), class_names=PARAM_EQUIPMENT_CLASS_NAMES, boxes=boxes, conf=random_generator.uniform(0.3, 1.0, size=len(boxes)), cls=classes)
+    return face_bboxes, equipment_detections
+
+def calculate_overlap(bbox1, bbox2) -> float:
+    # Returns how much percentage of bbox2 inside bbox1, the previous FaceTrackerManager.__calculate_overlap
+    x1 = max(bbox1[0], bbox2[0])
+    y1 = max(bbox1[1], bbox2[1])
+    x2 = min(bbox1[2], bbox2[2])
+    y2 = min(bbox1[3], bbox2[3])
+    intersection_area = max(0, x2 - x1 + 1) * max(0, y2 - y1 + 1)
+    bbox2_area = (bbox2[2] - bbox2[0] + 1) * (bbox2[3] - bbox2[1] + 1)
+    return intersection_area / bbox2_area
+
+def transform_class_name(face_bbox, equipment_class:str, equipment_bbox) -> str:
+    # The previous Face.transform_class_name
+    if equipment_class in ["white_surgical_mask", "blue_surgical_mask", "safety_goggles"]:
+        return equipment_class
+    center_of_face = (face_bbox[0] + face_bbox[2])//2, (face_bbox[1] + face_bbox[3])//2
+    center_of_net = (equipment_bbox[0] + equipment_bbox[2])//2, (equipment_bbox[1] + equipment_bbox[3])//2
+    return "hair_net" if center_of_face[1] > center_of_net[1] else "beard_net"
+
+def legacy_associate(face_bboxes:list, equipment_detections:detections.Detections, overlap_threshold:float = 0.5) -> list:
+    # The previous per-face loop over the formatted predictions list, returns the detected equipment dict of each face
+    equipment_predictions = equipment_detections.to_formatted_predictions_list()
+    detected_equipments_of_faces = []
+    for face_bbox in face_bboxes:
+        detected_equipments = {"hair_net":0, "beard_net":0, "safety_goggles":0, "blue_surgical_mask":0, "white_surgical_mask":0}
+        for equipment_class, equipment_confidence, equipment_bbox in equipment_predictions:
+            if calculate_overlap(face_bbox, equipment_bbox) > overlap_threshold:
+                transformed_class_name = transform_class_name(face_bbox, equipment_class, equipment_bbox)
+                detected_equipments[transformed_class_name] = max(equipment_confidence, detected_equipments[transformed_class_name])
+        detected_equipments_of_faces.append(detected_equipments)
+    return detected_equipments_of_faces
+
+def measure_us(function, number_of_repeats:int) -> float:
+    function() # warm-up
+    start_time = time.perf_counter()
+    for _ in range(number_of_repeats):
+        function()
+    return 1e6 * (time.perf_counter() - start_time) / number_of_repeats
+
+def get_newest_samples(face_tracker_manager:face_tracker_memory.FaceTrackerManager) -> np.ndarray:
+    # (faces, classes) confidences appended by the last association
+    face_store = face_tracker_manager.face_store
+    store_slots = np.array([face.store_slot for face in face_tracker_manager.face_objects])
+    return face_store.confidence_samples[store_slots, :, (face_store.sample_positions[store_slots] - 1) % face_store.SAMPLE_SIZE]
+
+if __name__ == "__main__":
+    random_generator = np.random.default_rng(0)
+    print(f"{'faces':>6}{'equipments':>12}{'legacy (us)':>14}{'matrix (us)':>13}{'grid (us)':>11}{'speed-up':>10}{'same confidences':>18}")
+    for number_of_faces in PARAM_NUMBER_OF_FACES:
+        face_bboxes, equipment_detections = create_scene(number_of_faces, random_generator)
+        face_tracker_manager = face_tracker_memory.FaceTrackerManager()
+        face_tracker_manager.update_face_bboxes(face_bboxes, detection_time=0)
+        tracked_face_bboxes = [face.get_face_bbox()[:4] for face in face_tracker_manager.face_objects]
+
+        legacy_us = measure_us(lambda: legacy_associate(tracked_face_bboxes, equipment_detections), PARAM_NUMBER_OF_REPEATS)
+        legacy_confidences = np.array([[detected_equipments[class_name] for class_name in face_tracker_memory.FaceStore.EQUIPMENT_CLASS_NAMES] for detected_equipments in legacy_associate(tracked_face_bboxes, equipment_detections)])
+
+        face_tracker_manager.EQUIPMENT_GRID_MIN_PAIRS = np.inf # always the full matrix
+        matrix_us = measure_us(lambda: face_tracker_manager.update_face_equipments_detection_confidences_and_obeyed_rules(equipment_detections), PARAM_NUMBER_OF_REPEATS)
+        matrix_confidences = get_newest_samples(face_tracker_manager)
+
+        face_tracker_manager.EQUIPMENT_GRID_MIN_PAIRS = 0 # always the grid index
+        grid_us = measure_us(lambda: face_tracker_manager.update_face_equipments_detection_confidences_and_obeyed_rules(equipment_detections), PARAM_NUMBER_OF_REPEATS)
+        grid_confidences = get_newest_samples(face_tracker_manager)
+
+        is_same = np.allclose(legacy_confidences, matrix_confidences, atol=1e-6) and np.allclose(legacy_confidences, grid_confidences, atol=1e-6)
+        print(f"{number_of_faces:>6}{len(equipment_detections):>12}{legacy_us:>14.1f}{matrix_us:>13.1f}{grid_us:>11.1f}{legacy_us / min(matrix_us, grid_us):>9.1f}x{str(is_same):>18}")
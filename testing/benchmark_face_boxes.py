@@ -0,0 +1,97 @@
+# Compares the vectorized face box extraction of PoseDetector with the previous per-person loop on synthetic crowds.
+# No model is needed. Run from any folder: python3.8 testing/benchmark_face_boxes.py
+import os, sys, time, copy
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import detections, pose_detector
+
+PARAM_FRAME_SIZE = (640, 360)
+PARAM_NUMBER_OF_PERSONS = [1, 5, 10, 20, 50, 100]
+PARAM_NUMBER_OF_REPEATS = 2000
+PARAM_KEYPOINT_CONFIDENCE_THRESHOLD = 0.80
+PARAM_MISSING_EYE_RATIO = 0.3 # ratio of persons with one eye hidden, they only get a face box with the fallbacks
+
+def create_crowd(number_of_persons:int, random_generator:np.random.Generator) -> detections.Detections:
+    face_centers = random_generator.uniform([40, 40], [PARAM_FRAME_SIZE[0] - 40, PARAM_FRAME_SIZE[1] - 40], size=(number_of_persons, 2)).astype(np.float32)
+    eye_distances = random_generator.uniform(6, 20, size=number_of_persons).astype(np.float32)
+
+    keypoints = np.zeros((number_of_persons, len(detections.KEYPOINT_NAMES), 3), dtype=np.float32)
+    keypoints[:, :, 2] = random_generator.uniform(0.85, 1.0, size=(number_of_persons, len(detections.KEYPOINT_NAMES)))
+    keypoints[:, :, :2] = face_centers[:, None, :]
+    keypoints[:, detections.KEYPOINT_INDICES["left_eye"], 0] += eye_distances / 2
+    keypoints[:, detections.KEYPOINT_INDICES["right_eye"], 0] -= eye_distances / 2
+    keypoints[:, detections.KEYPOINT_INDICES["left_ear"], 0] += eye_distances * 2
+    keypoints[:, detections.KEYPOINT_INDICES["right_ear"], 0] -= eye_distances * 2
+
+    hidden_eye_indices = np.where(random_generator.random(number_of_persons) < 0.5, detections.KEYPOINT_INDICES["left_eye"], detections.KEYPOINT_INDICES["right_eye"])
+    has_hidden_eye = random_generator.random(number_of_persons) < PARAM_MISSING_EYE_RATIO
+    keypoints[np.flatnonzero(has_hidden_eye), hidden_eye_indices[has_hidden_eye]] = 0 # not detected: x=y=0 and low confidence
+
+    boxes = np.concatenate([face_centers - 40, face_centers + 40], axis=1)
+    return detections.Detections(detector_type="PoseDetector", frame_shape=(PARAM_FRAME_SIZE[1], PARAM_FRAME_SIZE[0]), class_names={0: "person"}, boxes=boxes, conf=np.ones(number_of_persons), cls=np.zeros(number_of_persons), keypoints=keypoints)
+
+def legacy_return_face_bboxes_list(frame, predictions, keypoint_confidence_threshold):
+    # The previous PoseDetector.return_face_bboxes_list, working on the prediction dicts
+    extracted_face_coordinates = []
+    facial_keypoints = ["left_eye", "right_eye", "nose", "left_ear", "right_ear"]
+    for detection in predictions:
+        if detection["class_name"] != "person":
+            continue
+        detected_keypoints = {"left_eye": False, "right_eye": False, "nose": False, "left_ear": False, "right_ear": False}
+        for keypoint_name in facial_keypoints:
+            keypoint = detection["keypoints"][keypoint_name]
+            if keypoint[2] > keypoint_confidence_threshold:
+                detected_keypoints[keypoint_name] = True
+        if detected_keypoints["left_eye"] and detected_keypoints["right_eye"]:
+            frame_height, frame_width, _ = frame.shape
+            left_eye_center = (detection["keypoints"]["left_eye"][0], detection["keypoints"]["left_eye"][1])
+            right_eye_center = (detection["keypoints"]["right_eye"][0], detection["keypoints"]["right_eye"][1])
+            distance_between_eyes = abs(left_eye_center[0] - right_eye_center[0])
+            face_center_x = (left_eye_center[0] + right_eye_center[0]) // 2
+            face_center_y = (left_eye_center[1] + right_eye_center[1]) // 2
+            box_width = int(4.0 * distance_between_eyes)
+            box_height = int(4.0 * distance_between_eyes)
+            face_bbox_x1 = int(max(0, face_center_x - box_width // 2))
+            face_bbox_y1 = int(max(0, face_center_y - box_height // 2))
+            face_bbox_x2 = int(min(frame_width - 1, face_center_x + box_width // 2))
+            face_bbox_y2 = int(min(frame_height - 1, face_center_y + box_height // 2))
+            extracted_face_coordinates.append(copy.deepcopy((face_bbox_x1, face_bbox_y1, face_bbox_x2, face_bbox_y2, detection["detection_id"])))
+    return extracted_face_coordinates
+
+def measure_us(function, number_of_repeats:int) -> float:
+    function() # warm-up
+    start_time = time.perf_counter()
+    for _ in range(number_of_repeats):
+        function()
+    return 1e6 * (time.perf_counter() - start_time) / number_of_repeats
+
+if __name__ == "__main__":
+    # Only the attributes used by return_face_bboxes_list are set, so no model is loaded
+    pose_detector_object = object.__new__(pose_detector.PoseDetector)
+    pose_detector_object.PERSON_CLASS_ID = 0
+    pose_detector_object.FACE_BOX_EYE_DISTANCE_MULTIPLIER = 4.0
+    pose_detector_object.NOSE_TO_EYE_DISTANCE_RATIO = 0.5
+    pose_detector_object.EAR_TO_EYE_DISTANCE_RATIO = 1.5
+
+    random_generator = np.random.default_rng(0)
+    frame = np.zeros((PARAM_FRAME_SIZE[1], PARAM_FRAME_SIZE[0], 3), dtype=np.uint8)
+
+    print(f"{'persons':>8}{'legacy (us)':>14}{'vectorized (us)':>17}{'+fallbacks (us)':>17}{'speed-up':>10}{'faces':>8}{'+fallbacks':>12}{'same boxes':>12}")
+    for number_of_persons in PARAM_NUMBER_OF_PERSONS:
+        crowd = create_crowd(number_of_persons, random_generator)
+        prediction_dicts = crowd.to_prediction_dicts() # the legacy input format, not included in the timing
+
+        legacy_us = measure_us(lambda: legacy_return_face_bboxes_list(frame, prediction_dicts, PARAM_KEYPOINT_CONFIDENCE_THRESHOLD), PARAM_NUMBER_OF_REPEATS)
+        vectorized_us = measure_us(lambda: pose_detector_object.return_face_bboxes_list(frame=frame, predictions=crowd, keypoint_confidence_threshold=PARAM_KEYPOINT_CONFIDENCE_THRESHOLD), PARAM_NUMBER_OF_REPEATS)
+        fallbacks_us = measure_us(lambda: pose_detector_object.return_face_bboxes_list(frame=frame, predictions=crowd, keypoint_confidence_threshold=PARAM_KEYPOINT_CONFIDENCE_THRESHOLD, use_keypoint_fallbacks=True), PARAM_NUMBER_OF_REPEATS)
+
+        legacy_face_bboxes = np.array(legacy_return_face_bboxes_list(frame, prediction_dicts, PARAM_KEYPOINT_CONFIDENCE_THRESHOLD), dtype=np.int64).reshape(-1, 5)
+        face_bboxes = pose_detector_object.return_face_bboxes_list(frame=frame, predictions=crowd, keypoint_confidence_threshold=PARAM_KEYPOINT_CONFIDENCE_THRESHOLD)
+        fallback_face_bboxes = pose_detector_object.return_face_bboxes_list(frame=frame, predictions=crowd, keypoint_confidence_threshold=PARAM_KEYPOINT_CONFIDENCE_THRESHOLD, use_keypoint_fallbacks=True)
+        is_same = np.array_equal(legacy_face_bboxes, face_bboxes)
+
+        print(f"{number_of_persons:>8}{legacy_us:>14.1f}{vectorized_us:>17.1f}{fallbacks_us:>17.1f}{legacy_us / vectorized_us:>9.1f}x{len(face_bboxes):>8}{len(fallback_face_bboxes):>12}{str(is_same):>12}")
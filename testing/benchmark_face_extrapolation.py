@@ -0,0 +1,73 @@
+# Measures how well the face boxes follow moving faces when the pose detector only runs on every Nth frame.
+# Faces move around a synthetic scene, the detections are noisy. On the frames without a detection the boxes are either held (previous behaviour)
+# or extrapolated by the motion model of FaceTrackerManager. The error is the distance of the box center to the true face center on every displayed frame.
+# The tracks column counts the track ids given to the PARAM_NUMBER_OF_FACES faces. With the default overlap threshold they only stay stable up to N=2,
+# from N=3 on the faces that move fastest fall out of the gate and get new tracks. No model is needed. Run from any folder: python3.8 testing/benchmark_face_extrapolation.py
+import os, sys, time
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import face_tracker_memory
+
+PARAM_FRAME_SIZE = (640, 360)
+PARAM_FPS = 30
+PARAM_DETECTION_EVERY_N_FRAMES = [1, 2, 3, 4, 6]
+PARAM_NUMBER_OF_FACES = 5
+PARAM_NUMBER_OF_FRAMES = 600
+PARAM_FACE_SIZE_RANGE = (30, 60)
+PARAM_MAX_SPEED_PX_S = 150 # walking speed in the model input frame
+PARAM_ACCELERATION_PX_S2 = 150 # standard deviation of the random acceleration of the faces
+PARAM_DETECTION_NOISE_PX = 2.0
+
+def create_trajectories(random_generator:np.random.Generator) -> tuple:
+    # Returns the (frames, faces, 2) true face centers and (faces,) face sizes. The faces accelerate randomly and are steered back towards the frame center
+    sizes = random_generator.uniform(*PARAM_FACE_SIZE_RANGE, size=PARAM_NUMBER_OF_FACES)
+    centers = random_generator.uniform([60, 60], [PARAM_FRAME_SIZE[0] - 60, PARAM_FRAME_SIZE[1] - 60], size=(PARAM_NUMBER_OF_FACES, 2))
+    velocities = np.zeros((PARAM_NUMBER_OF_FACES, 2))
+    frame_center = np.array(PARAM_FRAME_SIZE) / 2
+    trajectories = np.empty((PARAM_NUMBER_OF_FRAMES, PARAM_NUMBER_OF_FACES, 2))
+    for frame_index in range(PARAM_NUMBER_OF_FRAMES):
+        accelerations = random_generator.normal(0, PARAM_ACCELERATION_PX_S2, size=velocities.shape) - 0.5 * (centers - frame_center)
+        velocities += accelerations / PARAM_FPS
+        speeds = np.linalg.norm(velocities, axis=1, keepdims=True)
+        velocities *= np.minimum(1, PARAM_MAX_SPEED_PX_S / np.maximum(speeds, 1e-9))
+        centers += velocities / PARAM_FPS
+        trajectories[frame_index] = centers
+    return trajectories, sizes
+
+def run(trajectories:np.ndarray, sizes:np.ndarray, detection_every_n_frames:int, is_extrapolated:bool, random_generator:np.random.Generator) -> tuple:
+    # Returns (mean center error in px, 95th percentile center error in px, mean tracker time per frame in us, number of tracks)
+    manager = face_tracker_memory.FaceTrackerManager(face_age_limit_s=1.0)
+    errors, tracker_s = [], 0.0
+    for frame_index, true_centers in enumerate(trajectories):
+        frame_time = frame_index / PARAM_FPS
+        start_time = time.perf_counter()
+        if frame_index % detection_every_n_frames == 0:
+            detected_centers = true_centers + random_generator.normal(0, PARAM_DETECTION_NOISE_PX, size=true_centers.shape)
+            face_bboxes = np.empty((PARAM_NUMBER_OF_FACES, 5), dtype=np.int64)
+            face_bboxes[:, 0:2] = np.rint(detected_centers - sizes[:, None] / 2)
+            face_bboxes[:, 2:4] = np.rint(detected_centers + sizes[:, None] / 2)
+            face_bboxes[:, 4] = np.arange(PARAM_NUMBER_OF_FACES) + frame_index * PARAM_NUMBER_OF_FACES
+            track_ids = manager.update_face_bboxes(face_bboxes, detection_time=frame_time)
+            face_index_of_track = {track_id: face_index for face_index, track_id in enumerate(track_ids.tolist())}
+        elif is_extrapolated:
+            manager.extrapolate_face_bboxes(current_time=frame_time)
+        tracker_s += time.perf_counter() - start_time
+
+        for face in manager.face_objects:
+            if face.track_id in face_index_of_track:
+                face_bbox = face.get_face_bbox()
+                box_center = np.array([(face_bbox[0] + face_bbox[2]) / 2, (face_bbox[1] + face_bbox[3]) / 2])
+                errors.append(np.linalg.norm(box_center - true_centers[face_index_of_track[face.track_id]]))
+    return float(np.mean(errors)), float(np.percentile(errors, 95)), 1e6 * tracker_s / len(trajectories), manager.next_track_id
+
+if __name__ == "__main__":
+    trajectories, sizes = create_trajectories(np.random.default_rng(0))
+    print(f"{'every N':>8}{'held err (px)':>15}{'held p95':>10}{'extrapolated err (px)':>23}{'extrap. p95':>13}{'tracker (us/frame)':>20}{'tracks':>8}")
+    for detection_every_n_frames in PARAM_DETECTION_EVERY_N_FRAMES:
+        held_error, held_p95, _, _ = run(trajectories, sizes, detection_every_n_frames, False, np.random.default_rng(1))
+        extrapolated_error, extrapolated_p95, tracker_us, number_of_tracks = run(trajectories, sizes, detection_every_n_frames, True, np.random.default_rng(1))
+        print(f"{detection_every_n_frames:>8}{held_error:>15.2f}{held_p95:>10.2f}{extrapolated_error:>23.2f}{extrapolated_p95:>13.2f}{tracker_us:>20.1f}{number_of_tracks:>8}")
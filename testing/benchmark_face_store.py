@@ -0,0 +1,75 @@
+# Compares the equipment confidence windows and rule updates of the FaceStore with the previous per-face lists and dicts for 1 to 100 faces.
+# The face store also keeps the SPRT evidence of every face, which the previous code did not have. No model is needed. Run from any folder: python3.8 testing/benchmark_face_store.py
+import os, sys, time
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import face_tracker_memory
+
+PARAM_NUMBER_OF_FACES = [1, 5, 10, 20, 50, 100]
+PARAM_NUMBER_OF_FRAMES = 300
+PARAM_SAMPLE_SIZE = 5
+PARAM_DETECTION_RATIO = 0.4 # ratio of the face and equipment class pairs with a detection in a frame
+
+class LegacyFace:
+    # The equipment state of the previous Face: a list per class updated with pop(0) and append, the means and the rules are recomputed on every update
+    def __init__(self, sample_size:int = 5):
+        self.SAMPLE_SIZE = sample_size
+        self.EQUIPMENT_CONFIDENCE_THRESHOLDS = {"hair_net":[0.10,0.35], "beard_net":[0.10,0.35], "safety_goggles":[0.10,0.35], "blue_surgical_mask":[0.25,0.50], "white_surgical_mask":[0.25,0.50]}
+        self.obeyed_rules = {"is_hairnet_worn": False, "is_safety_google_worn": False, "is_beard_present": False, "is_beardnet_worn": False, "is_surgical_mask_worn": False}
+        self.equipment_detection_confidence_samples = {class_name: [0]*self.SAMPLE_SIZE for class_name in self.EQUIPMENT_CONFIDENCE_THRESHOLDS}
+
+    def append_detection_confidences(self, update_dict:dict):
+        for detection_class, confidence in update_dict.items():
+            self.equipment_detection_confidence_samples[detection_class].pop(0)
+            self.equipment_detection_confidence_samples[detection_class].append(confidence)
+
+    def update_obeyed_rules(self):
+        self.obeyed_rules = {"is_hairnet_worn": False, "is_safety_google_worn": False, "is_beard_present": False, "is_beardnet_worn": False, "is_surgical_mask_worn": False}
+        means = {class_name: sum(samples) / len(samples) for class_name, samples in self.equipment_detection_confidence_samples.items()}
+        for rule_name, class_name in [("is_hairnet_worn", "hair_net"), ("is_safety_google_worn", "safety_goggles"), ("is_beardnet_worn", "beard_net")]:
+            if self.obeyed_rules[rule_name] and means[class_name] < self.EQUIPMENT_CONFIDENCE_THRESHOLDS[class_name][0]:
+                self.obeyed_rules[rule_name] = False
+            elif not self.obeyed_rules[rule_name] and means[class_name] > self.EQUIPMENT_CONFIDENCE_THRESHOLDS[class_name][1]:
+                self.obeyed_rules[rule_name] = True
+        if self.obeyed_rules["is_surgical_mask_worn"] and (means["blue_surgical_mask"] < 0.25 and means["white_surgical_mask"] < 0.25):
+            self.obeyed_rules["is_surgical_mask_worn"] = False
+        elif not self.obeyed_rules["is_surgical_mask_worn"] and (means["blue_surgical_mask"] > 0.50 or means["white_surgical_mask"] > 0.50):
+            self.obeyed_rules["is_surgical_mask_worn"] = True
+
+    def is_allowed_to_pass(self) -> bool:
+        return self.obeyed_rules["is_hairnet_worn"] and self.obeyed_rules["is_safety_google_worn"]
+
+if __name__ == "__main__":
+    random_generator = np.random.default_rng(0)
+    class_names = face_tracker_memory.FaceStore.EQUIPMENT_CLASS_NAMES
+    print(f"{'faces':>6}{'legacy (us/frame)':>19}{'face store (us/frame)':>23}{'speed-up':>10}{'legacy allowed':>16}{'store allowed':>15}")
+    for number_of_faces in PARAM_NUMBER_OF_FACES:
+        # Most faces wear their equipment, the detections come and go
+        is_worn = random_generator.random((number_of_faces, len(class_names))) < 0.7
+        confidences = np.where(is_worn[None] & (random_generator.random((PARAM_NUMBER_OF_FRAMES, number_of_faces, len(class_names))) < 1 - PARAM_DETECTION_RATIO / 2), random_generator.uniform(0.3, 0.95, size=(PARAM_NUMBER_OF_FRAMES, number_of_faces, len(class_names))), 0.0)
+        confidence_dicts = [[dict(zip(class_names, face_confidences)) for face_confidences in frame_confidences.tolist()] for frame_confidences in confidences] # the legacy input format, not included in the timing
+
+        legacy_faces = [LegacyFace(sample_size=PARAM_SAMPLE_SIZE) for _ in range(number_of_faces)]
+        start_time = time.perf_counter()
+        for frame_confidence_dicts in confidence_dicts:
+            for face, confidence_dict in zip(legacy_faces, frame_confidence_dicts):
+                face.append_detection_confidences(confidence_dict)
+                face.update_obeyed_rules()
+        legacy_us = 1e6 * (time.perf_counter() - start_time) / PARAM_NUMBER_OF_FRAMES
+
+        face_store = face_tracker_memory.FaceStore(capacity=16, sample_size=PARAM_SAMPLE_SIZE)
+        store_slots = face_store.allocate_slots(number_of_faces)
+        start_time = time.perf_counter()
+        for frame_confidences in confidences:
+            face_store.append_detection_confidences(store_slots, frame_confidences)
+            face_store.update_obeyed_rules(store_slots)
+        store_us = 1e6 * (time.perf_counter() - start_time) / PARAM_NUMBER_OF_FRAMES
+
+        # The previous rules were reset before every evaluation, so their lower thresholds had no effect and fewer faces pass
+        legacy_allowed = sum(face.is_allowed_to_pass() for face in legacy_faces)
+        store_allowed = int(np.sum(face_store.is_allowed_to_pass(store_slots)))
+        print(f"{number_of_faces:>6}{legacy_us:>19.1f}{store_us:>23.1f}{legacy_us / store_us:>9.1f}x{legacy_allowed:>16}{store_allowed:>15}")
@@ -0,0 +1,101 @@
+# Compares the assignment-based FaceTrackerManager.update_face_bboxes with the previous greedy double loop for 1 to 100 faces.
+# Faces move a little between the frames, some leave and some enter. The assignment times include the Kalman motion model (predict and update),
+# which the legacy loop does not have, it costs about 150 us per detection at any number of faces. Run from any folder: python3.8 testing/benchmark_face_tracker.py
+import os, sys, time
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import face_tracker_memory
+
+PARAM_FRAME_SIZE = (640, 360)
+PARAM_NUMBER_OF_FACES = [1, 5, 10, 20, 50, 100]
+PARAM_NUMBER_OF_FRAMES = 100
+PARAM_FACE_SIZE_RANGE = (12, 40)
+PARAM_MAX_STEP_PX = 4 # movement of a face between two frames
+PARAM_REPLACEMENT_RATIO = 0.05 # ratio of faces that leave and are replaced by a new face every frame
+PARAM_FPS = 30 # the frames are timestamped with this rate, the tracker ages the faces by time
+PARAM_LEGACY_AGE_LIMIT = 3 # frames, the previous Face.AGE_LIMIT
+
+def calculate_overlap(bbox1, bbox2) -> float:
+    # Returns how much percentage of bbox2 inside bbox1, the previous FaceTrackerManager.__calculate_overlap
+    x1 = max(bbox1[0], bbox2[0])
+    y1 = max(bbox1[1], bbox2[1])
+    x2 = min(bbox1[2], bbox2[2])
+    y2 = min(bbox1[3], bbox2[3])
+    intersection_area = max(0, x2 - x1 + 1) * max(0, y2 - y1 + 1)
+    bbox2_area = (bbox2[2] - bbox2[0] + 1) * (bbox2[3] - bbox2[1] + 1)
+    return intersection_area / bbox2_area
+
+def legacy_update_face_bboxes(face_tracker_manager, face_ages, face_bboxes) -> int:
+    # The previous FaceTrackerManager.update_face_bboxes with the ages counted in calls, returns how many faces were updated by more than one detection
+    face_bboxes = [tuple(face_bbox) for face_bbox in face_bboxes.tolist()]
+    matched_face_bboxes = []
+    update_counts = {}
+    for face_bbox in face_bboxes:
+        best_match = None
+        max_overlap = 0
+        for face in face_tracker_manager.face_objects:
+            overlap = calculate_overlap(face.get_face_bbox(), face_bbox)
+            if overlap > max_overlap:
+                best_match = face
+                max_overlap = overlap
+        if max_overlap > face_tracker_manager.FACE_UPDATE_OVERLAP_THRESHOLD:
+            best_match.update_face_bbox(face_bbox)
+            face_ages[id(best_match)] = 0
+            matched_face_bboxes.append(face_bbox)
+            update_counts[id(best_match)] = update_counts.get(id(best_match), 0) + 1
+    for face_bbox in face_bboxes:
+        if face_bbox not in matched_face_bboxes:
+            face_tracker_manager.face_objects.append(face_tracker_memory.Face(face_bbox=face_bbox))
+    faces_to_delete = []
+    for face in face_tracker_manager.face_objects:
+        face_ages[id(face)] = face_ages.get(id(face), 0) + 1
+        if face_ages[id(face)] > PARAM_LEGACY_AGE_LIMIT:
+            faces_to_delete.append(face)
+    for face in faces_to_delete:
+        face_tracker_manager.face_objects.remove(face)
+        del face_ages[id(face)]
+    return sum(1 for update_count in update_counts.values() if update_count > 1)
+
+def create_sequence(number_of_faces:int, random_generator:np.random.Generator) -> list:
+    # Returns a list of (N,5) face bbox arrays, one per frame
+    sizes = random_generator.uniform(*PARAM_FACE_SIZE_RANGE, size=number_of_faces)
+    centers = random_generator.uniform([0, 0], PARAM_FRAME_SIZE, size=(number_of_faces, 2))
+    sequence = []
+    next_detection_id = 0
+    for _ in range(PARAM_NUMBER_OF_FRAMES):
+        centers = np.clip(centers + random_generator.uniform(-PARAM_MAX_STEP_PX, PARAM_MAX_STEP_PX, size=centers.shape), 0, PARAM_FRAME_SIZE)
+        is_replaced = random_generator.random(number_of_faces) < PARAM_REPLACEMENT_RATIO
+        centers[is_replaced] = random_generator.uniform([0, 0], PARAM_FRAME_SIZE, size=(int(np.sum(is_replaced)), 2))
+
+        face_bboxes = np.empty((number_of_faces, 5), dtype=np.int64)
+        face_bboxes[:, 0:2] = centers - sizes[:, None] / 2
+        face_bboxes[:, 2:4] = centers + sizes[:, None] / 2
+        face_bboxes[:, 4] = np.arange(next_detection_id, next_detection_id + number_of_faces)
+        next_detection_id += number_of_faces
+        sequence.append(face_bboxes)
+    return sequence
+
+if __name__ == "__main__":
+    random_generator = np.random.default_rng(0)
+    print(f"{'faces':>6}{'legacy (us)':>14}{'assignment (us)':>17}{'speed-up':>10}{'legacy double matches':>23}{'legacy tracks':>15}{'tracks':>8}")
+    for number_of_faces in PARAM_NUMBER_OF_FACES:
+        sequence = create_sequence(number_of_faces, random_generator)
+
+        legacy_manager, legacy_face_ages = face_tracker_memory.FaceTrackerManager(), {}
+        number_of_double_matches = 0
+        start_time = time.perf_counter()
+        for face_bboxes in sequence:
+            number_of_double_matches += legacy_update_face_bboxes(legacy_manager, legacy_face_ages, face_bboxes)
+        legacy_us = 1e6 * (time.perf_counter() - start_time) / len(sequence)
+
+        manager = face_tracker_memory.FaceTrackerManager(face_age_limit_s=PARAM_LEGACY_AGE_LIMIT / PARAM_FPS)
+        start_time = time.perf_counter()
+        for frame_index, face_bboxes in enumerate(sequence):
+            manager.update_face_bboxes(face_bboxes, detection_time=frame_index / PARAM_FPS)
+        assignment_us = 1e6 * (time.perf_counter() - start_time) / len(sequence)
+
+        print(f"{number_of_faces:>6}{legacy_us:>14.1f}{assignment_us:>17.1f}{legacy_us / assignment_us:>9.1f}x{number_of_double_matches:>23}{legacy_manager.get_number_of_active_faces():>15}{manager.get_number_of_active_faces():>8}")
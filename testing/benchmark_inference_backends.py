@@ -0,0 +1,67 @@
+# Compares the latency of the PyTorch (ultralytics) and ONNX Runtime backends of the detectors on CPU and checks that both give the same predictions.
+# The ONNX models are exported from the .pt files on the first run. Run from any folder: python3.8 testing/benchmark_inference_backends.py
+import os, sys, time
+import cv2
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory) # model paths are relative to the project folder
+
+import pose_detector, equipment_detector, inference_backends
+
+PARAM_IMAGE_PROCESS_SIZE = (640, 360)
+PARAM_BACKENDS = ["pytorch", "onnxruntime"] # add "openvino" if onnxruntime-openvino is installed
+PARAM_INTRA_OP_THREADS = 2 # per ONNX Runtime session, and the process-wide PyTorch pool
+PARAM_NUMBER_OF_REPEATS = 50
+PARAM_BBOX_CONFIDENCE = 0.35
+
+def measure_ms(function, number_of_repeats:int) -> float:
+    for _ in range(3): # warm-up
+        function()
+    start_time = time.perf_counter()
+    for _ in range(number_of_repeats):
+        function()
+    return 1000 * (time.perf_counter() - start_time) / number_of_repeats
+
+def max_box_difference(reference_boxes:list, boxes:list) -> float:
+    # Boxes are matched in order, both backends sort the detections by confidence
+    if len(reference_boxes) != len(boxes):
+        return float("inf")
+    if len(boxes) == 0:
+        return 0.0
+    return float(np.max(np.abs(np.array(reference_boxes, dtype=np.float32) - np.array(boxes, dtype=np.float32))))
+
+if __name__ == "__main__":
+    if "pytorch" in PARAM_BACKENDS:
+        inference_backends.set_pytorch_thread_count(PARAM_INTRA_OP_THREADS)
+
+    frame = cv2.resize(cv2.imread("testing/test_image.png"), PARAM_IMAGE_PROCESS_SIZE)
+
+    results = {} # backend -> (pose_ms, equipment_ms, pose_boxes, equipment_boxes, pose_keys, equipment_keys)
+    for backend in PARAM_BACKENDS:
+        pose_detector_object = pose_detector.PoseDetector(model_name="yolov8n", inference_backend=backend, intra_op_threads=PARAM_INTRA_OP_THREADS)
+        equipment_detector_object = equipment_detector.EquipmentDetector(model_name="miru_model_03_08_2024", inference_backend=backend, intra_op_threads=PARAM_INTRA_OP_THREADS)
+
+        pose_ms = measure_ms(lambda: pose_detector_object.predict_frame_and_return_detections(frame, bbox_confidence=PARAM_BBOX_CONFIDENCE), PARAM_NUMBER_OF_REPEATS)
+        equipment_ms = measure_ms(lambda: equipment_detector_object.predict_frame(frame, bbox_confidence=PARAM_BBOX_CONFIDENCE), PARAM_NUMBER_OF_REPEATS)
+
+        pose_predictions = pose_detector_object.predict_frame_and_return_detections(frame, bbox_confidence=PARAM_BBOX_CONFIDENCE).to_prediction_dicts()
+        equipment_detector_object.predict_frame(frame, bbox_confidence=PARAM_BBOX_CONFIDENCE)
+        equipment_predictions = equipment_detector_object.recent_prediction_results.to_prediction_dicts()
+        results[backend] = (
+            pose_ms,
+            equipment_ms,
+            [prediction["bbox_xyxy_px"] for prediction in pose_predictions],
+            [prediction["bbox_xyxy_px"] for prediction in equipment_predictions],
+            [sorted(prediction.keys()) for prediction in pose_predictions],
+            [sorted(prediction.keys()) for prediction in equipment_predictions],
+        )
+
+    reference_backend = PARAM_BACKENDS[0]
+    print(f"{'backend':<14}{'pose (ms)':>12}{'equipment (ms)':>16}{'pose dets':>11}{'equipment dets':>16}{'max box diff (px)':>19}{'same keys':>11}")
+    for backend in PARAM_BACKENDS:
+        pose_ms, equipment_ms, pose_boxes, equipment_boxes, pose_keys, equipment_keys = results[backend]
+        box_difference = max(max_box_difference(results[reference_backend][2], pose_boxes), max_box_difference(results[reference_backend][3], equipment_boxes))
+        same_keys = pose_keys == results[reference_backend][4] and equipment_keys == results[reference_backend][5]
+        print(f"{backend:<14}{pose_ms:>12.2f}{equipment_ms:>16.2f}{len(pose_boxes):>11}{len(equipment_boxes):>16}{box_difference:>19.2f}{str(same_keys):>11}")
@@ -0,0 +1,76 @@
+# Compares the premultiplied-alpha blending kernel of picasso with the previous float blending implementation.
+# Run from any folder: python3.8 testing/benchmark_picasso.py
+import os, sys, time
+import cv2
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory) # image paths in picasso are relative to the project folder
+
+import picasso
+
+PARAM_FRAME_SIZE = (1920, 1080)
+PARAM_NUMBER_OF_REPEATS = {"icon": 500, "button": 200, "full_screen": 20}
+PARAM_CASES = [ # (case_name, image_name, width, height, size_category)
+    ("equipment icon 100x100", "green_hairnet", 100, 100, "icon"),
+    ("wrist cursor 58x58", "wrist_mouse_icon_transparent", 58, 58, "icon"),
+    ("button 384x324", "beni_gecir_unclicked", 384, 324, "button"),
+    ("full screen with alpha", "camera_connection_error_page", 1920, 1080, "full_screen"),
+    ("full screen opaque", "miru_how_to_use_page", 1920, 1080, "full_screen"),
+]
+
+def legacy_draw_image_on_frame(frame:np.ndarray=None, image:np.ndarray=None, x:int=None, y:int=None):
+    # The blending part of the previous picasso.draw_image_on_frame, the image is already decoded and resized
+    frame_height, frame_width = frame.shape[0], frame.shape[1]
+    resized_image_height, resized_image_width = image.shape[0], image.shape[1]
+
+    roi_x1 = x
+    roi_x2 = min(max(x + resized_image_width, 0), frame_width)
+    roi_y1 = y
+    roi_y2 = min(max(y + resized_image_height, 0), frame_height)
+
+    if roi_x1<0 or roi_y1<0 or (roi_x2 - roi_x1 <= 0) or (roi_y2 - roi_y1 <= 0):
+        return
+
+    frame_roi = frame[roi_y1:roi_y2, roi_x1:roi_x2]
+    image_roi = image[0:(roi_y2-roi_y1), 0:(roi_x2-roi_x1)]
+
+    if image.shape[2]==4:
+        b, g, r, a = cv2.split(image_roi)
+        image_alpha = a / 255.0
+        for c in range(0, 3):
+            frame_roi[:, :, c] = (frame_roi[:, :, c] * (1 - image_alpha) + image_roi[:, :, c] * image_alpha).astype(np.uint8)
+    else:
+        frame[roi_y1:roi_y2, roi_x1:roi_x2] = image_roi
+
+def measure_ms(function, number_of_repeats:int) -> float:
+    function() # warm-up
+    start_time = time.perf_counter()
+    for _ in range(number_of_repeats):
+        function()
+    return 1000 * (time.perf_counter() - start_time) / number_of_repeats
+
+if __name__ == "__main__":
+    picasso.preload_images()
+    random_generator = np.random.default_rng(0)
+    camera_frame = random_generator.integers(0, 256, size=(PARAM_FRAME_SIZE[1], PARAM_FRAME_SIZE[0], 3), dtype=np.uint8)
+
+    print(f"{'case':<28}{'legacy (ms)':>14}{'kernel (ms)':>14}{'speed-up':>10}{'max abs diff':>14}")
+    for case_name, image_name, width, height, size_category in PARAM_CASES:
+        sprite = picasso.SPRITE_CACHE.get_sprite(image_name=image_name, width=width, height=height, maintain_aspect_ratio=False)
+        number_of_repeats = PARAM_NUMBER_OF_REPEATS[size_category]
+
+        legacy_frame = camera_frame.copy()
+        kernel_frame = camera_frame.copy()
+        legacy_ms = measure_ms(lambda: legacy_draw_image_on_frame(frame=legacy_frame, image=sprite.image, x=0, y=0), number_of_repeats)
+        kernel_ms = measure_ms(lambda: picasso.draw_sprite_on_frame(frame=kernel_frame, sprite=sprite, x=0, y=0), number_of_repeats)
+
+        # Compare a single blend on the same input, the float implementation truncates while the kernel rounds
+        legacy_frame = camera_frame.copy()
+        kernel_frame = camera_frame.copy()
+        legacy_draw_image_on_frame(frame=legacy_frame, image=sprite.image, x=0, y=0)
+        picasso.draw_sprite_on_frame(frame=kernel_frame, sprite=sprite, x=0, y=0)
+        max_abs_diff = int(np.max(np.abs(legacy_frame.astype(np.int16) - kernel_frame.astype(np.int16))))
+
+        print(f"{case_name:<28}{legacy_ms:>14.3f}{kernel_ms:>14.3f}{legacy_ms / kernel_ms:>9.1f}x{max_abs_diff:>14}")
@@ -0,0 +1,84 @@
+# Measures how much equipment detector work the per-track verdict cache of FaceTrackerManager saves while a queue of people waits in front of the turnstile.
+# The equipment detector is simulated as in the "FACE_CROPS" mode of miru_main.py: it only runs on the crops of the faces whose verdict is stale.
+# Everyone is compliant and stands still with a small jitter. Halfway through, the first person takes off the hairnet, and the second one steps
+# towards the camera, which invalidates their cached verdict. Reports the face crops per second, how often the verdicts differ from checking every face
+# on every detection, and how long the pass of the first person stays valid after the hairnet is taken off.
+# No model is needed. Run from any folder: python3.8 testing/benchmark_verdict_cache.py
+import os, sys, time
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory)
+
+import detections, face_tracker_memory
+
+PARAM_NUMBER_OF_PEOPLE = [1, 3, 6]
+PARAM_DURATION_S = 20
+PARAM_FPS = 30
+PARAM_POSE_DETECTION_EVERY_N_FRAMES = 2
+PARAM_VERIFICATION_INTERVALS_S = [0, 0.5] # 0 checks every face on every detection
+PARAM_FACE_SIZE = 60
+PARAM_DETECTION_PROBABILITY = 0.9
+PARAM_EQUIPMENT_CLASS_NAMES = {0: "white_net", 1: "blue_net", 2: "safety_goggles", 3: "blue_surgical_mask", 4: "white_surgical_mask"}
+
+def create_equipment_detections(face_bboxes:np.ndarray, is_hairnet_worn:np.ndarray, random_generator:np.random.Generator) -> detections.Detections:
+    # A hairnet above the face center and goggles below it on each of the (F,4) faces, each detected with PARAM_DETECTION_PROBABILITY
+    boxes, confidences, class_ids = [], [], []
+    for face_bbox, is_hairnet in zip(face_bboxes.tolist(), is_hairnet_worn.tolist()):
+        x1, y1, x2, y2 = face_bbox
+        height = y2 - y1
+        for class_id, equipment_bbox, is_worn in [(0, [x1 + 5, y1, x2 - 5, y1 + height // 4], is_hairnet), (2, [x1 + 5, y1 + height // 3, x2 - 5, y1 + height // 2], True)]:
+            if is_worn and random_generator.random() < PARAM_DETECTION_PROBABILITY:
+                boxes.append(equipment_bbox)
+                confidences.append(random_generator.uniform(0.5, 0.95))
+                class_ids.append(class_id)
+    return detections.Detections(detector_type="EquipmentDetector", frame_shape=(360, 640), class_names=PARAM_EQUIPMENT_CLASS_NAMES, boxes=np.array(boxes, dtype=np.float64).reshape(-1, 4), conf=np.array(confidences), cls=np.array(class_ids, dtype=np.int64))
+
+def run(number_of_people:int, verification_interval_s:float) -> tuple:
+    # Returns (face crops per second, verdicts per detection and person, time of the last pass of person 0 after taking off the hairnet, manager time per detection in us)
+    manager = face_tracker_memory.FaceTrackerManager(equipment_verification_interval_s=verification_interval_s)
+    jitter_random_generator, equipment_random_generator = np.random.default_rng(0), np.random.default_rng(1) # the same face boxes in every run
+    centers = np.stack([np.linspace(100, 540, number_of_people + 2)[1:-1], np.full(number_of_people, 180.0)], axis=1)
+    sizes = np.full(number_of_people, float(PARAM_FACE_SIZE))
+    is_hairnet_worn = np.ones(number_of_people, dtype=bool)
+    hairnet_removal_time, last_pass_time = PARAM_DURATION_S / 2, PARAM_DURATION_S / 2
+    number_of_crops, verdicts, manager_s = 0, [], 0.0
+    for frame_index in range(0, PARAM_DURATION_S * PARAM_FPS, PARAM_POSE_DETECTION_EVERY_N_FRAMES):
+        frame_time = frame_index / PARAM_FPS
+        if frame_time >= hairnet_removal_time:
+            is_hairnet_worn[0] = False
+            if number_of_people > 1:
+                sizes[1] = PARAM_FACE_SIZE * 1.6 # steps towards the camera
+        detected_centers = centers + jitter_random_generator.normal(0, 1.0, size=centers.shape)
+        face_bboxes = np.empty((number_of_people, 5), dtype=np.int64)
+        face_bboxes[:, 0:2] = np.rint(detected_centers - sizes[:, None] / 2)
+        face_bboxes[:, 2:4] = np.rint(detected_centers + sizes[:, None] / 2)
+        face_bboxes[:, 4] = np.arange(number_of_people)
+
+        start_time = time.perf_counter()
+        track_ids = manager.update_face_bboxes(face_bboxes, detection_time=frame_time)
+        is_face_check_due = np.isin(track_ids, manager.get_track_ids_due_for_equipment_check(current_time=frame_time))
+        manager_s += time.perf_counter() - start_time
+        if np.any(is_face_check_due):
+            number_of_crops += int(np.sum(is_face_check_due))
+            equipment_detections = create_equipment_detections(face_bboxes[is_face_check_due, :4], is_hairnet_worn[is_face_check_due], equipment_random_generator)
+            start_time = time.perf_counter()
+            manager.update_face_equipments_detection_confidences_and_obeyed_rules(equipment_detections, track_ids=track_ids[is_face_check_due], detection_time=frame_time)
+            manager_s += time.perf_counter() - start_time
+
+        face_of_track = {face.track_id: face for face in manager.face_objects}
+        frame_verdicts = [face_of_track[track_id].is_allowed_to_pass() for track_id in track_ids.tolist()]
+        verdicts.append(frame_verdicts)
+        if frame_verdicts[0] and frame_time >= hairnet_removal_time:
+            last_pass_time = frame_time
+    number_of_detections = len(verdicts)
+    return number_of_crops / PARAM_DURATION_S, np.array(verdicts), last_pass_time - hairnet_removal_time, 1e6 * manager_s / number_of_detections
+
+if __name__ == "__main__":
+    print(f"{'people':>7}{'interval (s)':>14}{'crops/s':>9}{'crop saving':>13}{'verdict agreement':>19}{'revoke delay (ms)':>19}{'manager (us/det.)':>19}")
+    for number_of_people in PARAM_NUMBER_OF_PEOPLE:
+        results = {verification_interval_s: run(number_of_people, verification_interval_s) for verification_interval_s in PARAM_VERIFICATION_INTERVALS_S}
+        reference_crops_per_s, reference_verdicts, _, _ = results[0]
+        for verification_interval_s, (crops_per_s, verdicts, revoke_delay_s, manager_us) in results.items():
+            print(f"{number_of_people:>7}{verification_interval_s:>14.1f}{crops_per_s:>9.1f}{1 - crops_per_s / reference_crops_per_s:>12.0%}{np.mean(verdicts == reference_verdicts):>18.1%}{1000 * revoke_delay_s:>19.0f}{manager_us:>19.1f}")
@@ -0,0 +1,102 @@
+# Checks that the SPRT rule decisions of the FaceStore keep the configured false accept rate.
+# The rates are measured on seeded synthetic detections, so the results are deterministic. Run with pytest or from any folder: python3.8 testing/test_decision_engine.py
+import os, sys
+import numpy as np
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+sys.path.append(os.path.join(project_directory, 'testing'))
+
+import face_tracker_memory
+import benchmark_decision_engine
+
+PARAM_NUMBER_OF_FACES = 20000
+PARAM_NUMBER_OF_DETECTIONS = benchmark_decision_engine.PARAM_NUMBER_OF_DETECTIONS # while a person stands in front of the turnstile
+
+def test_default_decision_method_is_window_mean():
+    # SPRT stays opt-in until its bin probabilities are fitted from labelled detections
+    assert face_tracker_memory.FaceStore().DECISION_METHOD == "WINDOW_MEAN"
+    assert face_tracker_memory.FaceTrackerManager().face_store.DECISION_METHOD == "WINDOW_MEAN"
+
+def test_sprt_false_accept_rate_of_each_rule():
+    # Samples are drawn from the "not worn" bin probabilities the SPRT assumes. A single class rule may turn on for at most FALSE_ACCEPT_RATE of the faces
+    random_generator = np.random.default_rng(0)
+    face_store = face_tracker_memory.FaceStore(capacity=PARAM_NUMBER_OF_FACES, decision_method="SPRT")
+    slots = face_store.allocate_slots(PARAM_NUMBER_OF_FACES)
+    not_worn_bin_probabilities = np.array([face_store.EQUIPMENT_SAMPLE_BIN_PROBABILITIES[class_name][1] for class_name in face_store.EQUIPMENT_CLASS_NAMES])
+    bin_confidences = np.stack([np.zeros(len(face_store.EQUIPMENT_CLASS_NAMES)), (face_store.LOWER_THRESHOLDS + face_store.UPPER_THRESHOLDS) / 2, np.minimum(face_store.UPPER_THRESHOLDS + 0.2, 1)], axis=1) # (classes, bins)
+    cumulative_bin_probabilities = np.cumsum(not_worn_bin_probabilities, axis=1)
+
+    is_ever_obeyed = np.zeros((PARAM_NUMBER_OF_FACES, len(face_store.RULE_NAMES)), dtype=bool)
+    for _ in range(PARAM_NUMBER_OF_DETECTIONS):
+        random_values = random_generator.random((PARAM_NUMBER_OF_FACES, len(face_store.EQUIPMENT_CLASS_NAMES)))
+        sample_bins = np.sum(random_values[:, :, None] > cumulative_bin_probabilities[None, :, :-1], axis=2)
+        face_store.append_detection_confidences(slots, bin_confidences[np.arange(len(face_store.EQUIPMENT_CLASS_NAMES)), sample_bins])
+        face_store.update_obeyed_rules(slots)
+        is_ever_obeyed |= face_store.is_rule_obeyed[slots]
+
+    false_accept_rates = np.mean(is_ever_obeyed[:, face_store.SINGLE_CLASS_RULE_INDICES], axis=0)
+    assert np.all(false_accept_rates <= face_store.FALSE_ACCEPT_RATE), false_accept_rates
+
+def test_sprt_false_accept_rate_of_non_compliant_people():
+    # The non-compliant people of benchmark_decision_engine.py miss the hairnet, the goggles or both. At most FALSE_ACCEPT_RATE of them may be allowed to pass
+    confidences = benchmark_decision_engine.create_confidences("non_compliant", np.random.default_rng(0))
+    detections_to_decision = benchmark_decision_engine.replay(confidences, "SPRT")
+    false_accept_rate = np.mean(detections_to_decision > 0)
+    assert false_accept_rate <= face_tracker_memory.FaceStore().FALSE_ACCEPT_RATE, false_accept_rate
+
+def test_scalar_updates_match_vectorized_updates():
+    # A few faces are updated one by one with Python floats, the states have to be the same as with the vectorized updates
+    number_of_classes = len(face_tracker_memory.FaceStore.EQUIPMENT_CLASS_NAMES)
+    for decision_method in ["WINDOW_MEAN", "SPRT"]:
+        random_generator = np.random.default_rng(0)
+        scalar_face_store = face_tracker_memory.FaceStore(decision_method=decision_method, scalar_update_max_faces=1000)
+        vectorized_face_store = face_tracker_memory.FaceStore(decision_method=decision_method, scalar_update_max_faces=0)
+        slots = scalar_face_store.allocate_slots(6)
+        vectorized_face_store.allocate_slots(6)
+        for detection_index in range(200):
+            checked_slots = slots[random_generator.random(len(slots)) < 0.7]
+            if detection_index % 2 == 0:
+                confidences = random_generator.random((len(checked_slots), number_of_classes)) * (random_generator.random((len(checked_slots), number_of_classes)) < 0.6)
+                for face_store in [scalar_face_store, vectorized_face_store]:
+                    face_store.append_detection_confidences(checked_slots, confidences)
+            else:
+                number_of_pairs = int(random_generator.integers(0, 3 * len(checked_slots) + 1))
+                pair_rows = random_generator.integers(0, max(len(checked_slots), 1), number_of_pairs)
+                pair_class_indices = random_generator.integers(0, number_of_classes, number_of_pairs)
+                pair_confidences = random_generator.random(number_of_pairs)
+                for face_store in [scalar_face_store, vectorized_face_store]:
+                    face_store.append_detection_confidence_pairs(checked_slots, pair_rows, pair_class_indices, pair_confidences)
+            for face_store in [scalar_face_store, vectorized_face_store]:
+                face_store.update_obeyed_rules(checked_slots)
+            for array_name in ["confidence_samples", "confidence_sums", "sample_positions", "log_likelihood_ratios", "is_equipment_decided", "is_rule_obeyed"]:
+                assert np.array_equal(getattr(scalar_face_store, array_name), getattr(vectorized_face_store, array_name)), (decision_method, detection_index, array_name)
+
+def replay_pass_time(verification_interval_s:float) -> float:
+    # A compliant person with a new track: hair net and goggles at 0.8, the first 2 of the detections at 15/s miss them.
+    # The equipment is only checked when the face store says so, returns the time of the pass
+    face_store = face_tracker_memory.FaceStore(verification_interval_s=verification_interval_s)
+    slots = face_store.allocate_slots(1)
+    face_bboxes = np.array([[100, 100, 160, 160]])
+    worn_confidences = np.zeros((1, len(face_store.EQUIPMENT_CLASS_NAMES)))
+    worn_confidences[0, face_store.REQUIRED_CLASS_INDICES] = 0.8
+    for detection_index in range(150):
+        detection_time = detection_index / 15
+        if face_store.is_verification_due(slots, face_bboxes, detection_time)[0]:
+            face_store.append_detection_confidences(slots, worn_confidences * (detection_index >= 2))
+            face_store.update_obeyed_rules(slots)
+            face_store.schedule_verifications(slots, face_bboxes, detection_time)
+        if face_store.is_allowed_to_pass(slots)[0]:
+            return detection_time
+    return None
+
+def test_missed_first_detections_do_not_delay_the_pass():
+    # The zeros of a window that is not full yet must not confirm a reject, the cache would then delay the pass by its back-off
+    pass_time_without_cache = replay_pass_time(verification_interval_s=0)
+    assert pass_time_without_cache is not None
+    assert replay_pass_time(verification_interval_s=0.5) == pass_time_without_cache
+
+if __name__ == "__main__":
+    for test_function in [test_default_decision_method_is_window_mean, test_sprt_false_accept_rate_of_each_rule, test_sprt_false_accept_rate_of_non_compliant_people, test_scalar_updates_match_vectorized_updates, test_missed_first_detections_do_not_delay_the_pass]:
+        test_function()
+        print(f"{test_function.__name__}: passed")
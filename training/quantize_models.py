@@ -0,0 +1,214 @@
+# Produces INT8 variants of the detector models with ONNX Runtime static quantization and publishes them only if they do not regress.
+# Calibration frames are any folder of saved camera frames, e.g. the output of split_frames_with_persons_from_video.py.
+# The optional evaluation labels are YOLO label files (class x_center y_center width height, normalized) with the same names as the frames.
+# If no labels are given, the confident predictions of the FP32 model are used as the reference.
+# The evaluation frames have to be a different folder than the calibration frames, otherwise the gate would only check the frames the model was calibrated on.
+# Run from any folder: python3.8 training/quantize_models.py
+from typing import List, Dict, Tuple #for python3.8 compatibility
+import os, sys, time, shutil, glob
+import cv2
+import numpy as np
+import onnx
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+project_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_directory, 'scripts'))
+os.chdir(project_directory) # model paths are relative to the project folder
+
+import inference_backends, pose_detector, equipment_detector
+
+PARAM_IMAGE_PROCESS_SIZE = (640, 360) # same as miru_main.py, the frames are resized to this size before they are given to the models
+PARAM_MAX_CALIBRATION_FRAMES = 300
+PARAM_MAX_EVALUATION_FRAMES = 500
+PARAM_MAX_LATENCY_FRAMES = 100 # evaluation frames used to measure the latency
+PARAM_MAP_CONFIDENCE_THRESHOLD = 0.001 # low threshold of the backends the mAP is computed with, the latency is measured with the runtime threshold
+PARAM_REFERENCE_CONFIDENCE = 0.5 # FP32 predictions above this confidence are the reference if no labels are given
+PARAM_MAX_MAP50_DROP = 0.02 # the INT8 model is not published if its mAP@0.5 is lower than the FP32 one by more than this
+PARAM_MAX_KEYPOINT_ERROR = 0.02 # mean keypoint distance to the FP32 keypoints, in terms of the person box diagonal
+PARAM_MIN_SPEEDUP = 1.1 # the INT8 model should be at least this much faster than the FP32 one to be worth publishing
+PARAM_MODELS_TO_QUANTIZE = { # model_name -> (task, FP32 model name, FP32 .pt path, INT8 publish path)
+    "yolov8n_int8": ("pose", "yolov8n", pose_detector.PoseDetector.POSE_MODEL_PATHS["yolov8n"], pose_detector.PoseDetector.POSE_MODEL_PATHS["yolov8n_int8"]),
+    "miru_model_03_08_2024_int8": ("detect", "miru_model_03_08_2024", equipment_detector.EquipmentDetector.EQUIPMENT_MODEL_PATHS["miru_model_03_08_2024"], equipment_detector.EquipmentDetector.EQUIPMENT_MODEL_PATHS["miru_model_03_08_2024_int8"]),
+}
+
+def list_frame_paths(frames_folder:str = None, max_number_of_frames:int = None) -> List[str]:
+    frame_paths = sorted(glob.glob(os.path.join(frames_folder, "*.jpg")) + glob.glob(os.path.join(frames_folder, "*.png")))
+    if len(frame_paths) == 0:
+        raise ValueError(f"No .jpg or .png frames found in '{frames_folder}'")
+    if max_number_of_frames is not None and len(frame_paths) > max_number_of_frames: # evenly spaced, consecutive frames are too similar
+        frame_paths = [frame_paths[i] for i in np.linspace(0, len(frame_paths) - 1, max_number_of_frames).astype(int)]
+    return frame_paths
+
+def read_model_input_frame(frame_path:str = None) -> np.ndarray:
+    return cv2.resize(cv2.imread(frame_path), PARAM_IMAGE_PROCESS_SIZE)
+
+class FrameFolderCalibrationReader(CalibrationDataReader):
+    # Feeds the calibration frames with exactly the preprocessing of OnnxRuntimeBackend, so the activation ranges match the runtime inputs
+    def __init__(self, frame_paths:List[str] = None, input_name:str = None, imgsz:int = 640):
+        self.frame_paths = frame_paths
+        self.INPUT_NAME = input_name
+        self.IMGSZ = imgsz
+        self.next_frame_index = 0
+
+    def get_next(self) -> Dict:
+        if self.next_frame_index >= len(self.frame_paths):
+            return None
+        letterboxed, _, _ = inference_backends.letterbox(read_model_input_frame(self.frame_paths[self.next_frame_index]), imgsz=self.IMGSZ)
+        self.next_frame_index += 1
+        return {self.INPUT_NAME: inference_backends.letterboxed_frames_to_blob([letterboxed])}
+
+    def rewind(self):
+        self.next_frame_index = 0
+
+def quantize_model(fp32_onnx_path:str = None, int8_onnx_path:str = None, calibration_frame_paths:List[str] = None):
+    fp32_model = onnx.load(fp32_onnx_path)
+    calibration_reader = FrameFolderCalibrationReader(frame_paths=calibration_frame_paths, input_name=fp32_model.graph.input[0].name)
+    quantize_static(fp32_onnx_path, int8_onnx_path, calibration_reader, quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+
+    # The class names are read from the model metadata at runtime, keep them in the quantized model
+    int8_model = onnx.load(int8_onnx_path)
+    existing_metadata_keys = {metadata.key for metadata in int8_model.metadata_props}
+    for metadata in fp32_model.metadata_props:
+        if metadata.key not in existing_metadata_keys:
+            int8_model.metadata_props.add(key=metadata.key, value=metadata.value)
+    onnx.save(int8_model, int8_onnx_path)
+
+def read_yolo_labels(label_path:str = None, frame_size:Tuple[int,int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns (boxes_xyxy, class_ids) in pixels of a frame of 'frame_size' (width, height)
+    if not os.path.exists(label_path):
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    labels = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    if len(labels) == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    class_ids, xywh = labels[:, 0].astype(np.int64), labels[:, 1:5] * np.array([frame_size[0], frame_size[1], frame_size[0], frame_size[1]], dtype=np.float32)
+    return np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1), class_ids
+
+def calculate_map50(predictions:List[Dict] = None, references:List[Tuple[np.ndarray, np.ndarray]] = None) -> float:
+    # mAP@0.5 over the classes present in the references, with 101-point interpolated precision (COCO style)
+    average_precisions = []
+    for class_id in np.unique(np.concatenate([class_ids for _, class_ids in references])):
+        number_of_references = sum(int(np.sum(class_ids == class_id)) for _, class_ids in references)
+        scored_matches = [] # (confidence, is_true_positive)
+        for prediction, (reference_boxes, reference_class_ids) in zip(predictions, references):
+            is_predicted_class = prediction["class_ids"] == class_id
+            predicted_boxes, confidences = prediction["boxes_xyxy"][is_predicted_class], prediction["confidences"][is_predicted_class]
+            class_reference_boxes = reference_boxes[reference_class_ids == class_id]
+            ious = inference_backends.calculate_iou_matrix(predicted_boxes, class_reference_boxes) if len(class_reference_boxes) > 0 else np.zeros((len(predicted_boxes), 0))
+            is_reference_matched = np.zeros(len(class_reference_boxes), dtype=bool)
+            for prediction_index in np.argsort(-confidences):
+                candidate_ious = np.where(is_reference_matched, 0, ious[prediction_index]) if len(class_reference_boxes) > 0 else np.zeros(0)
+                is_true_positive = len(candidate_ious) > 0 and candidate_ious.max() >= 0.5
+                if is_true_positive:
+                    is_reference_matched[np.argmax(candidate_ious)] = True
+                scored_matches.append((confidences[prediction_index], is_true_positive))
+
+        if number_of_references == 0:
+            continue
+        scored_matches.sort(key=lambda scored_match: -scored_match[0])
+        true_positives = np.cumsum([is_true_positive for _, is_true_positive in scored_matches])
+        recall = np.concatenate([[0.0], true_positives / number_of_references, [1.0]])
+        precision = np.concatenate([[1.0], true_positives / np.arange(1, len(scored_matches) + 1), [0.0]])
+        precision = np.flip(np.maximum.accumulate(np.flip(precision))) # precision envelope
+        average_precisions.append(np.mean(np.interp(np.linspace(0, 1, 101), recall, precision)))
+    return float(np.mean(average_precisions)) if len(average_precisions) > 0 else 0.0
+
+def calculate_keypoint_error(fp32_predictions:List[Dict] = None, int8_predictions:List[Dict] = None) -> float:
+    # Mean distance between the keypoints of person boxes matched with IoU >= 0.5, normalized by the FP32 box diagonal.
+    # Only keypoints visible (confidence >= 0.5) in both predictions are compared.
+    normalized_errors = []
+    for fp32_prediction, int8_prediction in zip(fp32_predictions, int8_predictions):
+        if len(fp32_prediction["boxes_xyxy"]) == 0 or len(int8_prediction["boxes_xyxy"]) == 0:
+            continue
+        ious = inference_backends.calculate_iou_matrix(fp32_prediction["boxes_xyxy"], int8_prediction["boxes_xyxy"])
+        for fp32_index in range(len(ious)):
+            int8_index = int(np.argmax(ious[fp32_index]))
+            if ious[fp32_index, int8_index] < 0.5:
+                continue
+            fp32_keypoints, int8_keypoints = fp32_prediction["keypoints"][fp32_index], int8_prediction["keypoints"][int8_index]
+            is_visible = (fp32_keypoints[:, 2] >= 0.5) & (int8_keypoints[:, 2] >= 0.5)
+            if not np.any(is_visible):
+                continue
+            box = fp32_prediction["boxes_xyxy"][fp32_index]
+            box_diagonal = np.hypot(box[2] - box[0], box[3] - box[1])
+            normalized_errors.extend(np.linalg.norm(fp32_keypoints[is_visible, :2] - int8_keypoints[is_visible, :2], axis=1) / box_diagonal)
+    return float(np.mean(normalized_errors)) if len(normalized_errors) > 0 else 0.0
+
+def predict(backend:inference_backends.OnnxRuntimeBackend = None, frames:List[np.ndarray] = None) -> List[Dict]:
+    return [backend.predict([frame])[0] for frame in frames]
+
+def measure_latency(backend:inference_backends.OnnxRuntimeBackend = None, frames:List[np.ndarray] = None) -> float:
+    # Mean latency per frame in ms, including the decoding and the NMS as in miru
+    backend.predict([frames[0]]) # warm-up
+    total_time_s = 0.0
+    for frame in frames:
+        start_time = time.perf_counter()
+        backend.predict([frame])
+        total_time_s += time.perf_counter() - start_time
+    return 1000 * total_time_s / len(frames)
+
+def evaluate_and_publish(model_name:str = None, calibration_folder:str = None, evaluation_folder:str = None, labels_folder:str = None) -> bool:
+    if not evaluation_folder or os.path.realpath(evaluation_folder) == os.path.realpath(calibration_folder):
+        raise ValueError("The evaluation frames should be a different folder than the calibration frames, otherwise the regression gate is an in-sample check")
+    task, fp32_model_name, fp32_model_path, int8_publish_path = PARAM_MODELS_TO_QUANTIZE[model_name]
+    fp32_onnx_path = inference_backends.get_exported_model_path(fp32_model_path, export_format="onnx")
+    candidate_path = os.path.join("training", "local_quantized_models", os.path.basename(int8_publish_path))
+    os.makedirs(os.path.dirname(candidate_path), exist_ok=True)
+
+    print(f"Quantizing '{fp32_model_name}' -> '{candidate_path}'")
+    quantize_model(fp32_onnx_path=fp32_onnx_path, int8_onnx_path=candidate_path, calibration_frame_paths=list_frame_paths(calibration_folder, PARAM_MAX_CALIBRATION_FRAMES))
+
+    evaluation_frame_paths = list_frame_paths(evaluation_folder, PARAM_MAX_EVALUATION_FRAMES)
+    evaluation_frames = [read_model_input_frame(frame_path) for frame_path in evaluation_frame_paths]
+
+    # A low confidence threshold is needed for mAP. Almost every anchor survives it, so the NMS would dominate the time, the latency is measured
+    # separately on backends with the runtime confidence threshold
+    fp32_predictions = predict(inference_backends.OnnxRuntimeBackend(model_path=fp32_onnx_path, task=task, confidence_threshold=PARAM_MAP_CONFIDENCE_THRESHOLD), evaluation_frames)
+    int8_predictions = predict(inference_backends.OnnxRuntimeBackend(model_path=candidate_path, task=task, confidence_threshold=PARAM_MAP_CONFIDENCE_THRESHOLD), evaluation_frames)
+    latency_frames = evaluation_frames[:PARAM_MAX_LATENCY_FRAMES]
+    fp32_latency_ms = measure_latency(inference_backends.OnnxRuntimeBackend(model_path=fp32_onnx_path, task=task), latency_frames)
+    int8_latency_ms = measure_latency(inference_backends.OnnxRuntimeBackend(model_path=candidate_path, task=task), latency_frames)
+
+    if labels_folder:
+        references = [read_yolo_labels(os.path.join(labels_folder, os.path.splitext(os.path.basename(frame_path))[0] + ".txt"), PARAM_IMAGE_PROCESS_SIZE) for frame_path in evaluation_frame_paths]
+    else:
+        references = [(prediction["boxes_xyxy"][prediction["confidences"] >= PARAM_REFERENCE_CONFIDENCE], prediction["class_ids"][prediction["confidences"] >= PARAM_REFERENCE_CONFIDENCE]) for prediction in fp32_predictions]
+
+    fp32_map50 = calculate_map50(fp32_predictions, references)
+    int8_map50 = calculate_map50(int8_predictions, references)
+    keypoint_error = calculate_keypoint_error(fp32_predictions, int8_predictions) if task == "pose" else 0.0
+    speedup = fp32_latency_ms / int8_latency_ms
+
+    print(f"    reference:      {'YOLO labels' if labels_folder else 'FP32 predictions'} on {len(evaluation_frames)} frames")
+    print(f"    mAP@0.5:        FP32 {fp32_map50:.4f} | INT8 {int8_map50:.4f} | delta {int8_map50 - fp32_map50:+.4f} (tolerance -{PARAM_MAX_MAP50_DROP})")
+    if task == "pose":
+        print(f"    keypoint error: {keypoint_error:.4f} of the box diagonal (tolerance {PARAM_MAX_KEYPOINT_ERROR})")
+    print(f"    latency:        on {len(latency_frames)} frames, FP32 {fp32_latency_ms:.2f} ms | INT8 {int8_latency_ms:.2f} ms | {speedup:.2f}x (minimum {PARAM_MIN_SPEEDUP}x)")
+
+    regressions = []
+    if fp32_map50 - int8_map50 > PARAM_MAX_MAP50_DROP:
+        regressions.append("mAP@0.5 drop")
+    if keypoint_error > PARAM_MAX_KEYPOINT_ERROR:
+        regressions.append("keypoint error")
+    if speedup < PARAM_MIN_SPEEDUP:
+        regressions.append("latency")
+    if len(regressions) > 0:
+        print(f"->NOT published, regressed beyond the tolerance: {', '.join(regressions)}. The candidate is kept at '{candidate_path}'")
+        return False
+
+    shutil.copyfile(candidate_path, int8_publish_path)
+    print(f"->Published as '{model_name}' at '{int8_publish_path}'")
+    return True
+
+if __name__ == "__main__":
+    calibration_folder = input("Enter the calibration frames folder: ")
+    evaluation_folder = input("Enter the evaluation frames folder (different frames than the calibration ones): ")
+    labels_folder = input("Enter the YOLO labels folder of the evaluation frames (leave empty to compare with the FP32 predictions): ")
+    model_names = input(f"Enter the models to quantize, comma separated (leave empty for all of {list(PARAM_MODELS_TO_QUANTIZE.keys())}): ")
+    model_names = [model_name.strip() for model_name in model_names.split(",")] if model_names.strip() else list(PARAM_MODELS_TO_QUANTIZE.keys())
+
+    is_all_published = True
+    for model_name in model_names:
+        # The pose labels (persons) and the equipment labels have different classes, the labels folder is used for the equipment model only
+        task = PARAM_MODELS_TO_QUANTIZE[model_name][0]
+        is_all_published &= evaluate_and_publish(model_name=model_name, calibration_folder=calibration_folder, evaluation_folder=evaluation_folder, labels_folder=labels_folder if task == "detect" else None)
+    sys.exit(0 if is_all_published else 1)